@@ -0,0 +1,173 @@
+"""
+Build timelines defined by scripts, such as those in the *timelines* folder, in parallel
+
+Each script is run in a separate worker process. While it runs, the .csv files it reads and the files it writes
+are recorded, and their content hashes are kept in a manifest file. Next time, a script is skipped
+if its own contents, the .csv files it read, and the hdtimelines package are all unchanged and its output files
+still exist.
+
+Usage, from the directory the scripts expect to be run from:
+
+    python -m hdtimelines.build [--jobs N] [--force] [--manifest FILE] [paths ...]
+
+*paths* are scripts or folders to search for scripts (default: *timelines*)
+"""
+import os
+import sys
+import json
+import glob
+import runpy
+import hashlib
+import argparse
+import traceback
+import concurrent.futures
+
+# -- General idea: improves chances of tests and Sphinx builds working if this is included as a submodule
+def add_submodule(path):
+    if f"./{path}" not in sys.path:
+        sys.path.insert(0,f"../../{path}") # -- Needed for Sphinx builds, usually run in the docs subdirectory
+        sys.path.insert(0,f"./{path}")  # -- For normal running. Add second so it will go first in the search order
+add_submodule("hdtimelines")
+
+from hdtimelines import pltimeline
+
+DEFAULT_MANIFEST = ".hdtimelines_build.json"
+INPUT_EXTENSIONS = {".csv"}
+
+# ------------------------------------------------------------------------------------------------
+def file_hash(filename):
+    "Return the SHA-256 hash of a file's contents as a hex string, or None if it does not exist"
+    try:
+        h = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+    except FileNotFoundError:
+        return None
+# ------------------------------------------------------------------------------------------------
+def package_hash():
+    "Return a hash identifying the installed hdtimelines package: its version and the contents of its source files"
+    h = hashlib.sha256()
+    try:
+        from importlib.metadata import version
+        h.update(version("hdtimelines").encode())
+    except Exception:
+        pass
+    for filename in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+        h.update(os.path.basename(filename).encode())
+        h.update((file_hash(filename) or "").encode())
+    return h.hexdigest()
+# ------------------------------------------------------------------------------------------------
+def discover(paths):
+    "Return a sorted list of timeline scripts (.py files) found in *paths*, which may be files or folders"
+    scripts = set()
+    for path in paths:
+        if os.path.isdir(path):
+            scripts |= set(glob.glob(os.path.join(path, "**", "*.py"), recursive=True))
+        elif path.endswith(".py"):
+            scripts.add(path)
+    return sorted(os.path.normpath(script) for script in scripts)
+# ------------------------------------------------------------------------------------------------
+def is_up_to_date(script, entry, pkghash):
+    "Return True if a manifest entry shows that *script* need not be built again"
+    return bool(entry) and entry.get("script") == file_hash(script) and entry.get("package") == pkghash \
+        and all(file_hash(filename) == fhash for filename, fhash in entry.get("inputs", {}).items()) \
+        and all(os.path.exists(filename) for filename in entry.get("outputs", []))
+# ------------------------------------------------------------------------------------------------
+# -- Worker process functions
+_opened = {"inputs":set(), "outputs":set()}
+
+def _audit_open(event, args):
+    "Audit hook recording files opened by a timeline script, by name (str, bytes or path-like) but not descriptor"
+    if event == "open" and not isinstance(args[0], int) and isinstance(args[1], str):
+        filename, mode = os.path.abspath(os.fsdecode(os.fspath(args[0]))), args[1]
+        if any(c in mode for c in "wax+"):
+            _opened["outputs"].add(filename)
+        elif os.path.splitext(filename)[1].lower() in INPUT_EXTENSIONS:
+            _opened["inputs"].add(filename)
+
+def _init_worker():
+    sys.addaudithook(_audit_open)
+    # -- Batch builds must not open browser windows
+    pltimeline.plTimeLine.show = lambda self, *args, **kwargs: None
+
+def _build_one(script):
+    """
+    Run a timeline script, returning a duple (record, error) where record is a dictionary
+    with keys inputs (filenames read) and outputs (filenames written), and error is None or a traceback string
+    """
+    _opened["inputs"].clear()
+    _opened["outputs"].clear()
+    try:
+        runpy.run_path(script, run_name="__main__")
+        error = None
+    except SystemExit as e:
+        error = None if e.code in {None, 0} else traceback.format_exc()
+    except BaseException:
+        error = traceback.format_exc()
+    return {"inputs":sorted(_opened["inputs"]), "outputs":sorted(_opened["outputs"])}, error
+# ------------------------------------------------------------------------------------------------
+def build(paths, jobs=None, force=False, manifest=DEFAULT_MANIFEST, log=print):
+    """
+    Build the timeline scripts found in *paths* in a pool of *jobs* processes, skipping any
+    that are up to date according to *manifest* unless *force* is True.
+
+    Returns a dictionary with keys built, skipped, failed: lists of script names
+    """
+    try:
+        with open(manifest, encoding="utf-8") as f:
+            entries = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        entries = {}
+
+    pkghash = package_hash()
+    scripts = discover(paths)
+    result = {"built":[], "skipped":[], "failed":[]}
+    todo = []
+    for script in scripts:
+        if not force and is_up_to_date(script, entries.get(script), pkghash):
+            result["skipped"].append(script)
+            log(f"Up to date: {script}")
+        else:
+            todo.append(script)
+
+    if todo:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as executor:
+            futures = {executor.submit(_build_one, script):script for script in todo}
+            for future in concurrent.futures.as_completed(futures):
+                script = futures[future]
+                try:
+                    record, error = future.result()
+                except Exception:    # e.g. BrokenProcessPool, if a script ends its worker process
+                    record, error = None, traceback.format_exc()
+                if error:
+                    entries.pop(script, None)
+                    result["failed"].append(script)
+                    log(f"Failed: {script}\n{error}")
+                else:
+                    entries[script] = {"script":file_hash(script), "package":pkghash,
+                                       "inputs":{filename:file_hash(filename) for filename in record["inputs"]},
+                                       "outputs":record["outputs"]}
+                    result["built"].append(script)
+                    log(f"Built: {script}")
+                # -- Save after each script, so an interrupted build keeps what it has done
+                with open(manifest, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, indent=1, sort_keys=True)
+    return result
+# ------------------------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m hdtimelines.build",
+                                     description="Build timeline scripts in parallel, skipping those that are up to date")
+    parser.add_argument("paths", nargs="*", default=["timelines"], help="scripts or folders of scripts")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-f", "--force", action="store_true", help="build all scripts, even if up to date")
+    parser.add_argument("-m", "--manifest", default=DEFAULT_MANIFEST, help="manifest file of content hashes")
+    args = parser.parse_args(argv)
+
+    result = build(args.paths, jobs=args.jobs, force=args.force, manifest=args.manifest)
+    print(f"{len(result['built'])} built, {len(result['skipped'])} up to date, {len(result['failed'])} failed")
+    return 1 if result["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+A registry of events shared between topics, for use by hdTimeLine() and hdTopic()
+
+The same events often appear in many topics. A registry holds a single copy of each distinct event dictionary,
+interns the strings in events (dates, labels, URLs...), parses each distinct date string only once,
+and shares the ordinals of events with the same dates.
+
+Usage:
+
+    registry = eventregistry.EventRegistry()
+    hdtl = hdtimeline.hdTimeLine(title, registry=registry)
+    hdtl.add_topic_csv(...)
+
+Events and ordinals held by a registry are shared between topics, so must not be changed in place:
+use *hdTimeLine.update_topic()* instead
+"""
+import sys
+
+# -- General idea: improves chances of tests and Sphinx builds working if this is included as a submodule
+def add_submodule(path):
+    if f"./{path}" not in sys.path:
+        sys.path.insert(0,f"../../{path}") # -- Needed for Sphinx builds, usually run in the docs subdirectory
+        sys.path.insert(0,f"./{path}")  # -- For normal running. Add second so it will go first in the search order
+add_submodule("hdtimelines")
+
+from hdtimelines import hdtimelineutils
+
+# -- Event attributes from which ordinals are calculated, see hdtimelineutils.calc_event_ordinals()
+ORDINAL_KEYS = ("hdate", "hdate_end", "hdate_birth", "hdate_death", "min_xrange_years", "max_xrange_years")
+
+# ------------------------------------------------------------------------------------------------
+class EventRegistry():
+    '''
+    Holds single, shared copies of events, their strings and their ordinals
+
+    Properties:
+
+    * dateformat: as for HDate(), used when parsing dates
+    * events_added (int): number of events added, including repeats
+    '''
+    def __init__(self, dateformat=None):
+        """
+        * dateformat: as for HDate()
+        """
+        self.dateformat = dateformat
+        self.events_added = 0
+        self._strings = {}         # Interned strings, keyed by themselves
+        self._events = {}          # Shared event dictionaries, keyed by *_event_key()*
+        self._ordinals = {}        # Shared ordinal dictionaries, keyed by *_ordinal_key()*
+        self._pdates_cache = {}    # Parsed dates, see hdtimelineutils.get_pdates()
+    # ---------
+    def add_events(self, events, ordinals=None):
+        """
+        Register a list of events, returning a duple (events, ordinals) of lists of shared event and
+        ordinal dictionaries, equal to *events* and to their ordinals (as from *hdtimelineutils.calc_events_ordinals()*)
+
+        * ordinals: ordinals of *events*, if already calculated. These are used only for events with dates
+          not seen before
+        """
+        shared_events = [self.add_event(event) for event in events]
+        if ordinals is None:
+            ordinals = [None] * len(events)
+        return shared_events, [self._add_ordinals(event, ordset) for event, ordset in zip(shared_events, ordinals)]
+    # ---------
+    def add_event(self, event):
+        "Register an event, returning the shared event dictionary equal to it"
+        self.events_added += 1
+        event = {self.intern(key):self.intern(value) for key, value in event.items()}
+        if (key := self._event_key(event)) is None:
+            return event
+        return self._events.setdefault(key, event)
+    # ---------
+    def intern(self, value):
+        "Return the shared copy of a string, or *value* itself if it is not a string"
+        return self._strings.setdefault(value, value) if type(value) == str else value
+    # ---------
+    def stats(self):
+        """
+        Return a dictionary of counts: events_added, events (distinct events held), ordinals (distinct sets of
+        event dates held), strings (distinct strings held), dates_parsed (distinct date strings parsed)
+        """
+        return {"events_added":self.events_added, "events":len(self._events), "ordinals":len(self._ordinals),
+                "strings":len(self._strings), "dates_parsed":len(self._pdates_cache)}
+    # ---------
+    def clear(self):
+        "Discard everything held. Events and ordinals already returned are unaffected"
+        self.__init__(dateformat=self.dateformat)
+    # ---------
+    def _add_ordinals(self, event, ordset=None):
+        "Return the shared ordinals of an event, calculating them (or using *ordset*) if its dates are new"
+        if (key := self._ordinal_key(event)) is None:
+            return ordset if ordset is not None else self._calc_ordinals(event)
+        if key not in self._ordinals:
+            self._ordinals[key] = ordset if ordset is not None else self._calc_ordinals(event)
+        return self._ordinals[key]
+
+    def _calc_ordinals(self, event):
+        return hdtimelineutils.calc_event_ordinals(event, dateformat=self.dateformat,
+                                                   pdates_cache=self._pdates_cache)
+    # ---------
+    @staticmethod
+    def _event_key(event):
+        "Hashable key of an event, independent of the order of its attributes, or None if it cannot be hashed"
+        try:
+            key = tuple(sorted(event.items()))
+            hash(key)
+            return key
+        except TypeError:
+            return None
+
+    @staticmethod
+    def _ordinal_key(event):
+        "Hashable key of the attributes that an event's ordinals are calculated from, or None if it cannot be hashed"
+        try:
+            key = tuple(event.get(col, None) for col in ORDINAL_KEYS)
+            hash(key)
+            return key
+        except TypeError:
+            return None
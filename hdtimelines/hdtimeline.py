@@ -2,6 +2,8 @@
 hdTimeline class definition
 '''
 import sys
+import bisect
+from collections import Counter
 import pandas as pd
 
 # -- General idea: improves chances of tests and Sphinx builds working if this is included as a submodule
@@ -12,8 +14,12 @@ def add_submodule(path):
 add_submodule("hdtimelines")
 add_submodule("historicaldate")
 
-from hdtimelines import hdtopic
+from hdtimelines import hdtopic, hdtimelineutils, memreport
 
+# ----------    
+def _load_topic(title, source):
+    "Read a source and parse its dates, as an hdTopic() with no ID. Runs in a worker thread or process"
+    return hdtopic.hdTopic(title, hdtimelineutils.read_source(source).to_dict(orient='records'))
 # ----------    
 class hdTimeLine():
     '''
@@ -23,17 +29,29 @@ class hdTimeLine():
 
     * title (str) : timeline title
     * topics (list of hdTopic): Topics in this timeline
+
+    Methods here replace *topics* and the hdTopic() objects they change, rather than changing them in place,
+    so *snapshot()* can give readers in other threads a consistent, unchanging view without copying events
     '''
-    def __init__(self, title="", d=None):
+    def __init__(self, title="", d=None, registry=None):
         """
         * title (str): timeline title
         * d (dict) (optional): dictionary (as created by *to_dict()*) from which to construct the timeline
+        * registry (optional): an *eventregistry.EventRegistry()*, which may be shared with other timelines. 
+          Identical events, strings and dates in topics added to this timeline are then held only once, 
+          and each distinct date is parsed only once
         """
         self.topics = []   # List of topics : hdTopic()
         self.title = title
         self._maxid = 0
         self.action_applied = None  # Used to record the last operation. Not updated by methods here, but can be used by clients
         self.xrange_breakpoints = set()
+        self._breakpoint_counts = Counter()    # Number of topics using each breakpoint
+        self._topic_positions = {}             # Position in self.topics, keyed by topic id
+        self._date_range = (None, None)        # (earliest, latest) over all topics
+        self._search_index = None              # Search tokens -> {(topic id, event index)}, built by search()
+        self._search_tokens = None             # Sorted list of search tokens, for prefix searches
+        self._registry = registry
         if d:
             self.from_dict(d)
         return
@@ -45,12 +63,23 @@ class hdTimeLine():
         self.title = d["title"]
         self.topics = []
         self._maxid = 0
+        self.xrange_breakpoints = set()
+        self._breakpoint_counts = Counter()
+        self._topic_positions = {}
+        self._date_range = (None, None)
+        self._search_index = None
+        self._search_tokens = None
+        topics = []
         for dtopic in d["topics"]:
             topic = hdtopic.hdTopic()
             topic.from_dict(dtopic)
-            self.topics.append(topic)
+            self._register_topic(topic)
+            self._topic_positions[topic.id] = len(topics)
+            topics.append(topic)
+            self._add_breakpoints(topic)
+            self._add_date_range(topic)
             self._maxid = max(self._maxid, topic.id)
-        self.xrange_breakpoints = self._xrange_breakpoints()
+        self.topics = topics
     # ----------    
     def to_dict(self):
         """
@@ -81,34 +110,58 @@ class hdTimeLine():
         Add topic based on a dictionary of its events.
         Returns ID of added topic
         """
-        self._maxid = self._maxid + 1
-        self.topics.append(hdtopic.hdTopic(title, events, id=self._maxid))
-        self.xrange_breakpoints = self._xrange_breakpoints()
-        return self._maxid
+        return self.add_topics([(title, events)])[0]
+    # ----------
+    def add_topics(self, topic_list):
+        """
+        Add several topics at once. *topic_list* is a list of (title, events) duples, 
+        where events is a list of dictionaries as for *add_topic_dict()*.
+        Returns a list of IDs of the added topics
+        """
+        return self._append_topics([hdtopic.hdTopic(title, events, registry=self._registry) 
+                                        for title, events in topic_list])
+    # ----------
+    def add_topics_from_sources(self, sources, max_workers=None, use_processes=False):
+        """
+        Add several topics, reading and parsing their sources concurrently.
+
+        * sources: list of (title, source) duples. Each source may be a .csv filename, a Pandas DataFrame, 
+          or a callable returning a DataFrame (e.g. one that reads and merges several files)
+        * max_workers: maximum number of threads or processes to use
+        * use_processes: if True, use a process pool rather than a thread pool. Date parsing then runs 
+          in parallel too, but callable sources must be picklable (e.g. module-level functions or *functools.partial*)
+
+        Topics are added in the order of *sources*, skipping any that fail.
+        Returns a duple (ids, errors): *ids* is a list of IDs of added topics, in the order of *sources*, 
+        with None for sources that failed, and *errors* is a dictionary of exceptions keyed by position in *sources*
+        """
+        topics, errors = hdtimelineutils.map_concurrently(_load_topic, list(sources), 
+                                                          max_workers=max_workers, use_processes=use_processes)
+        for topic in topics:
+            if topic is not None:
+                self._register_topic(topic)
+        ids = iter(self._append_topics([topic for topic in topics if topic is not None]))
+        return [next(ids) if topic is not None else None for topic in topics], errors
     # ----------
     def get_date_range(self):
         """
-        Calculate earliest and latest date in this timeline, and return them as 
-        a duple (earliest, latest) of ordinals
+        Return earliest and latest date in this timeline as a duple (earliest, latest) of ordinals,
+        or (None, None) if the timeline has no events
         """
-        if self.topics:
-            topic_ranges = [topic.get_date_range() for topic in self.topics]
-            mindate = min([topic_range[0] for topic_range in topic_ranges])
-            maxdate = max([topic_range[1] for topic_range in topic_ranges])
-            return mindate, maxdate
-        else:
-            return None, None
+        return self._date_range
     # ----------
     def get_topic_index(self, id=None):
         "Find the position of a topic in the list, given its id"
         if id:
-            for index, topic in enumerate(self.topics):
-                if topic.id == id:
-                    return index
-            return None
+            return self._topic_positions.get(id, None)
         else:
             return None
     # ----------
+    def get_topic(self, id=None):
+        "Find a topic, given its id. Returns None if there is no such topic"
+        index = self.get_topic_index(id)
+        return self.topics[index] if index is not None else None
+    # ----------
     def remove_topic(self, id=None):
         '''
         Remove a topic, given its id. Returns True if an item is removed, False otherwise
@@ -118,8 +171,13 @@ class hdTimeLine():
         index = self.get_topic_index(id) if id else None
 
         if index is not None:
-            self.topics.pop(index)
-            self.xrange_breakpoints = self._xrange_breakpoints()
+            topic = self.topics[index]
+            self.topics = self.topics[:index] + self.topics[index + 1:]
+            del self._topic_positions[topic.id]
+            self._renumber_topics(index, len(self.topics))
+            self._remove_breakpoints(topic)
+            self._remove_date_range(topic)
+            self._unindex_topic(topic)
             return True
         else:
             return False
@@ -131,29 +189,260 @@ class hdTimeLine():
         index = self.get_topic_index(id) if id else None
         if index is not None:
             new_index = max(min(index + indexshift, len(self.topics)), 0)
-            topic = self.topics[index]
-            self.topics.pop(index)
-            self.topics.insert(new_index, topic)
+            topics = self.topics[:index] + self.topics[index + 1:]
+            topics.insert(new_index, self.topics[index])
+            self.topics = topics
+            self._renumber_topics(min(index, new_index), max(index, new_index) + 1)
             return True
         else:
             return False
     # ----------
     def reorder_topics(self, topic_order):
         '''
-        topic_order is a list of topic ids, in the required order
+        topic_order is a list of topic ids, in the required order, containing each current topic id once.
+        Raises ValueError otherwise
         '''
-        current_order = [topic.id for topic in self.topics]
-
-        # -- index_order is a list of current index positions, in the required new order
-        index_order = [current_order.index(topic_id) for topic_id in topic_order]
-
+        if len(topic_order) != len(self._topic_positions) or set(topic_order) != set(self._topic_positions):
+            raise ValueError(f"Topic order {list(topic_order)} is not an ordering of the topic ids "
+                             f"{list(self._topic_positions)}")
         # -- reorder the topic list
-        topics_neworder = [self.topics[index] for index in index_order]
+        topics_neworder = [self.topics[self._topic_positions[topic_id]] for topic_id in topic_order]
         self.topics = topics_neworder
+        self._topic_positions = {topic.id:index for index, topic in enumerate(self.topics)}
     # ---------
-    def _xrange_breakpoints(self):
-        bpoints = {None}
+    def update_topic(self, id=None, events=None):
+        """
+        Replace the events of a topic, given its id. Returns True if the topic is found, False otherwise
+
+        The topic is replaced by a new hdTopic() with the same title and id; the old one is left unchanged
+        """
+        index = self.get_topic_index(id)
+        if index is not None:
+            old_topic = self.topics[index]
+            topic = hdtopic.hdTopic(old_topic.title, id=old_topic.id)
+            topic.event_display_lines = old_topic.event_display_lines
+            topic.set_events(events if events else [], registry=self._registry)
+            self._remove_breakpoints(old_topic)
+            self._unindex_topic(old_topic)
+            self.topics = self.topics[:index] + [topic] + self.topics[index + 1:]
+            self._add_breakpoints(topic)
+            self._index_topic(topic)
+            self._recalc_date_range()
+            return True
+        else:
+            return False
+    # ---------
+    def _append_topics(self, topics):
+        "Give new topics the next IDs and add them to the end of the timeline. Returns a list of their IDs"
+        for index, topic in enumerate(topics, start=len(self.topics)):
+            self._maxid = self._maxid + 1
+            topic.id = self._maxid
+            self._topic_positions[topic.id] = index
+            self._add_breakpoints(topic)
+            self._add_date_range(topic)
+            self._index_topic(topic)
+        self.topics = self.topics + topics
+        return [topic.id for topic in topics]
+    # ---------
+    def _register_topic(self, topic):
+        "Share the events and ordinals of a topic whose ordinals are already calculated, if there is a registry"
+        if self._registry is not None:
+            topic.events, topic.ordinals = self._registry.add_events(topic.events, topic.ordinals)
+    # ---------
+    def memory_report(self):
+        """
+        Estimate the memory used by this timeline (see *memreport*). Returns a dictionary with keys:
+
+        * topics: list, in timeline order, of dictionaries as from *memreport.topic_report()*
+        * events, event_bytes, ordinal_bytes: totals over all topics
+        * search_index_bytes: size of the search index, 0 if it has not been built
+        * registry_bytes: size of the event registry, beyond the events and ordinals counted in topics
+        * bytes: total
+
+        Objects shared between topics are counted once, against the first topic using them
+        """
+        seen = set()
+        topics = [memreport.topic_report(topic, seen) for topic in self.topics]
+        search_index_bytes = memreport.deep_sizeof([self._search_index, self._search_tokens], seen) \
+                                if self._search_index is not None else 0
+        registry_bytes = memreport.deep_sizeof(self._registry, seen) if self._registry is not None else 0
+        total = sum(topic["bytes"] for topic in topics) + search_index_bytes + registry_bytes + \
+                memreport.deep_sizeof(self, seen)
+        return {"topics":topics, "events":sum(topic["events"] for topic in topics), 
+                "event_bytes":sum(topic["event_bytes"] for topic in topics),
+                "ordinal_bytes":sum(topic["ordinal_bytes"] for topic in topics),
+                "search_index_bytes":search_index_bytes, "registry_bytes":registry_bytes, "bytes":total}
+    # ---------
+    def snapshot(self):
+        """
+        Return an hdTimeLineSnapshot(): an immutable view of the timeline as it is now, sharing its hdTopic() objects.
+        Takes time in proportion to the number of topics, not events, and is safe to call while another thread
+        changes the timeline using the methods of this class
+        """
+        return hdTimeLineSnapshot(self.title, self.topics)
+    # ---------
+    def search(self, query, prefix=True, limit=None):
+        """
+        Find events whose label or description contain all the words in *query* (case-insensitive).
+        If *prefix* is True, words in *query* also match longer words that start with them.
+
+        The search index is built on first use, then kept up to date as topics are added, updated and removed. 
+        Events changed directly in hdTopic.events are not re-indexed.
+
+        Returns a list, in timeline order, of dictionaries with keys topic_id, event_index, label, 
+        ordinals (as in hdTopic.ordinals), earliest and latest (ordinals, e.g. for *plTimeLine.fit_xaxis()*)
+        """
+        if self._search_index is None:
+            self._search_index = {}
+            for topic in self.topics:
+                self._index_topic(topic)
+        if self._search_tokens is None:
+            self._search_tokens = sorted(self._search_index)
+
+        matches = None
+        for word in hdtimelineutils.tokenize(query):
+            if prefix:
+                found = set()
+                for token in self._search_tokens[bisect.bisect_left(self._search_tokens, word):]:
+                    if not token.startswith(word):
+                        break
+                    found |= self._search_index[token]
+            else:
+                found = self._search_index.get(word, set())
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+
+        results = []
+        for topic_id, event_index in sorted(matches or [], key=lambda m: (self._topic_positions[m[0]], m[1])):
+            topic = self.get_topic(topic_id)
+            ordset = topic.ordinals[event_index]
+            results.append({"topic_id":topic_id, "event_index":event_index, 
+                            "label":topic.events[event_index].get("label", ""), "ordinals":ordset,
+                            "earliest":ordset.get("earliest"), "latest":ordset.get("latest")})
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+    # ---------
+    def _event_tokens(self, event):
+        "Return the set of search tokens of an event"
+        return set(hdtimelineutils.tokenize(event.get("label", ""))) | \
+               set(hdtimelineutils.tokenize(event.get("description", "")))
+    # ---------
+    def _index_topic(self, topic):
+        "Add the events of a topic to the search index, if it has been built"
+        if self._search_index is not None:
+            for event_index, event in enumerate(topic.events):
+                for token in self._event_tokens(event):
+                    if token not in self._search_index:
+                        self._search_index[token] = set()
+                        self._search_tokens = None
+                    self._search_index[token].add((topic.id, event_index))
+    # ---------
+    def _unindex_topic(self, topic):
+        "Remove the events of a topic from the search index, if it has been built"
+        if self._search_index is not None:
+            for event_index, event in enumerate(topic.events):
+                for token in self._event_tokens(event):
+                    if token in self._search_index:
+                        self._search_index[token].discard((topic.id, event_index))
+                        if not self._search_index[token]:
+                            del self._search_index[token]
+                            self._search_tokens = None
+    # ---------
+    def _renumber_topics(self, start, end):
+        "Refresh the recorded positions of topics in self.topics[start:end]"
+        for index in range(start, min(end, len(self.topics))):
+            self._topic_positions[self.topics[index].id] = index
+    # ---------
+    def _add_breakpoints(self, topic):
+        "Count in the breakpoints of a topic being added"
+        bpoints = topic.xrange_breakpoints()
+        self._breakpoint_counts.update(bpoints)
+        self.xrange_breakpoints |= bpoints
+    # ---------
+    def _add_date_range(self, topic):
+        "Extend the timeline date range to include a topic being added"
+        if topic.ordinals:
+            topic_min, topic_max = topic.get_date_range()
+            mindate, maxdate = self._date_range
+            self._date_range = (topic_min if mindate is None else min(mindate, topic_min),
+                                topic_max if maxdate is None else max(maxdate, topic_max))
+    # ---------
+    def _remove_date_range(self, topic):
+        "Recalculate the timeline date range if a topic being removed lies on its boundary"
+        if topic.ordinals and ((topic.get_date_range()[0] == self._date_range[0]) or 
+                               (topic.get_date_range()[1] == self._date_range[1])):
+            self._recalc_date_range()
+    # ---------
+    def _recalc_date_range(self):
+        "Recalculate the timeline date range from the (cached) topic date ranges"
+        self._date_range = (None, None)
         for topic in self.topics:
-            bpoints = bpoints | topic.xrange_breakpoints()
-        return bpoints - {None}
+            self._add_date_range(topic)
+    # ---------
+    def _remove_breakpoints(self, topic):
+        "Count out the breakpoints of a topic being removed, dropping any no longer used"
+        for bpoint in topic.xrange_breakpoints():
+            self._breakpoint_counts[bpoint] -= 1
+            if self._breakpoint_counts[bpoint] <= 0:
+                del self._breakpoint_counts[bpoint]
+                self.xrange_breakpoints.discard(bpoint)
+
+# ----------    
+class hdTimeLineSnapshot():
+    '''
+    An immutable view of an hdTimeLine(), as returned by *hdTimeLine.snapshot()*. 
+    It can be used in place of an hdTimeLine() for reading, for example by *plTimeLine.from_hdtimeline()*
+
+    Properties:
 
+    * title (str) : timeline title
+    * topics (tuple of hdTopic): Topics in the timeline when the snapshot was taken. 
+      These are shared with the timeline, so must not be changed
+    '''
+    __slots__ = ("title", "topics", "_topic_positions", "_date_range")
+
+    def __init__(self, title, topics):
+        """
+        * title (str): timeline title
+        * topics (list of hdTopic): topics, which are not copied
+        """
+        object.__setattr__(self, "title", title)
+        object.__setattr__(self, "topics", tuple(topics))
+        object.__setattr__(self, "_topic_positions", None)    # Built on first use
+        object.__setattr__(self, "_date_range", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("hdTimeLineSnapshot is immutable")
+    # ----------    
+    def to_dict(self):
+        "Convert to a dictionary, as from *hdTimeLine.to_dict()*"
+        return {"title":self.title, "topics":[topic.to_dict() for topic in self.topics]}
+    # ----------    
+    def get_topic_index(self, id=None):
+        "Find the position of a topic in the snapshot, given its id"
+        if self._topic_positions is None:
+            object.__setattr__(self, "_topic_positions", {topic.id:index for index, topic in enumerate(self.topics)})
+        return self._topic_positions.get(id, None) if id else None
+    # ----------    
+    def get_topic(self, id=None):
+        "Find a topic, given its id. Returns None if there is no such topic"
+        index = self.get_topic_index(id)
+        return self.topics[index] if index is not None else None
+    # ----------    
+    def get_date_range(self):
+        """
+        Return earliest and latest date in the snapshot as a duple (earliest, latest) of ordinals,
+        or (None, None) if it has no events
+        """
+        if self._date_range is None:
+            ranges = [topic.get_date_range() for topic in self.topics if topic.ordinals]
+            object.__setattr__(self, "_date_range", (min(r[0] for r in ranges), max(r[1] for r in ranges)) 
+                                                        if ranges else (None, None))
+        return self._date_range
+    # ----------    
+    @property
+    def xrange_breakpoints(self):
+        "Set of the min_xrange_years and max_xrange_years values used in the snapshot"
+        return set().union(*(topic.xrange_breakpoints() for topic in self.topics))
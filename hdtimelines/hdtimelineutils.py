@@ -1,5 +1,9 @@
 import sys
 import os
+import re
+import concurrent.futures
+import numpy as np
+import pandas as pd
 
 # -- General idea: improves chances of tests and Sphinx builds working if this is included as a submodule
 def add_submodule(path):
@@ -12,27 +16,41 @@ add_submodule("hdtimelines")
 from historicaldate import hdate
 from historicaldate import hdateutils
 
-def calc_date_ordinals(hd, dprefix="", dateformat=None, missingasongoing=False):
+def get_pdates(hd, dateformat=None, missingasongoing=False, pdates_cache=None):
+    """
+    Return HDate(hd).pdates, looking it up in (and adding it to) *pdates_cache* if one is given
+
+    * *pdates_cache* (dict): parsed dates, keyed by (hd, missingasongoing), for a single *dateformat*
+    """
+    if pdates_cache is None:
+        return hdate.HDate(hd, missingasongoing=missingasongoing, dateformat=dateformat).pdates
+    key = (hd, bool(missingasongoing))
+    if key not in pdates_cache:
+        pdates_cache[key] = hdate.HDate(hd, missingasongoing=missingasongoing, dateformat=dateformat).pdates
+    return pdates_cache[key]
+# ------------------------------------------------------------------------------------------------------------------
+def calc_date_ordinals(hd, dprefix="", dateformat=None, missingasongoing=False, pdates_cache=None):
     """
     Calculate ordinals for a single date, return as a dictionary with keys
     <dprefix>_early, <dprefix>_mid, <dprefix>_late, <dprefix>_ongoing
 
     * *hd* (str): A string representing a date in a format recognised by HDate()
     * *dateformat*, *missingasongoing*: as for HDate()
+    * *pdates_cache*: as for *get_pdates()*
 
     Other code assumes that any entry in d of type int is an ordinal date
     """
-    pd = hdate.HDate(hd, missingasongoing=missingasongoing, dateformat=dateformat).pdates
-    if pd:
-        d = {f"{dprefix}_early":pd["ordinal_early"],
-            f"{dprefix}_mid":pd["ordinal_mid"],
-            f"{dprefix}_late":pd["ordinal_late"]}
-        d[f"{dprefix}_ongoing"] = (pd['slmid'] == 'o')
+    pdates = get_pdates(hd, dateformat=dateformat, missingasongoing=missingasongoing, pdates_cache=pdates_cache)
+    if pdates:
+        d = {f"{dprefix}_early":pdates["ordinal_early"],
+            f"{dprefix}_mid":pdates["ordinal_mid"],
+            f"{dprefix}_late":pdates["ordinal_late"]}
+        d[f"{dprefix}_ongoing"] = (pdates['slmid'] == 'o')
     else:
         d = {}
     return d
 # ------------------------------------------------------------------------------------------------------------------
-def calc_event_ordinals(event, dateformat=None):
+def calc_event_ordinals(event, dateformat=None, pdates_cache=None):
     """
     Calculate ordinals for all the dates in an event, return as a dictionary with keys:
 
@@ -43,17 +61,19 @@ def calc_event_ordinals(event, dateformat=None):
     earliest, latest, label
 
     All dictionary values are (int) ordinals, except for ..._ongoing, which are bool
+
+    *pdates_cache* is as for *get_pdates()*
     """
     d = {}
     if (hd := event.get("hdate", None)) is not None: 
-        d.update(calc_date_ordinals(hd, "start", dateformat=dateformat))
+        d.update(calc_date_ordinals(hd, "start", dateformat=dateformat, pdates_cache=pdates_cache))
     if (hd := event.get("hdate_end", None)) is not None: 
-        d.update(calc_date_ordinals(hd, "end", dateformat=dateformat))
+        d.update(calc_date_ordinals(hd, "end", dateformat=dateformat, pdates_cache=pdates_cache))
     if (hd := event.get("hdate_birth", None)) is not None: 
-        d.update(calc_date_ordinals(hd, "birth", dateformat=dateformat))
+        d.update(calc_date_ordinals(hd, "birth", dateformat=dateformat, pdates_cache=pdates_cache))
     if (hd := event.get("hdate_death", None)) is not None: 
         d.update(calc_date_ordinals(hd, "death", dateformat=dateformat, 
-                        missingasongoing=(d.get("birth_mid", None) is not None)))
+                        missingasongoing=(d.get("birth_mid", None) is not None), pdates_cache=pdates_cache))
 
     # -- Calculate earliest and lateset ordinals
     d["earliest"] = min({val for val in d.values() if type(val)==int})
@@ -85,6 +105,109 @@ def calc_event_ordinals(event, dateformat=None):
     d["label"] = labeldate
     return d
 # -----------------------------------------------------------------------------------
+def calc_events_ordinals(events, dateformat=None, pdates_cache=None):
+    """
+    Calculate ordinals for a list of events, as for *calc_event_ordinals()*, returning a list of dictionaries
+
+    Each distinct date string is parsed only once
+    """
+    if pdates_cache is None:
+        pdates_cache = {}
+    return [calc_event_ordinals(event, dateformat=dateformat, pdates_cache=pdates_cache) for event in events]
+# -----------------------------------------------------------------------------------
+_date_columns = (("hdate", "start"), ("hdate_end", "end"), ("hdate_birth", "birth"), ("hdate_death", "death"))
+
+def calc_column_ordinals(df, dateformat=None, pdates_cache=None):
+    """
+    Calculate ordinals for the date columns (hdate, hdate_end, hdate_birth, hdate_death) of a dataframe. 
+    Each distinct date in a column is parsed only once, and the results are broadcast back to the rows.
+
+    Returns a dataframe with the same index as *df*, and columns as keys returned by *calc_date_ordinals()*
+    (start_early, start_mid, ..., death_ongoing) for each date column present in *df*. 
+    Ordinals have dtype Int64 and ..._ongoing have dtype boolean, with <NA> for missing dates.
+    Dates that cannot be parsed are also returned as <NA>.
+
+    As in *calc_event_ordinals()*, a missing death date is taken as ongoing if there is a birth date.
+    *pdates_cache* is as for *get_pdates()*
+    """
+    if pdates_cache is None:
+        pdates_cache = {}
+
+    def unique_ordinals(values, missingasongoing):
+        "Parse distinct values, return (codes, dictionary of Int64/boolean arrays for the distinct values)"
+        codes, uniques = pd.factorize(values)
+        pdates_list = []
+        for hd in uniques:
+            try:
+                pdates_list.append(get_pdates(hd, dateformat=dateformat, missingasongoing=missingasongoing, 
+                                              pdates_cache=pdates_cache))
+            except Exception:
+                pdates_list.append(None)    # Left to be reported when the event is displayed
+        arrays = {part:pd.array([pdates[f"ordinal_{part}"] if pdates else None for pdates in pdates_list], 
+                                dtype="Int64") for part in ("early", "mid", "late")}
+        arrays["ongoing"] = pd.array([(pdates["slmid"] == "o") if pdates else None for pdates in pdates_list], 
+                                     dtype="boolean")
+        return codes, arrays
+
+    nrows = len(df)
+    columns = {}
+    has_birth = np.zeros(nrows, dtype=bool)
+    for col, dprefix in _date_columns:
+        if col not in df.columns:
+            continue
+        values = df[col].to_numpy()
+        groups = [(~has_birth, False), (has_birth, True)] if dprefix == "death" \
+                    else [(np.ones(nrows, dtype=bool), False)]
+        for part, dtype in (("early", "Int64"), ("mid", "Int64"), ("late", "Int64"), ("ongoing", "boolean")):
+            columns[f"{dprefix}_{part}"] = pd.array([None] * nrows, dtype=dtype)
+        for rows, missingasongoing in groups:
+            codes, arrays = unique_ordinals(values[rows], missingasongoing)
+            for part, array in arrays.items():
+                columns[f"{dprefix}_{part}"][rows] = array.take(codes, allow_fill=True)
+        if dprefix == "birth":
+            has_birth = ~columns["birth_mid"].isna()
+    return pd.DataFrame(columns, index=df.index)
+# -----------------------------------------------------------------------------------
+_token_pattern = re.compile(r"\w+")
+
+def tokenize(text):
+    "Split text into a list of lower-case word tokens, for searching"
+    return _token_pattern.findall(str(text).casefold()) if text else []
+# -----------------------------------------------------------------------------------
+def read_source(source):
+    """
+    Return a dataframe of events from *source*, which may be a dataframe, a callable returning a dataframe,
+    or the name of a .csv file (read with na_filter=False, as elsewhere)
+    """
+    if isinstance(source, pd.DataFrame):
+        return source
+    elif callable(source):
+        return source()
+    else:
+        return pd.read_csv(source, na_filter=False)
+# -----------------------------------------------------------------------------------
+def map_concurrently(func, args_list, max_workers=None, use_processes=False):
+    """
+    Call *func(*args)* for each tuple *args* in *args_list*, concurrently in a thread pool 
+    (or a process pool if *use_processes* is True, in which case *func* and *args* must be picklable).
+
+    Returns a duple (results, errors): *results* is a list in the order of *args_list*, with None where a call failed,
+    and *errors* is a dictionary of the exceptions raised, keyed by position in *args_list*
+    """
+    executor_class = concurrent.futures.ProcessPoolExecutor if use_processes \
+                        else concurrent.futures.ThreadPoolExecutor
+    results, errors = [None] * len(args_list), {}
+    if not args_list:
+        return results, errors
+    with executor_class(max_workers=max_workers) as executor:
+        futures = {executor.submit(func, *args):index for index, args in enumerate(args_list)}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                errors[futures[future]] = e
+    return results, errors
+# -----------------------------------------------------------------------------------
 def calc_age(ymd_birth, ymd_ref):
     """
     Calculate a person's age from ymd of birth and death
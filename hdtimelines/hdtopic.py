@@ -20,19 +20,39 @@ class hdTopic():
     * ordinals (list of dicts): dictionaries of ordinals corresponding to the dates of events in this topic
     * event_display_lines (list of int): (possible future deprecation): lines on which to display the events
     '''
-    def __init__(self, title="", events=None, id=None):
+    def __init__(self, title="", events=None, id=None, registry=None):
         """
         * title (str) : topic title
         * events (list of dict): events with which to populate the topic
+        * registry: an *eventregistry.EventRegistry()* to share events and ordinals with other topics, or None
         """
         self.title = title
         self.events = []
         self.ordinals = []
         self.event_display_lines = None
         self.id = id
+        self._date_range = None     # Cached result of get_date_range()
         if events:
+            self.set_events(events, registry=registry)
+    # ---------    
+    def set_events(self, events, registry=None):
+        """
+        Replace the events in this topic, recalculating ordinals and cached values
+
+        * registry: as for the hdTopic() constructor
+        """
+        if registry is not None:
+            self.events, self.ordinals = registry.add_events(events)
+        else:
             self.events = events
-            self.ordinals = [hdtimelineutils.calc_event_ordinals(event) for event in self.events]
+            self.ordinals = hdtimelineutils.calc_events_ordinals(self.events)
+        self.invalidate_cache()
+    # ---------    
+    def invalidate_cache(self):
+        """
+        Recalculate cached values. Call this after changing *events* or *ordinals* directly
+        """
+        self._date_range = self._calc_date_range() if self.ordinals else None
     # ---------    
     def from_dict(self, d):
         """
@@ -43,6 +63,7 @@ class hdTopic():
         self.events = d["events"]
         self.ordinals = d["ordinals"]
         self.event_display_lines = d["event_display_lines"]
+        self.invalidate_cache()
     # ---------    
     def to_dict(self):
         """
@@ -51,22 +72,30 @@ class hdTopic():
         d = {"title": self.title,
              "id": self.id,
              "events":self.events,
-             "ordinals":self.ordinals,
+             "ordinals":self.ordinals if isinstance(self.ordinals, list) else list(self.ordinals),
              "event_display_lines":self.event_display_lines}
         return d
     # ---------
     def get_date_range(self):
         """
-        Calculate earliest and latest date in this topic, and return them as 
-        a duple (earliest, latest) of ordinals
+        Return earliest and latest date in this topic as a duple (earliest, latest) of ordinals
         """
-        mindate = min([d["earliest"] for d in self.ordinals])
-        maxdate = max([d["latest"] for d in self.ordinals])
+        if self._date_range is None:
+            self._date_range = self._calc_date_range()
+        return self._date_range
+    # ---------
+    def _calc_date_range(self):
+        if hasattr(self.ordinals, "date_range"):   # e.g. ordinalstore.OrdinalsView, without building every event
+            return self.ordinals.date_range()
+        mindate = min(d["earliest"] for d in self.ordinals)
+        maxdate = max(d["latest"] for d in self.ordinals)
         return mindate, maxdate
     # ---------
     def xrange_breakpoints(self):
-        bpoints = set()
-        for ordset in self.ordinals:
-            bpoints = bpoints | {ordset.get("min_xrange_years", None), ordset.get("max_xrange_years", None)}
+        "Return the set of min_xrange_years and max_xrange_years values used in this topic"
+        if hasattr(self.ordinals, "xrange_breakpoints"):   # As for _calc_date_range()
+            return self.ordinals.xrange_breakpoints()
+        bpoints = {ordset.get(key, None) for ordset in self.ordinals 
+                        for key in ("min_xrange_years", "max_xrange_years")}
         return bpoints - {None}
 
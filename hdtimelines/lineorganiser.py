@@ -1,3 +1,5 @@
+import heapq
+
 class LineOrganiser():
     '''
     Class to find a line to place a trace on
@@ -25,14 +27,7 @@ class LineOrganiser():
         
         add_trace returns a line number that the trace can be displayed on
         """
-        textdelta = int(len(text) * self.daysperlabelchar/2.0)
-        spacingdelta = int(self.daysminspacing/2.0)
-        t_earliest = min(earliest, labeldate - textdelta) - spacingdelta
-        t_latest = max(latest, labeldate + textdelta) + spacingdelta
-        lpd = {"earliest":t_earliest, "latest":t_latest}
-
-        self.earliest = t_earliest if self.earliest is None else min(self.earliest, t_earliest)
-        self.latest = t_latest if self.latest is None else max(self.latest, t_latest)
+        lpd = self._padded_interval(earliest, latest, labeldate, text)
 
         for i in range(self.startline, nlines := len(self.linerecord)):
             line = self.linerecord[(iline := (self.previoustraceindex + i + 1) % nlines)]
@@ -46,6 +41,49 @@ class LineOrganiser():
         self.previoustraceindex = len(self.linerecord) - 1
         return self.previoustraceindex
 
+    def add_traces(self, traces):
+        """
+        Find lines to display several traces on, using the minimum number of new lines
+
+        * traces: a list of (earliest, latest, labeldate, text) tuples, as for *add_trace()*
+
+        Traces are taken in order of their (padded) start date, and each is placed on the line
+        that became free earliest, or on a new line if none is free yet (interval partitioning, O(n log n)).
+        Lines already in use from the start line onwards are only reused after their last trace.
+
+        add_traces returns a list of line numbers, one for each trace
+        """
+        lpds = [self._padded_interval(*trace) for trace in traces]
+
+        # -- heap of (latest ordinal used, line number) for each line that may be reused
+        lineends = [(max(linepart["latest"] for linepart in self.linerecord[iline]), iline)
+                        for iline in range(self.startline, len(self.linerecord))]
+        heapq.heapify(lineends)
+
+        ilines = [None] * len(lpds)
+        for itrace in sorted(range(len(lpds)), key=lambda i: lpds[i]["earliest"]):
+            lpd = lpds[itrace]
+            if lineends and lineends[0][0] < lpd["earliest"]:
+                _, iline = heapq.heappop(lineends)
+                self.linerecord[iline] += [lpd]
+            else:
+                iline = len(self.linerecord)
+                self.linerecord += [[lpd]]
+            heapq.heappush(lineends, (lpd["latest"], iline))
+            ilines[itrace] = self.previoustraceindex = iline
+        return ilines
+
+    def _padded_interval(self, earliest, latest, labeldate, text):
+        "Calculate the extent of a trace including its label and spacing, and update earliest and latest"
+        textdelta = int(len(text) * self.daysperlabelchar/2.0)
+        spacingdelta = int(self.daysminspacing/2.0)
+        t_earliest = min(earliest, labeldate - textdelta) - spacingdelta
+        t_latest = max(latest, labeldate + textdelta) + spacingdelta
+
+        self.earliest = t_earliest if self.earliest is None else min(self.earliest, t_earliest)
+        self.latest = t_latest if self.latest is None else max(self.latest, t_latest)
+        return {"earliest":t_earliest, "latest":t_latest}
+
     def _is_available(self, line, lpd):
         return all([self._is_distinct(linepart, lpd) for linepart in line])
     
@@ -0,0 +1,101 @@
+"""
+Memory use estimation for hdTimeLine() and plTimeLine() objects
+
+Used by *hdTimeLine.memory_report()* and *plTimeLine.memory_report()*. Sizes are estimates from *sys.getsizeof()*,
+following dictionaries, lists and other containers and counting each object only once, so objects shared
+between topics (e.g. through an *eventregistry.EventRegistry()*) are counted against the first topic using them.
+
+Usage, to measure the memory allocated by a block of code with tracemalloc:
+
+    with memreport.measure() as measurement:
+        pltl.add_topic(topic)
+    print(measurement["allocated"], measurement["peak"])
+"""
+import sys
+import time
+import types
+import tracemalloc
+import contextlib
+import pandas as pd
+
+# -- Objects whose attributes are not followed by deep_sizeof()
+_NOT_FOLLOWED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+# ------------------------------------------------------------------------------------------------
+def deep_sizeof(obj, seen=None):
+    """
+    Return the approximate size in bytes of *obj* and everything it refers to through containers and
+    object attributes, counting each object once
+
+    * seen: a set of ids of objects already counted, shared between calls to count shared objects only once
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, (pd.DataFrame, pd.Series)):
+            usage = item.memory_usage(deep=True)
+            total += int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+        else:
+            total += sys.getsizeof(item)
+            if isinstance(item, dict):
+                stack.extend(item.keys())
+                stack.extend(item.values())
+            elif isinstance(item, (list, tuple, set, frozenset)):
+                stack.extend(item)
+            elif hasattr(item, "__dict__") and not isinstance(item, _NOT_FOLLOWED):
+                stack.append(item.__dict__)
+    return total
+# ------------------------------------------------------------------------------------------------
+def topic_report(topic, seen=None):
+    """
+    Return a dictionary describing the memory used by an hdTopic(), with keys
+    id, title, events (number of events), event_bytes, ordinal_bytes, bytes (total)
+
+    * seen: as for *deep_sizeof()*
+    """
+    if seen is None:
+        seen = set()
+    event_bytes = deep_sizeof(topic.events, seen)
+    ordinal_bytes = deep_sizeof(topic.ordinals, seen)
+    other_bytes = deep_sizeof(topic, seen)
+    return {"id":topic.id, "title":topic.title, "events":len(topic.events),
+            "event_bytes":event_bytes, "ordinal_bytes":ordinal_bytes,
+            "bytes":event_bytes + ordinal_bytes + other_bytes}
+# ------------------------------------------------------------------------------------------------
+@contextlib.contextmanager
+def measure():
+    """
+    Context manager measuring memory allocated, using tracemalloc, and time taken within its block.
+    Yields a dictionary, filled in when the block ends, with keys:
+
+    * allocated: bytes allocated and still held at the end of the block
+    * peak: highest bytes allocated at any point in the block
+    * seconds: time taken
+
+    tracemalloc is started for the block if it is not already running. Tracing slows Python down considerably,
+    so use this for sizing and regression checks rather than in production.
+    If tracemalloc is already running, its peak is reset. Before Python 3.9 the peak cannot be reset, so is then
+    the highest since tracing started, relative to the start of the block
+    """
+    measurement = {}
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()     # Python 3.9 and later
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield measurement
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        measurement.update({"allocated":current - before, "peak":max(peak - before, current - before),
+                            "seconds":time.perf_counter() - start})
+        if started:
+            tracemalloc.stop()
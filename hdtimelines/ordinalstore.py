@@ -0,0 +1,306 @@
+"""
+A compiled, memory-mapped store of the events and ordinals of an hdTimeLine()
+
+The store holds event ordinals and attributes as fixed-width arrays, plus a table of strings.
+It is opened with mmap, so many processes opening the same file share a single page-cached copy, and
+hdTopic() and hdTimeLine() objects can be constructed from it without parsing any dates. The ordinals of
+topics constructed from a store stay in the memory map (see *OrdinalsView()*) until they are used.
+
+Usage:
+
+    ordinalstore.write_store(hdtl, "corpus.hdts")
+    ...
+    with ordinalstore.OrdinalStore("corpus.hdts") as store:
+        hdtl = store.timeline()
+"""
+import sys
+import json
+import mmap
+import struct
+from collections.abc import Sequence
+import numpy as np
+
+# -- General idea: improves chances of tests and Sphinx builds working if this is included as a submodule
+def add_submodule(path):
+    if f"./{path}" not in sys.path:
+        sys.path.insert(0,f"../../{path}") # -- Needed for Sphinx builds, usually run in the docs subdirectory
+        sys.path.insert(0,f"./{path}")  # -- For normal running. Add second so it will go first in the search order
+add_submodule("hdtimelines")
+
+from hdtimelines import hdtopic, hdtimeline
+
+MAGIC = b"HDTSTOR1"
+MISSING = np.iinfo(np.int64).min        # Missing ordinal
+
+_dprefixes = ("start", "end", "birth", "death")
+ORDINAL_FIELDS = [f"{dprefix}_{part}" for dprefix in _dprefixes for part in ("early", "mid", "late")] + \
+                    ["earliest", "latest", "label"]
+ONGOING_FIELDS = [f"{dprefix}_ongoing" for dprefix in _dprefixes]
+XRANGE_FIELDS = ["min_xrange_years", "max_xrange_years"]
+
+_TYPE_STR, _TYPE_JSON = 0, 1    # How event attribute values are held in the string table
+
+# ------------------------------------------------------------------------------------------------
+def write_store(hdtl, filename):
+    """
+    Compile the events and ordinals of an hdTimeLine() *hdtl* to a store file
+    """
+    strings, string_ids = [], {}
+    def string_id(text):
+        if text not in string_ids:
+            string_ids[text] = len(strings)
+            strings.append(text)
+        return string_ids[text]
+
+    events = [event for topic in hdtl.topics for event in topic.events]
+    ordinals = [ordset for topic in hdtl.topics for ordset in topic.ordinals]
+    keys = list(dict.fromkeys(key for event in events for key in event))
+    nevents = len(events)
+
+    ordarray = np.full((nevents, len(ORDINAL_FIELDS)), MISSING, dtype=np.int64)
+    ongoingarray = np.full((nevents, len(ONGOING_FIELDS)), -1, dtype=np.int8)
+    xrangearray = np.full((nevents, len(XRANGE_FIELDS)), np.nan, dtype=np.float64)
+    attrarray = np.full((nevents, len(keys)), -1, dtype=np.int32)
+    typearray = np.zeros((nevents, len(keys)), dtype=np.int8)
+
+    for ievent, (event, ordset) in enumerate(zip(events, ordinals)):
+        for ifield, field in enumerate(ORDINAL_FIELDS):
+            if ordset.get(field, None) is not None:
+                ordarray[ievent, ifield] = ordset[field]
+        for ifield, field in enumerate(ONGOING_FIELDS):
+            if field in ordset:
+                ongoingarray[ievent, ifield] = int(ordset[field])
+        for ifield, field in enumerate(XRANGE_FIELDS):
+            if field in ordset:
+                xrangearray[ievent, ifield] = ordset[field]
+        for ikey, key in enumerate(keys):
+            if key in event:
+                value = event[key]
+                if isinstance(value, str):
+                    attrarray[ievent, ikey] = string_id(value)
+                else:
+                    attrarray[ievent, ikey] = string_id(json.dumps(value, default=_json_default))
+                    typearray[ievent, ikey] = _TYPE_JSON
+
+    encoded = [text.encode("utf-8") for text in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    arrays = {"ordinals":ordarray, "ongoing":ongoingarray, "xrange":xrangearray,
+              "attributes":attrarray, "attribute_types":typearray, "string_offsets":offsets,
+              "string_data":np.frombuffer(b"".join(encoded), dtype=np.uint8)}
+
+    topics, start = [], 0
+    for topic in hdtl.topics:
+        topics.append({"title":topic.title, "id":topic.id, "start":start, "count":len(topic.events),
+                       "event_display_lines":topic.event_display_lines})
+        start += len(topic.events)
+
+    # -- Lay out arrays after the header, each aligned to 8 bytes
+    header = {"title":hdtl.title, "topics":topics, "keys":keys, "arrays":{}}
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"offset":offset, "dtype":array.dtype.str, "shape":list(array.shape)}
+        offset += _align(array.nbytes)
+    headerbytes = json.dumps(header).encode("utf-8")
+    database = len(MAGIC) + 8 + _align(len(headerbytes))
+
+    with open(filename, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(headerbytes)))
+        f.write(headerbytes.ljust(_align(len(headerbytes)), b" "))
+        for name, array in arrays.items():
+            assert f.tell() == database + header["arrays"][name]["offset"]
+            data = np.ascontiguousarray(array).tobytes()
+            f.write(data.ljust(_align(len(data)), b"\0"))
+# ------------------------------------------------------------------------------------------------
+def _align(nbytes):
+    return (nbytes + 7) // 8 * 8
+# ------------------------------------------------------------------------------------------------
+def _json_default(value):
+    "Convert numpy scalars and other values that json cannot handle"
+    return value.item() if hasattr(value, "item") else str(value)
+# ------------------------------------------------------------------------------------------------
+class OrdinalStore():
+    '''
+    A read-only, memory-mapped view of a store file written by *write_store()*
+
+    Properties:
+
+    * title (str): title of the stored timeline
+    * topics (list of dict): stored topics, with keys title, id, start, count (positions of their events)
+    * ordinals, ongoing, xrange (numpy arrays): ordinals of all events, one row per event, columns as in
+      ORDINAL_FIELDS (MISSING where absent), ONGOING_FIELDS (-1 where absent) and XRANGE_FIELDS (NaN where absent)
+    '''
+    def __init__(self, filename):
+        """
+        * filename (str): store file to open
+        """
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{filename} is not an hdtimelines ordinal store")
+        headerlen, = struct.unpack("<Q", self._mmap[len(MAGIC):len(MAGIC) + 8])
+        header = json.loads(self._mmap[len(MAGIC) + 8:len(MAGIC) + 8 + headerlen])
+        database = len(MAGIC) + 8 + _align(headerlen)
+
+        self.title = header["title"]
+        self.topics = header["topics"]
+        self._keys = header["keys"]
+        self._arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"]))
+            self._arrays[name] = np.frombuffer(self._mmap, dtype=dtype, count=count,
+                                               offset=database + spec["offset"]).reshape(spec["shape"])
+        self._string_base = database + header["arrays"]["string_data"]["offset"]
+        self.ordinals = self._arrays["ordinals"]
+        self.ongoing = self._arrays["ongoing"]
+        self.xrange = self._arrays["xrange"]
+    # ---------
+    def close(self):
+        """
+        Release the memory map. If arrays or views obtained from this store are still held (including
+        the ordinals of topics and timelines constructed from it), they remain usable, and the map is released
+        when the last of them is discarded
+        """
+        self._arrays = {}
+        self.ordinals = self.ongoing = self.xrange = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass    # Views still exist, and hold a reference to the map
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+    # ---------
+    def get_string(self, index):
+        "Return a string from the string table"
+        offsets = self._arrays["string_offsets"]
+        return self._mmap[self._string_base + int(offsets[index]):
+                          self._string_base + int(offsets[index + 1])].decode("utf-8")
+    # ---------
+    def get_events(self, itopic):
+        "Return the events of the topic at position *itopic*, as a list of dictionaries"
+        topic = self.topics[itopic]
+        attributes = self._arrays["attributes"][topic["start"]:topic["start"] + topic["count"]]
+        types = self._arrays["attribute_types"][topic["start"]:topic["start"] + topic["count"]]
+        events = []
+        for idrow, typerow in zip(attributes.tolist(), types.tolist()):
+            event = {}
+            for key, sid, stype in zip(self._keys, idrow, typerow):
+                if sid >= 0:
+                    text = self.get_string(sid)
+                    event[key] = text if stype == _TYPE_STR else json.loads(text)
+            events.append(event)
+        return events
+    # ---------
+    def get_ordinals(self, itopic):
+        "Return the ordinals of the topic at position *itopic*, as a list of dictionaries"
+        return list(self.ordinals_view(itopic))
+    # ---------
+    def ordinals_view(self, itopic):
+        "Return the ordinals of the topic at position *itopic*, as an *OrdinalsView()* of the memory map"
+        topic = self.topics[itopic]
+        rows = slice(topic["start"], topic["start"] + topic["count"])
+        return OrdinalsView(self.ordinals[rows], self.ongoing[rows], self.xrange[rows])
+    # ---------
+    def topic(self, itopic):
+        "Construct an hdTopic() from the topic at position *itopic*, without parsing dates"
+        topic = hdtopic.hdTopic()
+        topic.from_dict(self._topic_dict(itopic))
+        return topic
+    # ---------
+    def timeline(self):
+        "Construct an hdTimeLine() from the whole store, without parsing dates"
+        return hdtimeline.hdTimeLine(d={"title":self.title, 
+                                        "topics":[self._topic_dict(itopic) for itopic in range(len(self.topics))]})
+    # ---------
+    def _topic_dict(self, itopic):
+        "Return a dictionary for the topic at position *itopic*, as from *hdTopic.to_dict()* but with an OrdinalsView()"
+        info = self.topics[itopic]
+        return {"title":info["title"], "id":info["id"],
+                "events":self.get_events(itopic), "ordinals":self.ordinals_view(itopic),
+                "event_display_lines":info["event_display_lines"]}
+# ------------------------------------------------------------------------------------------------
+class OrdinalsView(Sequence):
+    '''
+    A sequence of the ordinals of a topic in an OrdinalStore(), used as *hdTopic.ordinals* for topics
+    constructed from the store. 
+    
+    The ordinals stay in the store's memory map, shared between processes, until they are used: the dictionary 
+    of ordinals of an event is built when it is first read, and kept, so changes to it are kept too.
+    *date_range()* and *xrange_breakpoints()* work from the memory map, so constructing topics and timelines 
+    does not build any dictionaries. Equal to a list of the same dictionaries
+    '''
+    def __init__(self, ordinals, ongoing, xrange):
+        """
+        * ordinals, ongoing, xrange: rows of the *OrdinalStore()* arrays of the same names
+        """
+        self._ordinals = ordinals
+        self._ongoing = ongoing
+        self._xrange = xrange
+        self._rows = [None] * len(ordinals)    # Dictionaries built so far
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = range(len(self))[index]
+        if self._rows[index] is None:
+            self._rows[index] = _ordset(self._ordinals[index].tolist(), self._ongoing[index].tolist(), 
+                                        self._xrange[index].tolist())
+        return self._rows[index]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, OrdinalsView)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"OrdinalsView({list(self)!r})"
+    # ---------
+    def date_range(self):
+        "Return (earliest, latest) ordinals over all events, as *hdTopic.get_date_range()*"
+        built = [row for row in self._rows if row is not None]
+        unbuilt = np.array([row is None for row in self._rows], dtype=bool)
+        earliest = [int(self._ordinals[unbuilt, ORDINAL_FIELDS.index("earliest")].min())] if unbuilt.any() else []
+        latest = [int(self._ordinals[unbuilt, ORDINAL_FIELDS.index("latest")].max())] if unbuilt.any() else []
+        return min(earliest + [row["earliest"] for row in built]), max(latest + [row["latest"] for row in built])
+
+    def xrange_breakpoints(self):
+        "Return the set of min_xrange_years and max_xrange_years values used, as *hdTopic.xrange_breakpoints()*"
+        unbuilt = np.array([row is None for row in self._rows], dtype=bool)
+        values = self._xrange[unbuilt]
+        bpoints = set(values[values == values].tolist())    # Not NaN
+        bpoints |= {row.get(key, None) for row in self._rows if row is not None 
+                        for key in ("min_xrange_years", "max_xrange_years")}
+        return bpoints - {None}
+# ------------------------------------------------------------------------------------------------
+def _ordset(ordrow, ongoingrow, xrangerow):
+    "Return a dictionary of ordinals, as in hdTopic.ordinals, from rows of the store arrays (as lists)"
+    ordset = {}
+    for idate, dprefix in enumerate(_dprefixes):
+        if ongoingrow[idate] >= 0:
+            for ipart, part in enumerate(("early", "mid", "late")):
+                ordset[f"{dprefix}_{part}"] = ordrow[3 * idate + ipart] \
+                    if ordrow[3 * idate + ipart] != MISSING else None
+            ordset[f"{dprefix}_ongoing"] = bool(ongoingrow[idate])
+    for ifield, field in enumerate(ORDINAL_FIELDS[12:], start=12):
+        if ordrow[ifield] != MISSING:
+            ordset[field] = ordrow[ifield]
+    for ifield, field in enumerate(XRANGE_FIELDS):
+        if xrangerow[ifield] == xrangerow[ifield]:  # not NaN
+            ordset[field] = xrangerow[ifield]
+    return ordset
@@ -0,0 +1,66 @@
+"""
+A cache of prepared topic traces, for use by the plTimeLine() class
+
+A topic drawn once can be placed in other plTimeLine() figures, with the same x axis range and display options,
+by copying its traces and moving them to the new y position, without parsing dates or laying out lines again.
+
+Usage:
+
+    cache = pltcache.TraceCache()
+    pltl1 = pltimeline.plTimeLine(title, mindate=..., maxdate=..., trace_cache=cache)
+    pltl1.add_topic(topic1)
+    pltl1.add_topic(topic2)
+    pltl2 = pltimeline.plTimeLine(title, mindate=..., maxdate=..., trace_cache=cache)
+    pltl2.add_topic(topic2)     # Placed from the cache
+"""
+import json
+import hashlib
+from collections import OrderedDict
+
+# ------------------------------------------------------------------------------------------------
+def topic_hash(topic):
+    "Return a hash of the content (title and events) of an hdTopic()"
+    content = json.dumps([topic.title, topic.events], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+# ------------------------------------------------------------------------------------------------
+class TraceCache():
+    '''
+    A least-recently-used cache of prepared topic traces, keyed by topic content and display options
+
+    Properties:
+
+    * maxsize (int): maximum number of topics held
+    * hits, misses (int): numbers of successful and unsuccessful lookups
+    '''
+    def __init__(self, maxsize=32):
+        """
+        * maxsize (int): maximum number of topics held
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+    # ---------
+    def get(self, key):
+        "Return the entry for *key*, or None if it is not held"
+        entry = self._entries.get(key, None)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return entry
+    # ---------
+    def put(self, key, entry):
+        "Add an entry, discarding the least recently used if the cache is full"
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    # ---------
+    def clear(self):
+        "Discard all entries"
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,248 @@
+"""
+Export utilities for use by the plTimeLine() class
+
+Not generally intended for end users
+"""
+import os
+import json
+import uuid
+import zlib
+import pickle
+import datetime
+from plotly.offline import get_plotlyjs_version
+from plotly.io.json import to_json_plotly
+
+_EPOCH = datetime.date(1970, 1, 1)
+
+# ------------------------------------------------------------------------------------------------
+def _x_to_number(x):
+    """
+    Convert a Plotly x value to a number comparable with the JavaScript side of a tiled export:
+    milliseconds since 1970 for dates, the value itself for years. Returns None for missing values
+    """
+    if x is None:
+        return None
+    elif isinstance(x, datetime.date):
+        return (x - _EPOCH).days * 86400000
+    else:
+        return float(x)
+# ------------------------------------------------------------------------------------------------
+def _trace_extent(trace):
+    "Return (min x, max x) of a trace as numbers, or None if it has no usable x values"
+    xs = [xn for x in (trace.x or []) if (xn := _x_to_number(x)) is not None]
+    return (min(xs), max(xs)) if xs else None
+# ------------------------------------------------------------------------------------------------
+def split_tiles(figure, ntiles=20):
+    """
+    Split the traces of a figure into *ntiles* time-window tiles
+
+    Each trace is placed in the tile containing the start of its x range. Returns a duple
+    (untiled, tiles), where *untiled* is a list of trace indices that have no usable x values
+    and *tiles* is a list of dicts with keys *x0*, *x1* (the actual extent of the traces in the tile)
+    and *traces* (a list of trace indices). Empty tiles are omitted.
+    """
+    extents = [_trace_extent(trace) for trace in figure.data]
+    untiled = [i for i, extent in enumerate(extents) if extent is None]
+    tiled = [i for i, extent in enumerate(extents) if extent is not None]
+    if not tiled:
+        return untiled, []
+
+    start = min(extents[i][0] for i in tiled)
+    end = max(extents[i][0] for i in tiled)
+    width = (end - start) / ntiles if end > start else 1.0
+
+    tiles = [{"x0":None, "x1":None, "traces":[]} for _ in range(ntiles)]
+    for i in tiled:
+        x0, x1 = extents[i]
+        tile = tiles[min(int((x0 - start) / width), ntiles - 1)]
+        tile["traces"].append(i)
+        tile["x0"] = x0 if tile["x0"] is None else min(tile["x0"], x0)
+        tile["x1"] = x1 if tile["x1"] is None else max(tile["x1"], x1)
+    return untiled, [tile for tile in tiles if tile["traces"]]
+# ------------------------------------------------------------------------------------------------
+_TILED_SHELL = """<html>
+<head><meta charset="utf-8" />
+<script charset="utf-8" src="{cdn_url}"></script></head>
+<body>
+<div id="hdtimeline" style="height:100%; width:100%;"></div>
+<script type="text/javascript">
+(function() {{
+    var gd = document.getElementById("hdtimeline");
+    var layout = {layout};
+    var config = {config};
+    var tiles = {tiles};
+    var isdate = {isdate};
+    function tonumber(v) {{
+        if (!isdate) return Number(v);
+        var s = String(v);
+        if (s.length <= 10) s = s + "T00:00";
+        return Date.parse(s.replace(" ", "T"));
+    }}
+    function loadvisible(range) {{
+        var lo = tonumber(range[0]), hi = tonumber(range[1]);
+        tiles.forEach(function(tile) {{
+            if (tile.requested || tile.x1 < lo || tile.x0 > hi) return;
+            tile.requested = true;
+            fetch(tile.url).then(function(r) {{ return r.json(); }})
+                .then(function(traces) {{ return Plotly.addTraces(gd, traces); }})
+                .then(function() {{ gd.emit("hdtimelines_tracesadded"); }});
+        }});
+    }}
+    Plotly.newPlot(gd, {base}, layout, config){then_post_script}.then(function() {{
+        loadvisible(gd.layout.xaxis.range);
+        gd.on("plotly_relayout", function() {{ loadvisible(gd.layout.xaxis.range); }});
+    }});
+}})();
+</script>
+</body>
+</html>
+"""
+# ------------------------------------------------------------------------------------------------
+def write_html_tiled(figure, filename, config=None, isdate=True, ntiles=20, post_script=None):
+    """
+    Write a figure as a small HTML shell plus a directory of JSON tiles, one per time window
+
+    The tiles are written to a directory named after *filename* (e.g. *timeline.html*
+    writes tiles to *timeline_tiles/*). The shell fetches tiles that intersect the visible x axis
+    range when the page loads and whenever the user pans or zooms, so the files must be served
+    over HTTP: browsers do not allow *fetch()* from local files.
+
+    * isdate: True if the x axis is a date axis (xmode="date"), False if it is in years
+    * post_script: as for *write_html_streaming()*. The plot emits an *hdtimelines_tracesadded* event each time
+      the traces of a tile are added, so scripts that act on traces can run again then
+    """
+    tiledir = f"{os.path.splitext(filename)[0]}_tiles"
+    os.makedirs(tiledir, exist_ok=True)
+
+    untiled, tiles = split_tiles(figure, ntiles=ntiles)
+    manifest = []
+    for itile, tile in enumerate(tiles):
+        tilename = f"tile_{itile:04d}.json"
+        with open(os.path.join(tiledir, tilename), "w", encoding="utf-8") as f:
+            f.write(to_json_plotly([figure.data[i].to_plotly_json() for i in tile["traces"]]))
+        manifest.append({"url":f"{os.path.basename(tiledir)}/{tilename}", "x0":tile["x0"], "x1":tile["x1"]})
+
+    html = _TILED_SHELL.format(
+        cdn_url=f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js",
+        layout=to_json_plotly(figure.layout.to_plotly_json()),
+        config=json.dumps(config or {}),
+        tiles=json.dumps(manifest),
+        isdate="true" if isdate else "false",
+        then_post_script=_then_post_script(post_script, "hdtimeline"),
+        base=to_json_plotly([figure.data[i].to_plotly_json() for i in untiled]))
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(html)
+    return len(tiles)
+# ------------------------------------------------------------------------------------------------
+_STREAM_HEAD = """<html>
+<head><meta charset="utf-8" /></head>
+<body>
+<div>
+<script charset="utf-8" src="{cdn_url}"></script>
+<div id="{divid}" class="plotly-graph-div" style="height:100%; width:100%;"></div>
+<script type="text/javascript">
+window.PLOTLYENV=window.PLOTLYENV || {{}};
+var data = [
+"""
+_STREAM_TAIL = """];
+Plotly.newPlot("{divid}", data, {layout}, {config}){then_post_script};
+</script>
+</div>
+</body>
+</html>
+"""
+# ------------------------------------------------------------------------------------------------
+def write_html_streaming(figure, file, config=None, engine=None, post_script=None):
+    """
+    Write a figure as html, serialising one trace at a time, so that the whole figure JSON 
+    is never held in memory at once
+
+    * file: a filename, or a writable text file-like object
+    * engine: JSON encoder, as for *plotly.io.json.to_json_plotly()*: "json", "orjson" (faster, 
+      requires the orjson package), "auto" (orjson if it is installed) or None (Plotly's current default)
+    * post_script: JavaScript to run after the plot is created, as for Plotly's *write_html()*. 
+      "{plot_id}" is replaced by the id of the plot div.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "w", encoding="utf-8") as f:
+            write_html_streaming(figure, f, config=config, engine=engine, post_script=post_script)
+        return
+
+    divid = str(uuid.uuid4())
+    file.write(_STREAM_HEAD.format(cdn_url=f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js",
+                                   divid=divid))
+    for trace in figure.data:
+        file.write(to_json_plotly(trace.to_plotly_json(), engine=engine))
+        file.write(",\n")
+    file.write(_STREAM_TAIL.format(divid=divid, 
+                                   layout=to_json_plotly(figure.layout.to_plotly_json(), engine=engine),
+                                   config=json.dumps(config or {}), 
+                                   then_post_script=_then_post_script(post_script, divid)))
+# ------------------------------------------------------------------------------------------------
+def _then_post_script(post_script, divid):
+    "Return JavaScript running *post_script* (a string or list of strings) after a Plotly.newPlot() promise"
+    return "".join(f".then(function(){{{script.replace('{plot_id}', divid)}}})"
+                   for script in ([post_script] if isinstance(post_script, str) else post_script or []))
+# ------------------------------------------------------------------------------------------------
+_ZOOM_FILTER_SCRIPT = """
+var gd = document.getElementById("{plot_id}");
+var isdate = %s;
+function toyears(v) {
+    if (!isdate) return Number(v);
+    var s = String(v);
+    if (s.length <= 10) s = s + "T00:00";
+    return 1970.0 + Date.parse(s.replace(" ", "T")) / 31556952000.0;
+}
+function zoomfilter() {
+    var range = gd.layout.xaxis.range;
+    var xrange = toyears(range[1]) - toyears(range[0]);
+    var indices = [], visible = [];
+    gd.data.forEach(function(trace, i) {
+        if (!(trace.meta && trace.meta.xrange)) return;
+        var show = !trace.meta.rankhidden && (trace.meta.xrange[0] < xrange) && (xrange <= trace.meta.xrange[1]);
+        if (show !== (trace.visible !== false)) {
+            indices.push(i);
+            visible.push(show);
+        }
+    });
+    if (indices.length) Plotly.restyle(gd, {visible: visible}, indices);
+}
+gd.on("plotly_relayout", zoomfilter);
+gd.on("hdtimelines_tracesadded", zoomfilter);
+"""
+# ------------------------------------------------------------------------------------------------
+def zoom_filter_script(isdate=True):
+    """
+    Return JavaScript, for use as a *post_script* in html output, that shows or hides traces as the user zooms
+
+    Traces with *meta.xrange* = [min_xrange_years, max_xrange_years] are shown only while the displayed
+    x axis range, in years, is greater than min_xrange_years and less than or equal to max_xrange_years,
+    unless *meta.rankhidden* is true (see *plTimeLine.set_max_rank()*).
+    Filtering runs again when traces are loaded by *write_html_tiled()*
+
+    * isdate: True if the x axis is a date axis (xmode="date"), False if it is in years
+    """
+    return _ZOOM_FILTER_SCRIPT % ("true" if isdate else "false")
+# ------------------------------------------------------------------------------------------------
+SNAPSHOT_MAGIC = b"HDTPLSN1"
+# ------------------------------------------------------------------------------------------------
+def write_snapshot(state, filename, compresslevel=6):
+    """
+    Write *state*, a dictionary of picklable values, to a snapshot file: a short header followed by 
+    the zlib-compressed pickle of *state*
+    """
+    with open(filename, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), compresslevel))
+# ------------------------------------------------------------------------------------------------
+def read_snapshot(filename):
+    """
+    Read and return the state dictionary from a snapshot file written by *write_snapshot()*
+
+    Snapshots are pickles, so only read files from trusted sources
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+    if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{filename} is not an hdtimelines snapshot")
+    return pickle.loads(zlib.decompress(data[len(SNAPSHOT_MAGIC):]))
@@ -1,7 +1,11 @@
 import sys
+import copy
+import contextlib
 import datetime
-import pandas as pd
+import concurrent.futures
+import numpy as np
 from plotly.subplots import make_subplots
+import plotly.graph_objects as go
 
 # -- General idea: improves chances of tests and Sphinx builds working if this is included as a submodule
 def add_submodule(path):
@@ -11,8 +15,39 @@ def add_submodule(path):
 add_submodule("hdtimelines")
 add_submodule("historicaldate")
 
-from historicaldate import hdate, hdateutils
-from hdtimelines import hdtimelineutils, lineorganiser, colorgen, pltimelinehelpers
+from historicaldate import hdateutils
+from hdtimelines import hdtimelineutils, lineorganiser, colorgen, pltimelinehelpers, pltexport, pltsize, pltcache, \
+                        memreport
+
+def _load_source(source, dateformat=None):
+    """
+    Read a source and parse its distinct dates. Runs in a worker thread or process.
+    Returns a duple (df, pdates_cache)
+    """
+    df = hdtimelineutils.read_source(source)
+    pdates_cache = {}
+    hdtimelineutils.calc_column_ordinals(df, dateformat=dateformat, pdates_cache=pdates_cache)
+    return df, pdates_cache
+
+def _prepare_chunk(rows, options):
+    """
+    Parse dates and prepare traces for a chunk of events (dictionaries). Runs in a worker process.
+    Returns a list of the results of *pltimelinehelpers.prepare_trace()*, with None for events not shown
+    """
+    pdates_cache = {}
+    prepared = []
+    for row in rows:
+        tracedates = pltimelinehelpers.calc_trace_dates(row, showbirthanddeath=options["showbirthanddeath"],
+                                                        dateformat=options["dateformat"], pdates_cache=pdates_cache)
+        if pltimelinehelpers.in_study_range(tracedates, options["study_ordinal_start"], options["study_ordinal_end"]):
+            prepared.append(pltimelinehelpers.prepare_trace(row, tracedates, 
+                                showbirthanddeath=options["showbirthanddeath"], showlabel=options["showlabel"], 
+                                hover_datetype=options["hover_datetype"], marker_symbol=options["marker_symbol"],
+                                xmode=options["xmode"], dateformat=options["dateformat"], 
+                                pointinterval=options["pointinterval"], sample_range=options["sample_range"]))
+        else:
+            prepared.append(None)
+    return prepared
 
 class plTimeLine():
     """
@@ -20,7 +55,8 @@ class plTimeLine():
     """
     def __init__(self, title=None, mindate=None, maxdate=None, 
                 hovermode='closest', hoverdistance=5, xmode="date", dateformat=None,
-                transition=None, scrollzoom=True):
+                transition=None, scrollzoom=True, zoom_filtering=False, trace_cache=None,
+                workers=None, chunksize=2000, compact=False, plot_width=None, measure_memory=False):
         """
         * title: str
         * mindate: Python datetime.date, or ordinal (int) or (HDate format) string
@@ -29,6 +65,25 @@ class plTimeLine():
         * xmode: "date" (default, allows AD only) or "years". Controls how the X axis is displayed in the Plotly figure
         * dateformat: as for HDate()
         * transition: Graph transition, a dict such as {'duration': 500, 'easing': 'cubic-in-out'} if transition is required
+        * zoom_filtering: if True, events are not filtered on min_xrange_years and max_xrange_years when topics are added.
+          Instead all events are drawn, and script in the html output shows or hides them as the user zooms.
+          Events hidden at the current zoom level still take up space on their lines.
+        * trace_cache: a *pltcache.TraceCache()*, which may be shared between plTimeLine() objects. 
+          Topics added by *add_topic()* are then placed from the cache if they have been drawn before
+          with the same x axis range and options
+        * workers: if given, date parsing and hover text for topics with more than *chunksize* events are prepared
+          in chunks of *chunksize* events, in a pool of *workers* processes. Events are then allocated to lines 
+          and drawn in order, as usual
+        * compact: if True, the figure is made smaller (typically by half or more) by moving properties shared by 
+          most traces into the layout template, rounding coordinates to the precision needed by the x axis range, 
+          and leaving out properties that are not needed while the legend is hidden
+        * plot_width: if given, the expected width of the plot area in pixels. Points on lines, which carry hover text, 
+          are then spaced as far apart as *hoverdistance* allows at that width and the initial x axis range, 
+          and parts of lines outside the x axis range are drawn from their end points only.
+          If not given, points are spaced at 1/200 of the x axis range along the whole of each line
+        * measure_memory: if True, the memory allocated and time taken by each call to *add_topic()*, 
+          *add_topic_from_df()* and *append_events()* are measured with tracemalloc (see *memreport.measure()*),
+          and listed by *memory_report()*. Tracing slows building down considerably
         """
         if xmode not in {"date","years"}:
             raise ValueError(f"xmode must be 'date' or 'years', not '{xmode}'")
@@ -47,10 +102,16 @@ class plTimeLine():
                         if maxdate is None else hdateutils.to_ordinal(maxdate)
         self.mindate = hdateutils.to_ordinal(self.maxdate, delta= -int(200*365.25)) \
                             if mindate is None else hdateutils.to_ordinal(mindate)
-        self.pointinterval = int((self.maxdate - self.mindate) / 200.0)
+        self._plot_width = plot_width
+        if plot_width:
+            self.pointinterval = pltimelinehelpers.hover_pointinterval(self.maxdate - self.mindate, plot_width, 
+                                                                       hoverdistance=hoverdistance)
+        else:
+            self.pointinterval = int((self.maxdate - self.mindate) / 200.0)
         self.initial_range_years = (self.maxdate - self.mindate) / 365.
 
         self.fig_config = {'scrollZoom': scrollzoom}
+        self._zoom_filtering = zoom_filtering
         self.figure.update_layout(
             dragmode="pan", 
             showlegend=False, 
@@ -65,10 +126,29 @@ class plTimeLine():
         self.earliest = None # Earliest ordinal appearing in this object
         self.latest = None   # and the latest
         self.topics = []   # List of basic information about topics: title, min_y, max_y
+        self._topic_states = []   # Layout state of each topic in self.topics, used by append_events()
+        self._pdates_cache = {}   # Parsed dates, see hdtimelineutils.get_pdates()
+        self._trace_ordinals = []   # Ordinals each trace in self.figure.data was drawn from, used by reproject()
+        self._memory_measurements = [] if measure_memory else None
+        self._trace_cache = trace_cache
+        self._workers = workers
+        self._chunksize = chunksize
+        self._compact = None
+        if compact:
+            self._set_compact()
 
+# -------------
+    def _sample_range(self):
+        "Ordinals of the x axis range that points on lines are placed in, or None if they are placed along whole lines"
+        return (self.mindate, self.maxdate) if self._plot_width else None
+# -------------
+    def _set_compact(self):
+        "Switch to compact output for traces added from now on"
+        self._compact = {"xdecimals":pltimelinehelpers.compact_xdecimals(self.initial_range_years, xmode=self._xmode)}
+        self.figure.update_layout(template=pltimelinehelpers.compact_template())
 # -------------
     @classmethod
-    def from_hdtimeline(cls, hdtl, *args, **kwargs):
+    def from_hdtimeline(cls, hdtl, *args, max_bytes=None, max_traces=None, **kwargs):
         '''
         Class method: construct a plTimeLine() from an hdTimeLine()
         
@@ -76,10 +156,114 @@ class plTimeLine():
 
         *args, **kwargs correspond to arguments of the plTimeLine() constructor, except that *title* is not
         allowed here, but is instead always taken from hdtl.title
+
+        max_bytes, max_traces: optional output budget, see *fit_budget()*
         '''
         pltl = cls(hdtl.title, *args, **kwargs)
+        options = {}
+        if max_bytes is not None or max_traces is not None:
+            options, _ = pltl.fit_budget(hdtl.topics, max_bytes=max_bytes, max_traces=max_traces)
         for topic in hdtl.topics:
-            pltl.add_topic(topic)            
+            pltl.add_topic(topic, **options)            
+        return pltl
+# -------------
+    def estimate_size(self, topics, showbirthanddeath=True, showlabel=True, max_rank=1, compact=None):
+        """
+        Estimate the size of the traces that adding *topics* (a list of hdTopic()) would produce, 
+        with the current x axis range and *pointinterval*, without building anything.
+        *compact* defaults to whether this plTimeLine() has compact output.
+
+        Returns a dictionary with keys traces, points, bytes (approximate size of the figure JSON)
+        """
+        return pltsize.estimate_topics(topics, self.mindate, self.maxdate, self.pointinterval, 
+                                       showbirthanddeath=showbirthanddeath, showlabel=showlabel, 
+                                       max_rank=max_rank, xmode=self._xmode, 
+                                       compact=(self._compact is not None) if compact is None else compact,
+                                       sample_range=self._sample_range())
+# -------------
+    def fit_budget(self, topics, max_bytes=None, max_traces=None, showbirthanddeath=True, showlabel=True, max_rank=1):
+        """
+        Adjust settings so that adding *topics* (a list of hdTopic()) stays within a size budget, 
+        so far as possible. Call this before adding topics. In order:
+
+        * compact output is switched on (see the *compact* argument of plTimeLine())
+        * *pointinterval* (days between points on lines, so hover text resolution) is raised as far as needed
+        * births and deaths are not shown
+
+        * max_bytes: approximate maximum size of the figure JSON
+        * max_traces: maximum number of traces
+
+        Returns a duple (options, estimate): *options* is a dictionary of arguments to pass to *add_topic()*,
+        and *estimate* is as from *estimate_size()* with the chosen settings, and may still exceed the budget.
+        If no pointinterval meets the budget, pointinterval is left unchanged
+        """
+        def within_budget(estimate):
+            return (max_bytes is None or estimate["bytes"] <= max_bytes) and \
+                   (max_traces is None or estimate["traces"] <= max_traces)
+
+        def estimate(options):
+            return self.estimate_size(topics, showlabel=showlabel, max_rank=max_rank, **options)
+
+        options = {"showbirthanddeath":showbirthanddeath}
+        if within_budget(est := estimate(options)):
+            return options, est
+        if self._compact is None and max_bytes is not None and est["bytes"] > max_bytes:
+            self._set_compact()
+
+        original_interval = self.pointinterval
+        for sbd in ([True, False] if showbirthanddeath else [False]):
+            options["showbirthanddeath"] = sbd
+            self.pointinterval = original_interval
+            if within_budget(est := estimate(options)):
+                return options, est
+            if max_traces is not None and est["traces"] > max_traces:
+                continue    # pointinterval does not affect the number of traces
+            # -- Find the smallest sufficient pointinterval: double it, then bisect
+            maxinterval = max(self.maxdate - self.mindate, 1)
+            low, high = self.pointinterval, self.pointinterval
+            while high < maxinterval and not within_budget(estimate(options)):
+                low, high = high, min(max(2 * high, 1), maxinterval)
+                self.pointinterval = high
+            if within_budget(est := estimate(options)):
+                while high - low > 1:
+                    self.pointinterval = (low + high) // 2
+                    if within_budget(estimate(options)):
+                        high = self.pointinterval
+                    else:
+                        low = self.pointinterval
+                self.pointinterval = high
+                return options, estimate(options)
+        self.pointinterval = original_interval
+        return options, estimate(options)
+# -------------
+    def save(self, filename, compresslevel=6):
+        """
+        Save this plTimeLine() to a compact binary snapshot file, including the figure, topic y-ranges,
+        layout state of each topic and parsed dates, so that it can be restored by *plTimeLine.load()* 
+        and then extended without being rebuilt
+
+        * compresslevel: zlib compression level, 0-9
+        """
+        state = dict(self.__dict__)
+        state["figure"] = self.figure.to_plotly_json()
+        state["_trace_cache"] = None    # Shared between figures, so not saved
+        pltexport.write_snapshot({"format":1, "state":state}, filename, compresslevel=compresslevel)
+# -------------
+    @classmethod
+    def load(cls, filename):
+        """
+        Class method: restore a plTimeLine() saved by *save()*
+
+        Usage: *pltl = pltimeline.plTimeLine.load(filename)*
+
+        Snapshots are Python pickles: load only files from trusted sources
+        """
+        snapshot = pltexport.read_snapshot(filename)
+        if snapshot.get("format") != 1:
+            raise ValueError(f"{filename}: unsupported snapshot format {snapshot.get('format')}")
+        pltl = cls.__new__(cls)
+        pltl.__dict__.update(snapshot["state"])
+        pltl.figure = go.Figure(snapshot["state"]["figure"])
         return pltl
 # -------------
     def fit_xaxis(self, mindate=None, maxdate=None):
@@ -105,13 +289,65 @@ class plTimeLine():
                 self.figure.update_xaxes(range=[hdateutils.to_years(self.mindate), 
                                             hdateutils.to_years(self.maxdate)], side="top")
         return fitted 
+# -------------
+    def reproject(self, xmode=None, pointinterval=None, dateformat=None):
+        """
+        Redraw the x values of all traces for a different x mode and/or point interval, from the ordinals they
+        were drawn from, without rebuilding the figure. Lines, markers and labels stay on the same lines.
+
+        * xmode: "date" or "years", as for plTimeLine(); unchanged if None. 
+          Lines that cannot be shown on a date axis (BC dates) are left without x values in date mode
+        * pointinterval: days between points on lines; unchanged if None. 
+          For example, after changing the x axis range with *fit_xaxis()*, 
+          *pltl.reproject(pointinterval=int((pltl.maxdate - pltl.mindate) / 200))*
+        * dateformat: as for plTimeLine(), used when parsing dates of topics added from now on; unchanged if None
+        """
+        if xmode is not None:
+            if xmode not in {"date","years"}:
+                raise ValueError(f"xmode must be 'date' or 'years', not '{xmode}'")
+            self._xmode = xmode
+        if pointinterval is not None:
+            self.pointinterval = max(int(pointinterval), 1)
+        if dateformat is not None:
+            dateformat_valid = {"default", "mdy", "dmy"}
+            if dateformat not in dateformat_valid:
+                raise ValueError(f"dateformat must be in {dateformat_valid}, not '{dateformat}'")
+            if (dateformat := None if dateformat == "default" else dateformat) != self._dateformat:
+                self._dateformat = dateformat
+                self._pdates_cache = {}
+        if self._compact is not None:
+            self._compact["xdecimals"] = pltimelinehelpers.compact_xdecimals(self.initial_range_years, 
+                                                                             xmode=self._xmode)
+
+        # -- Convert the points of all traces at once
+        sample_range = self._sample_range()
+        points = [pltimelinehelpers.trace_points(ordinals, self.pointinterval, sample_range=sample_range)
+                    for ordinals in self._trace_ordinals]
+        xs = pltimelinehelpers.ordinals_to_x([ordinal for tpoints in points for ordinal in tpoints], 
+                                             xmode=self._xmode)
+        xdecimals = self._compact.get("xdecimals") if self._compact is not None else None
+        if xdecimals is not None:
+            xs = [round(x, xdecimals) for x in xs]
+
+        with self.figure.batch_update():
+            start = 0
+            for trace, ordinals, tpoints in zip(self.figure.data, self._trace_ordinals, points):
+                tx = xs[start:start + len(tpoints)]
+                start += len(tpoints)
+                if self._xmode == "date" and len(ordinals) == 2 and ordinals[0] <= 0:
+                    tx = [None for _ in tx]   # Not shown, as when lines are first drawn
+                update = {"x":tx, "y":[trace.y[0] for _ in tx]}
+                if isinstance(trace.hovertext, (tuple, list)):
+                    update["hovertext"] = [trace.hovertext[0] for _ in tx[:-1]] + [trace.hovertext[-1]]
+                trace.update(update)
+        self.fit_xaxis()
 # -------------
     def add_topic_from_df(self, df, 
                     title="", showbirthanddeath=True, showlabel=True,
                     lives_first=True,  rowspacing=0.3, hover_datetype='day',
                     marker_symbol='diamond',
                     study_range_start=None, study_range_end=None,
-                    max_rank=1, id=0):
+                    max_rank=1, id=0, layout="firstfit", rank_tiers=None):
         """
         Add topic to Plotly figure from a dataframe
 
@@ -125,19 +361,136 @@ class plTimeLine():
             url: hyperlink (optional)
 
         study_range_start, study_range_end may be Python dates, ordinals or (HDate) strings
+
+        layout controls how events are allocated to lines:
+            "firstfit" (default): each event goes on the first line with space, in display order
+            "optimal": events are packed into the minimum number of lines (see *LineOrganiser.add_traces()*)
+
+        rank_tiers, if given, is an increasing list of ranks, e.g. [1, 2, 3]. Events of rank up to the last of these
+        are then drawn, one tier at a time, with each tier's events placed on lines around those of the tiers before.
+        Events of rank above max_rank are hidden, and can be shown or hidden later by *set_max_rank()*
+        without rebuilding the topic
         """
-        cgen = colorgen.ColorGen()
-        colorcol = "color" if "color" in df.columns \
-                    else "colour" if "colour" in df.columns \
-                    else ""
+        with self._measuring("add_topic_from_df", title):
+            state = self._new_topic_state(rowspacing=rowspacing, max_rank=max_rank, layout=layout, 
+                                          rank_tiers=rank_tiers, showbirthanddeath=showbirthanddeath, showlabel=showlabel,
+                                          hover_datetype=hover_datetype, marker_symbol=marker_symbol,
+                                          study_range_start=study_range_start, study_range_end=study_range_end)
+
+            some_events_added = self._add_topic_rows(self._select_rows(df, state["max_rank"]), state, 
+                                                     self.max_y_used, lives_first=lives_first)
+
+            # The event set is ignored if it lies entirely outside the study range
+            if some_events_added:
+                self._finish_topic(title, id, state)
+        
+            self._update_extent(state["lo"])
+            return some_events_added
+# -------------
+    def _new_topic_state(self, rowspacing=0.3, max_rank=1, layout="firstfit", rank_tiers=None, **trace_options):
+        """
+        Return the layout state for a new topic, kept so that events can be appended to the topic later
+        *trace_options* are arguments to *add_timeline_trace()*
+        """
+        if layout not in {"firstfit", "optimal"}:
+            raise ValueError(f"layout must be 'firstfit' or 'optimal', not '{layout}'")
+        if rank_tiers is not None:
+            rank_tiers = list(rank_tiers)
+            if not rank_tiers or any(r1 >= r2 for r1, r2 in zip(rank_tiers[:-1], rank_tiers[1:])):
+                raise ValueError(f"rank_tiers must be a non-empty increasing list of ranks, not {rank_tiers}")
 
+        lo = lineorganiser.LineOrganiser(daysperlabelchar=2.75 * self.initial_range_years,
+                                         daysminspacing=0.5 * self.initial_range_years)
+        # -- max_rank: highest rank drawn. With rank_tiers, shown_rank is the highest rank shown, 
+        # -- tier_lines the number of lines used by each tier and those before it, 
+        # -- and trace_tiers the tier of each trace in traces
+        return {"lo":lo, "cgen":colorgen.ColorGen(), "rowspacing":rowspacing, 
+                "max_rank":rank_tiers[-1] if rank_tiers else max_rank, "layout":layout, 
+                "traces":[], "annotation":None, "trace_options":trace_options,
+                "rank_tiers":rank_tiers, "shown_rank":max_rank, 
+                "tier_lines":[0 for _ in rank_tiers] if rank_tiers else None, "trace_tiers":[]}
+# -------------
+    def _finish_topic(self, title, id, state):
+        "Add the title annotation of a topic whose traces have been drawn from self.max_y_used, and record it"
         ystart = self.max_y_used
+        if title:
+            self.figure.add_annotation(text=f"{title}", # -- text=f"<b>{title}</b>" always comes out quite ugly using Bootstrap
+                    x=0.02, xref='paper', y=self.max_y_used, 
+                    showarrow=False, font={'size':14})
+            state["annotation"] = len(self.figure.layout.annotations) - 1
+
+        self.max_y_used += (self._topic_lines(state) + 2) * state["rowspacing"]
+        self.topics.append({"title":title, "min_y":ystart, "max_y":self.max_y_used, "id":id})
+        self._topic_states.append(state)
+        self.figure.update_yaxes(range=[max(self.max_y_used+0.25,6.0),-0.25], 
+                                visible=False)
+# -------------
+    def add_topics_from_sources(self, sources, max_workers=None, use_processes=False):
+        """
+        Add several topics, reading their sources and parsing their dates concurrently, 
+        then adding them to the figure in order.
+
+        * sources: list of (title, source) or (title, source, options) tuples. Each source may be a .csv filename, 
+          a Pandas DataFrame, or a callable returning a DataFrame (e.g. one that reads and merges several files).
+          options is a dictionary of other arguments to *add_topic_from_df()*, e.g. {"hover_datetype":"year"}
+        * max_workers, use_processes: as for *hdTimeLine.add_topics_from_sources()*
+
+        Returns a duple (added, errors): *added* is a list, in the order of *sources*, of the values returned by 
+        *add_topic_from_df()*, with None for sources that failed, and *errors* is a dictionary of exceptions 
+        keyed by position in *sources*
+        """
+        sources = list(sources)
+        loaded, errors = hdtimelineutils.map_concurrently(_load_source, 
+                                        [(source[1], self._dateformat) for source in sources],
+                                        max_workers=max_workers, use_processes=use_processes)
+        added = [None] * len(sources)
+        for index, (source, result) in enumerate(zip(sources, loaded)):
+            if result is not None:
+                df, pdates_cache = result
+                self._pdates_cache.update(pdates_cache)
+                options = source[2] if len(source) > 2 else {}
+                try:
+                    added[index] = self.add_topic_from_df(df, title=source[0], **options)
+                except Exception as e:
+                    errors[index] = e
+        return added, errors
+# -------------
+    def append_events(self, topic_id, df):
+        """
+        Add further events, passed as a dataframe *df*, to a topic already in the figure
+
+        Only the new events are placed, using the topic's saved line layout and display options. 
+        If the topic needs more lines, the topics below it are shifted down.
+        Returns True if any events are added
+        """
+        index = next((i for i, topic in enumerate(self.topics) if topic["id"] == topic_id), None)
+        if index is None:
+            raise ValueError(f"No topic with id {topic_id} found")
+        with self._measuring("append_events", self.topics[index]["title"]):
+            topic, state = self.topics[index], self._topic_states[index]
+            lo = state["lo"]
+
+            nlines = self._topic_lines(state)
+            some_events_added = self._add_topic_rows(self._select_rows(df, state["max_rank"]), state, 
+                                                     topic["min_y"], lives_first=False)
 
+            if (dy := (self._topic_lines(state) - nlines) * state["rowspacing"]) > 0:
+                topic["max_y"] += dy
+                self._shift_topics(index + 1, dy)
+                self.max_y_used += dy
+                self.figure.update_yaxes(range=[max(self.max_y_used+0.25,6.0),-0.25], 
+                                        visible=False)
+
+            self._update_extent(lo)
+            return some_events_added
+# -------------
+    def _select_rows(self, df, max_rank):
+        "Sort a dataframe of events into display order and filter it by rank and x range"
         if "hdate" in df.columns:
-            df["_hdplsortorder"] = df["hdate"].apply(lambda x: hdateutils.calc_mid_ordinal(x, dateformat=self._dateformat))
+            df["_hdplsortorder"] = self._mid_ordinals(df, "start")
             dfs = df.sort_values("_hdplsortorder")
         elif "hdate_birth" in df.columns:
-            df["_hdplsortorder"] = df["hdate_birth"].apply(lambda x: hdateutils.calc_mid_ordinal(x, dateformat=self._dateformat))
+            df["_hdplsortorder"] = self._mid_ordinals(df, "birth")
             dfs = df.sort_values("_hdplsortorder") 
         else:
             dfs = df
@@ -147,76 +500,444 @@ class plTimeLine():
 
         xrange_years = hdateutils.to_years(self.maxdate) - hdateutils.to_years(self.mindate)
         if "min_xrange_years" in dfs.columns:
-            dfs = dfs[dfs["min_xrange_years"].replace({"":0.0}).astype(float).fillna(value=0.0) < xrange_years]
+            min_xrange = dfs["min_xrange_years"].replace({"":0.0}).astype(float).fillna(value=0.0)
+            dfs = dfs.assign(_hdplminxrange=min_xrange) if self._zoom_filtering else dfs[min_xrange < xrange_years]
         if "max_xrange_years" in dfs.columns:
-            dfs = dfs[dfs["max_xrange_years"].replace({"":1.0e9}).astype(float).fillna(value=1.0e9) >= xrange_years]
-
-        lo = lineorganiser.LineOrganiser(daysperlabelchar=2.75 * self.initial_range_years,
-                                         daysminspacing=0.5 * self.initial_range_years)
-
-        def disp_set(dfset, marker_symbol='diamond'):
-            some_traces_added = False
-            for _, row in dfset.iterrows():  
-                color = row[colorcol] if colorcol and row[colorcol] else cgen.get()
-                some_traces_added = self.add_timeline_trace(row, 
-                                showbirthanddeath=showbirthanddeath, showlabel=showlabel,
-                                color=color, lo=lo, hover_datetype=hover_datetype,
-                                marker_symbol=marker_symbol,
-                                study_range_start=study_range_start, 
-                                study_range_end=study_range_end) or \
-                            some_traces_added
-            return some_traces_added
+            max_xrange = dfs["max_xrange_years"].replace({"":1.0e9}).astype(float).fillna(value=1.0e9)
+            dfs = dfs.assign(_hdplmaxxrange=max_xrange) if self._zoom_filtering else dfs[max_xrange >= xrange_years]
+        return dfs
+# -------------
+    def _add_topic_rows(self, dfs, state, ystart, lives_first=True):
+        """
+        Add traces for the rows of a (sorted, filtered) dataframe to a topic whose first line is at *ystart*,
+        using and updating the topic layout *state*. Returns True if any traces are added
+        """
+        colorcol = "color" if "color" in dfs.columns \
+                    else "colour" if "colour" in dfs.columns \
+                    else ""
 
         # -- split lives and display them first if required
-        some_events_added = False
+        row_sets = []
         if "hdate_birth" in dfs.columns and lives_first:
-            dfs["_hdplbirth"] = dfs["hdate_birth"].apply(lambda x: hdateutils.calc_mid_ordinal(x, dateformat=self._dateformat))
+            dfs["_hdplbirth"] = self._mid_ordinals(dfs, "birth")
             df_lives = dfs[dfs["_hdplbirth"].notna()]  # .sort_values(["_hdplbirth"])
-            some_events_added = disp_set(df_lives, marker_symbol=marker_symbol) or some_events_added
+            row_sets.append([row for _, row in df_lives.iterrows()])
             dfs = dfs[dfs["_hdplbirth"].isna()]   # -- not lives
-            lo.reset_startline()
 
-        some_events_added = disp_set(dfs, marker_symbol=marker_symbol) or some_events_added 
+        row_sets.append([row for _, row in dfs.iterrows()])
+        return self._add_row_sets(row_sets, state, ystart, colorcol)
+# -------------
+    def _add_row_sets(self, row_sets, state, ystart, colorcol=""):
+        """
+        Add traces for sets of events (Pandas Series or dictionaries, sorted and filtered) to a topic 
+        whose first line is at *ystart*, using and updating the topic layout *state*. 
+        Each set after the first starts again from the topic's first line.
+        Returns True if any traces are added
+        """
+        lo, cgen = state["lo"], state["cgen"]
+        rank_tiers = state["rank_tiers"]
+        executor = None     # Worker processes for _prepare_rows(), started when first needed and shared by all sets
 
-        # The event set is ignored if it lies entirely outside the study range
-        if some_events_added:
-            if title:
-                self.figure.add_annotation(text=f"{title}", # -- text=f"<b>{title}</b>" always comes out quite ugly using Bootstrap
-                        x=0.02, xref='paper', y=self.max_y_used, 
-                        showarrow=False, font={'size':14})
-
-            self.max_y_used += (len(lo.linerecord) + 2) * rowspacing
-            self.topics.append({"title":title, "min_y":ystart, "max_y":self.max_y_used, "id":id})
-            self.figure.update_yaxes(range=[max(self.max_y_used+0.25,6.0),-0.25], 
-                                    visible=False)
-        
+        def disp_set(rows, tier=0):
+            nonlocal executor
+            ilines = [None] * len(rows)
+            tracedates = [None] * len(rows)
+            prepared = None
+            if self._workers and len(rows) > self._chunksize:
+                if executor is None:
+                    executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._workers)
+                prepared = self._prepare_rows(rows, state["trace_options"], executor)
+            if prepared is not None and state["layout"] == "optimal":
+                shown = [i for i, prep in enumerate(prepared) if prep is not None]
+                for i, iline in zip(shown, lo.add_traces(
+                        [(prepared[i]["earliest"], prepared[i]["latest"], prepared[i]["labeldate"],
+                          prepared[i]["text"] if state["trace_options"]["showlabel"] else "") for i in shown])):
+                    ilines[i] = iline
+            elif state["layout"] == "optimal":
+                # -- Find all the lines first, using the same dates that will be drawn
+                options = state["trace_options"]
+                tracedates = [self._calc_trace_dates(row, showbirthanddeath=options["showbirthanddeath"])
+                                for row in rows]
+                shown = [i for i, (row, dates) in enumerate(zip(rows, tracedates)) 
+                            if self._in_study_range(dates, options["study_range_start"], options["study_range_end"])
+                                and dates["labeldate"] is not None]
+                for i, iline in zip(shown, lo.add_traces(
+                        [(tracedates[i]["earliest"], tracedates[i]["latest"], tracedates[i]["labeldate"],
+                          rows[i]["label"] if options["showlabel"] else "") for i in shown])):
+                    ilines[i] = iline
+
+            some_traces_added = False
+            for irow, (row, iline, dates) in enumerate(zip(rows, ilines, tracedates)):  
+                color = row.get(colorcol) if colorcol and row.get(colorcol) else cgen.get()
+                ntraces = len(self.figure.data)
+                if prepared is not None and prepared[irow] is None:
+                    continue    # Not shown
+                added = self.add_timeline_trace(row, color=color, lo=lo, ystart=ystart,
+                                                iline=iline, tracedates=dates,
+                                                prepared=prepared[irow] if prepared else None,
+                                                **state["trace_options"])
+                some_traces_added = added or some_traces_added
+                if added and rank_tiers:
+                    # -- Lines shown with this tier and those after it include the line used
+                    nlines = (iline if iline is not None else lo.previoustraceindex) + 1
+                    state["tier_lines"][tier:] = [max(n, nlines) for n in state["tier_lines"][tier:]]
+                state["traces"].extend(range(ntraces, len(self.figure.data)))
+                state["trace_tiers"].extend(tier for _ in range(ntraces, len(self.figure.data)))
+                if self._zoom_filtering:
+                    self._set_zoom_range(range(ntraces, len(self.figure.data)), 
+                                         row.get("_hdplminxrange", 0.0), row.get("_hdplmaxxrange", 1.0e9))
+            return some_traces_added
+
+        some_events_added = False
+        try:
+            for tier in range(len(rank_tiers) if rank_tiers else 1):
+                if tier > 0:
+                    lo.startline = 0    # Each tier may use space on the lines of the tiers before it
+                for iset, rows in enumerate(row_sets):
+                    if iset > 0:
+                        lo.reset_startline()
+                    if rank_tiers:
+                        rows = [row for row in rows if self._rank_tier(row, rank_tiers) == tier]
+                    some_events_added = disp_set(rows, tier) or some_events_added 
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if rank_tiers:
+            self._show_rank_tiers(state)
+        return some_events_added
+# -------------
+    @staticmethod
+    def _rank_tier(row, rank_tiers):
+        "Return the position in *rank_tiers* of the tier an event (Pandas Series or dictionary) belongs to"
+        rank = row.get("rank", None)
+        if rank is None or rank == "" or rank != rank:
+            return 0
+        return next((tier for tier, tier_rank in enumerate(rank_tiers) if rank <= tier_rank), len(rank_tiers) - 1)
+# -------------
+    def _topic_lines(self, state):
+        "Return the number of lines of a topic shown, given its layout state"
+        if not state["rank_tiers"]:
+            return len(state["lo"].linerecord)
+        return max([nlines for tier_rank, nlines in zip(state["rank_tiers"], state["tier_lines"]) 
+                        if tier_rank <= state["shown_rank"]], default=0)
+# -------------
+    def _show_rank_tiers(self, state):
+        """
+        Show the traces of a topic with rank tiers up to its shown_rank, and hide the others, 
+        combined with zoom filtering if used. Returns the number of traces shown or hidden
+        """
+        xrange_years = hdateutils.to_years(self.maxdate) - hdateutils.to_years(self.mindate)
+        nchanged = 0
+        with self.figure.batch_update():
+            for itrace, tier in zip(state["traces"], state["trace_tiers"]):
+                trace = self.figure.data[itrace]
+                meta = dict(trace.meta) if trace.meta else {}
+                hidden = state["rank_tiers"][tier] > state["shown_rank"]
+                if hidden == bool(meta.get("rankhidden", False)):
+                    continue
+                nchanged += 1
+                if hidden:
+                    meta["rankhidden"] = True
+                else:
+                    del meta["rankhidden"]
+                if "xrange" in meta:
+                    visible = (not hidden) and (meta["xrange"][0] < xrange_years <= meta["xrange"][1])
+                else:
+                    visible = False if hidden else None
+                trace.update(meta=meta if meta else None, visible=visible)
+        return nchanged
+# -------------
+    def set_max_rank(self, max_rank, topic_id=None):
+        """
+        Show events of rank up to *max_rank*, and hide the others, in topics added with *rank_tiers*,
+        or only in the topic *topic_id* if given. Only tiers that were drawn can be shown. 
+        Topics shrink or grow to the lines used by the tiers shown, and the topics below them move to suit.
+
+        Returns the number of traces shown or hidden
+        """
+        nchanged = 0
+        for index in range(len(self.topics)):
+            topic, state = self.topics[index], self._topic_states[index]
+            if not state["rank_tiers"] or (topic_id is not None and topic["id"] != topic_id):
+                continue
+            nlines = self._topic_lines(state)
+            state["shown_rank"] = max_rank
+            nchanged += self._show_rank_tiers(state)
+            if dy := (self._topic_lines(state) - nlines) * state["rowspacing"]:
+                topic["max_y"] += dy
+                self._shift_topics(index + 1, dy)
+                self.max_y_used += dy
+        self.figure.update_yaxes(range=[max(self.max_y_used+0.25,6.0),-0.25], 
+                                 visible=False)
+        return nchanged
+# -------------
+    def _prepare_rows(self, rows, trace_options, executor):
+        """
+        Parse dates and prepare traces for events (Pandas Series or dictionaries) in chunks, 
+        in *executor*, a pool of worker processes.
+        Returns a list of the results of *pltimelinehelpers.prepare_trace()*, with None for events not shown
+        """
+        options = {"showbirthanddeath":trace_options["showbirthanddeath"], "showlabel":trace_options["showlabel"],
+                   "hover_datetype":trace_options["hover_datetype"], "marker_symbol":trace_options["marker_symbol"],
+                   "study_ordinal_start":hdateutils.to_ordinal(trace_options["study_range_start"], 
+                                                               dateformat=self._dateformat),
+                   "study_ordinal_end":hdateutils.to_ordinal(trace_options["study_range_end"], 
+                                                             dateformat=self._dateformat),
+                   "xmode":self._xmode, "dateformat":self._dateformat, "pointinterval":self.pointinterval,
+                   "sample_range":self._sample_range()}
+        chunks = [[dict(row) for row in rows[i:i + self._chunksize]] 
+                    for i in range(0, len(rows), self._chunksize)]
+        return [prep for result in executor.map(_prepare_chunk, chunks, [options] * len(chunks)) 
+                    for prep in result]
+# -------------
+    def _set_zoom_range(self, traces, min_xrange_years, max_xrange_years):
+        """
+        Record the x axis ranges (in years) over which traces are shown, for zoom filtering in html output, 
+        and show or hide them to suit the current x axis range
+        """
+        if min_xrange_years > 0.0 or max_xrange_years < 1.0e9:
+            xrange_years = hdateutils.to_years(self.maxdate) - hdateutils.to_years(self.mindate)
+            for itrace in traces:
+                self.figure.data[itrace].update(meta={"xrange":[min_xrange_years, max_xrange_years]},
+                        visible=bool(min_xrange_years < xrange_years <= max_xrange_years))
+# -------------
+    def _post_script(self):
+        "JavaScript to be run after the figure is created in html output, or None"
+        return pltexport.zoom_filter_script(isdate=(self._xmode == "date")) if self._zoom_filtering else None
+# -------------
+    def _mid_ordinals(self, df, dprefix):
+        """
+        Return mid ordinals of the start ("start") or birth ("birth") dates of the rows of a dataframe, 
+        as a column of ints, or floats with NaN where dates are missing, parsing each distinct date only once
+        """
+        ordinals = hdtimelineutils.calc_column_ordinals(df, dateformat=self._dateformat, 
+                                                        pdates_cache=self._pdates_cache)[f"{dprefix}_mid"]
+        return ordinals.astype("float64") if ordinals.isna().any() else ordinals.astype("int64")
+# -------------
+    def _shift_topics(self, start, dy):
+        "Move topics self.topics[start:], with their traces and title annotations, down by *dy*"
+        annotations = self.figure.layout.annotations
+        with self.figure.batch_update():
+            for topic, state in zip(self.topics[start:], self._topic_states[start:]):
+                topic["min_y"] += dy
+                topic["max_y"] += dy
+                for itrace in state["traces"]:
+                    trace = self.figure.data[itrace]
+                    trace.y = [y + dy for y in trace.y]
+                if state["annotation"] is not None:
+                    annotations[state["annotation"]].y += dy
+# -------------
+    def _update_extent(self, lo):
+        "Update the earliest and latest ordinals in this object from those of a LineOrganiser"
         self.earliest = lo.earliest if self.earliest is None else \
                 self.earliest if lo.earliest is None else min(self.earliest, lo.earliest)
         self.latest = lo.latest if self.latest is None else \
                 self.latest if lo.earliest is None else max(self.latest, lo.latest)
-
-        return some_events_added
 # -------------
     def add_topic(self, topic=None, 
                     showbirthanddeath=True, showlabel=True,
                     lives_first=True,  rowspacing=0.3, hover_datetype='day',
                     study_range_start=None, study_range_end=None,
                     marker_symbol='diamond',
-                    max_rank=1):
+                    max_rank=1, layout="firstfit", rank_tiers=None):
         """
         Add topic to Plotly figure from an hdTopic object
         study_range_start, study_range_end may be Python dates, ordinals or (HDate) strings
+        layout and rank_tiers are as for *add_topic_from_df()*
+
+        If this plTimeLine() has a *trace_cache*, a topic drawn before with the same options is placed from the cache
         """
-        df = pd.DataFrame(topic.events)
-        title = topic.title
-        some_events_added = self.add_topic_from_df(df=df, 
-                    title=title, showbirthanddeath=showbirthanddeath, showlabel=showlabel,
-                    lives_first=lives_first,  rowspacing=rowspacing, hover_datetype=hover_datetype,
-                    marker_symbol=marker_symbol,
-                    study_range_start=study_range_start, study_range_end=study_range_end,
-                    max_rank=max_rank, id=topic.id)
+        with self._measuring("add_topic", topic.title):
+            options = {"showbirthanddeath":showbirthanddeath, "showlabel":showlabel,
+                       "lives_first":lives_first, "rowspacing":rowspacing, "hover_datetype":hover_datetype,
+                       "marker_symbol":marker_symbol,
+                       "study_range_start":study_range_start, "study_range_end":study_range_end,
+                       "max_rank":max_rank, "layout":layout, "rank_tiers":rank_tiers}
+            if self._trace_cache is not None:
+                key = self._trace_cache_key(topic, options)
+                if (entry := self._trace_cache.get(key)) is not None:
+                    return self._place_cached_topic(entry, topic.id)
+                ntraces = len(self.figure.data)
+
+            title = topic.title
+            some_events_added = self._add_topic_events(topic, title=title, id=topic.id, **options)
 
+            if self._trace_cache is not None:
+                self._trace_cache.put(key, self._make_cache_entry(title, ntraces, some_events_added))
+            return some_events_added
+# -------------
+    def _add_topic_events(self, topic, title="", id=0, lives_first=True, rowspacing=0.3, max_rank=1, 
+                          layout="firstfit", rank_tiers=None, **trace_options):
+        """
+        Add an hdTopic() to the figure, working directly from its events and ordinals rather than a dataframe.
+        Arguments are as for *add_topic_from_df()*
+        """
+        state = self._new_topic_state(rowspacing=rowspacing, max_rank=max_rank, layout=layout, rank_tiers=rank_tiers,
+                                      **trace_options)
+
+        row_sets, colorcol = self._select_events(topic, state["max_rank"], lives_first)
+        some_events_added = self._add_row_sets(row_sets, state, self.max_y_used, colorcol)
+
+        # The event set is ignored if it lies entirely outside the study range
+        if some_events_added:
+            self._finish_topic(title, id, state)
+        
+        self._update_extent(state["lo"])
         return some_events_added
+# -------------
+    def _select_events(self, topic, max_rank, lives_first=True):
+        """
+        Sort the events of an hdTopic() into display order, filter them by rank and x range, 
+        and split lives from other events if *lives_first*, as *_select_rows()* and *_add_topic_rows()* 
+        do for a dataframe. Returns a duple (list of lists of events, name of color key)
+        """
+        events = topic.events
+        ordinals = topic.ordinals if self._dateformat is None else \
+                    hdtimelineutils.calc_events_ordinals(events, dateformat=self._dateformat, 
+                                                         pdates_cache=self._pdates_cache)
+        keys = set().union(*events) if events else set()
+
+        def mids(dprefix):
+            values = [ordset.get(f"{dprefix}_mid") for ordset in ordinals]
+            return np.array([np.nan if v is None else v for v in values], 
+                            dtype="float64" if None in values else "int64")
+
+        # -- Sorted as by DataFrame.sort_values(): quicksort, with missing values last
+        if "hdate" in keys or "hdate_birth" in keys:
+            sortorder = mids("start" if "hdate" in keys else "birth")
+            missing = np.isnan(sortorder) if sortorder.dtype.kind == "f" else np.zeros(len(events), dtype=bool)
+            index = np.arange(len(events))
+            order = np.concatenate([index[~missing][sortorder[~missing].argsort(kind="quicksort")], 
+                                    index[missing]])
+        else:
+            order = np.arange(len(events))
+
+        if "rank" in keys:
+            order = [i for i in order if pltimelinehelpers.within_rank(events[i].get("rank"), max_rank)]
+
+        def xrange_value(event, key, default):
+            value = event.get(key)
+            return default if value is None or value == "" or value != value else float(value)
+
+        xrange_years = hdateutils.to_years(self.maxdate) - hdateutils.to_years(self.mindate)
+        selected = []
+        for i in order:
+            event = events[i]
+            min_xrange = xrange_value(event, "min_xrange_years", 0.0)
+            max_xrange = xrange_value(event, "max_xrange_years", 1.0e9)
+            if self._zoom_filtering:
+                event = {**event, "_hdplminxrange":min_xrange, "_hdplmaxxrange":max_xrange}
+            elif not (min_xrange < xrange_years and max_xrange >= xrange_years):
+                continue
+            selected.append((i, event))
+
+        if "hdate_birth" in keys and lives_first:
+            births = mids("birth")
+            row_sets = [[event for i, event in selected if births[i] == births[i]],    # Lives (birth not NaN)
+                        [event for i, event in selected if births[i] != births[i]]]
+        else:
+            row_sets = [[event for _, event in selected]]
+
+        colorcol = "color" if "color" in keys else "colour" if "colour" in keys else ""
+        return row_sets, colorcol
+# -------------
+    def _trace_cache_key(self, topic, options):
+        """
+        Key for the trace cache: topic content plus everything that affects how it is drawn, except y position.
+        Other constructor arguments (hovermode, transition, scrollzoom, workers...) affect only the layout, or not 
+        the output at all; hoverdistance is reflected in pointinterval
+        """
+        return (pltcache.topic_hash(topic), self._xmode, self._dateformat, self.mindate, self.maxdate, 
+                self.initial_range_years, self.pointinterval, self._plot_width, self._sample_range(), 
+                self._zoom_filtering, repr(self._compact), repr(sorted(options.items())))
+# -------------
+    def _make_cache_entry(self, title, ntraces, some_events_added):
+        "Make a trace cache entry for the topic just added, whose traces start at self.figure.data[ntraces]"
+        if not some_events_added:
+            return {"title":title, "some_events_added":False}
+        ystart = self.topics[-1]["min_y"]
+        state = self._topic_states[-1]
+        traces = []
+        for trace in self.figure.data[ntraces:]:
+            tdict = trace.to_plotly_json()
+            tdict["y"] = [y - ystart for y in tdict["y"]]
+            traces.append(tdict)
+        # -- Layout state with trace positions relative to the topic's first trace, and no annotation
+        cached_state = copy.deepcopy({**state, "traces":[itrace - ntraces for itrace in state["traces"]],
+                                      "annotation":None})
+        return {"title":title, "some_events_added":True, "traces":traces, "state":cached_state,
+                "ordinals":self._trace_ordinals[ntraces:]}
+# -------------
+    def _place_cached_topic(self, entry, id):
+        "Add a topic from a trace cache entry, moving its traces to the first unused y value"
+        if not entry["some_events_added"]:
+            return False
+        ystart, ntraces = self.max_y_used, len(self.figure.data)
+        traces = []
+        for tdict in entry["traces"]:
+            tdict = dict(tdict)
+            tdict["y"] = [ystart + y for y in tdict["y"]]
+            traces.append(tdict)
+        self.figure.add_traces(traces)
+        self._trace_ordinals.extend(entry["ordinals"])
+
+        state = copy.deepcopy(entry["state"])
+        state["traces"] = [ntraces + itrace for itrace in state["traces"]]
+        self._finish_topic(entry["title"], id, state)
+        self._update_extent(state["lo"])
+        return True
+# -------------
+    def _measuring(self, method, topic):
+        "Context manager measuring the memory used by a call to *method*, if this plTimeLine() has *measure_memory*"
+        if self._memory_measurements is None:
+            return contextlib.nullcontext()
+
+        @contextlib.contextmanager
+        def measuring():
+            with memreport.measure() as measurement:
+                yield
+            self._memory_measurements.append({"method":method, "topic":topic, **measurement})
+        return measuring()
+# -------------
+    def memory_report(self):
+        """
+        Estimate the memory used by this plTimeLine() (see *memreport*). Returns a dictionary with keys:
+
+        * topics: list, in figure order, of dictionaries with keys id, title, traces (number of Plotly traces),
+          points (number of x values in them), trace_bytes (size of their data) and state_bytes
+          (size of the layout state kept for *append_events()*)
+        * traces, points, trace_bytes, state_bytes: totals over all topics
+        * layout_bytes: size of the figure layout
+        * pdates_cache_bytes: size of the cache of parsed dates
+        * trace_ordinals_bytes: size of the ordinals kept for *reproject()*
+        * bytes: total
+        * measurements: if *measure_memory* was set, a list of dictionaries with keys method, topic 
+          (title) and those from *memreport.measure()*, one per call, else None
+
+        Trace sizes are those of the data Plotly holds for each trace, and do not include the trace objects 
+        that Plotly creates on demand. Dataframes are not kept, so appear only in measurements
+        """
+        seen = set()
+        held = []   # Copies of trace data, held so that the ids in *seen* are not reused while counting
+        topics = []
+        for topic, state in zip(self.topics, self._topic_states):
+            traces = [self.figure.data[itrace].to_plotly_json() for itrace in state["traces"]]
+            held.append(traces)
+            topics.append({"id":topic["id"], "title":topic["title"], "traces":len(traces),
+                           "points":sum(len(trace.get("x", ())) for trace in traces),
+                           "trace_bytes":memreport.deep_sizeof(traces, seen),
+                           "state_bytes":memreport.deep_sizeof(state, seen)})
+        report = {"topics":topics}
+        for key in ("traces", "points", "trace_bytes", "state_bytes"):
+            report[key] = sum(topic[key] for topic in topics)
+        held.append(layout := self.figure.layout.to_plotly_json())
+        report["layout_bytes"] = memreport.deep_sizeof(layout, seen)
+        report["pdates_cache_bytes"] = memreport.deep_sizeof(self._pdates_cache, seen)
+        report["trace_ordinals_bytes"] = memreport.deep_sizeof(self._trace_ordinals, seen)
+        report["bytes"] = report["trace_bytes"] + report["state_bytes"] + report["layout_bytes"] + \
+                            report["pdates_cache_bytes"] + report["trace_ordinals_bytes"]
+        report["measurements"] = list(self._memory_measurements) if self._memory_measurements is not None else None
+        return report
 # -------------
     def show(self,fix_y_range=False):
         "Show the Plotly figure"
@@ -228,192 +949,87 @@ class plTimeLine():
         "Output Plotly figure as html"
         self.figure.update_yaxes(range=[self.max_y_used+0.25,-0.25], 
                                  visible=False, fixedrange=fix_y_range)
-        self.figure.write_html(filename,include_plotlyjs='cdn', config=self.fig_config)
+        self.figure.write_html(filename,include_plotlyjs='cdn', config=self.fig_config, 
+                               post_script=self._post_script())
+# -------------
+    def write_html_streaming(self, file, fix_y_range=False, engine=None):
+        """
+        Output Plotly figure as html, writing one trace at a time to keep memory use flat
+
+        * file: a filename or a writable text file-like object
+        * engine: JSON encoder, "json", "orjson" (faster, requires the orjson package), "auto" or None (Plotly default)
+        """
+        self.figure.update_yaxes(range=[self.max_y_used+0.25,-0.25], 
+                                 visible=False, fixedrange=fix_y_range)
+        pltexport.write_html_streaming(self.figure, file, config=self.fig_config, engine=engine,
+                                       post_script=self._post_script())
+# -------------
+    def write_html_tiled(self, filename, fix_y_range=False, ntiles=20):
+        """
+        Output Plotly figure as a small html shell plus time-window tiles (.json files)
+        which are loaded on demand as the user pans and zooms.
+
+        Tiles are written to a directory alongside *filename*, named after it (e.g. *timeline_tiles/*).
+        The output must be served over HTTP for the tiles to load. 
+        With *zoom_filtering*, the traces of each tile are filtered as it loads.
+        Returns the number of tiles written
+        """
+        self.figure.update_yaxes(range=[self.max_y_used+0.25,-0.25], 
+                                 visible=False, fixedrange=fix_y_range)
+        return pltexport.write_html_tiled(self.figure, filename, config=self.fig_config,
+                                          isdate=(self._xmode == "date"), ntiles=ntiles,
+                                          post_script=self._post_script())
 # ------------------------------------------------------------------------------------------------
     def add_timeline_trace(self, row, showbirthanddeath=False, 
                         showlegend=True, showlabel=True,
                         color=None, lo=None, rowspacing=0.3,
                         hover_datetype='day', marker_symbol='diamond',
-                        study_range_start=None, study_range_end=None):
+                        study_range_start=None, study_range_end=None, ystart=None,
+                        iline=None, tracedates=None, prepared=None):
         '''
         Add a timeline trace for an event
         
         row is (for now) a Pandas Series
         study_range start, study_range_end may be Python dates, ordinals or (HDate) strings
+        ystart is the y value of the topic's first line, defaulting to the first unused y value
+        iline is the line to draw the trace on, found using *lo* if not given
+        tracedates are the dates of the event as returned by *_calc_trace_dates()*, calculated if not given
+        prepared is the event as returned by *pltimelinehelpers.prepare_trace()*, if already prepared,
+        in which case the study range is not checked again
         '''        
-        fig = self.figure
-        cols = list(row.index)
-        text = row["label"]
-        htext = row["description"] if "description" in cols and row["description"] else text
-        htext_end = row["htext_end"] if "htext_end" in cols and row["htext_end"] else htext
-        hlink = row['url'] if 'url' in cols else None
-
-        study_ordinal_start = hdateutils.to_ordinal(study_range_start, dateformat=self._dateformat)
-        study_ordinal_end = hdateutils.to_ordinal(study_range_end, dateformat=self._dateformat)
-
-        earliest, latest = None, None
-
-        # Function to get a date
-        def get_pdates(col, earliest, latest, missingasongoing=False):
-            if col not in cols:
-                return None, earliest, latest
-            else:
-                if pd := hdate.HDate(row[col], missingasongoing=missingasongoing, dateformat=self._dateformat).pdates:
-                    earliest = min(pd['ordinal_early'], earliest) if earliest is not None else pd['ordinal_early']
-                    latest = max(pd['ordinal_late'], latest) if latest is not None else pd['ordinal_late']
-                return pd, earliest, latest
-
-        pdates_start, earliest, latest = get_pdates("hdate", earliest, latest)
-        pdates_end, earliest, latest = get_pdates("hdate_end", earliest, latest)
-        if showbirthanddeath:
-            pdates_birth, earliest, latest = get_pdates("hdate_birth", earliest, latest)
-            pdates_death, earliest, latest = get_pdates("hdate_death", earliest, latest, 
-                        missingasongoing=pdates_birth and (pdates_birth['ordinal_mid'] is not None))
-        
-        if (study_ordinal_start is not None) and (study_ordinal_end is not None):
-            if latest < study_ordinal_start or earliest > study_ordinal_end:
+        if prepared is None:
+            if tracedates is None:
+                tracedates = self._calc_trace_dates(row, showbirthanddeath=showbirthanddeath)
+            if not self._in_study_range(tracedates, study_range_start, study_range_end):
                 # Trace is outside study range, ignore it
                 return False
 
-        ongoing = pdates_end['slmid'] == 'o' if pdates_end else False
-        alive = pdates_death['slmid'] == 'o' if pdates_death else False
-
-        # -- labeldate
-        if pdates_start and (pdates_start['ordinal_mid'] is not None):
-            if pdates_end:
-                labeldate = pdates_start['ordinal_mid'] + int((pdates_end['ordinal_mid'] - pdates_start['ordinal_mid'])/2.0)
-            else:
-                labeldate = pdates_start['ordinal_mid']
-        elif pdates_birth and (pdates_birth['ordinal_mid'] is not None):
-            if pdates_death:
-                labeldate = pdates_birth['ordinal_mid'] + int((pdates_death['ordinal_mid'] - pdates_birth['ordinal_mid'])/2.0)
-            else:
-                labeldate = pdates_birth['ordinal_mid']
-        else:
+            prepared = pltimelinehelpers.prepare_trace(row, tracedates, showbirthanddeath=showbirthanddeath,
+                            showlegend=showlegend, showlabel=showlabel, hover_datetype=hover_datetype, 
+                            marker_symbol=marker_symbol, xmode=self._xmode, dateformat=self._dateformat, 
+                            pointinterval=self.pointinterval, sample_range=self._sample_range())
+        if prepared is None:
             return False # If we cannot calculate a labeldate the trace cannot be shown
-
-        # -- hovertext_birth, to be shown from birth to start or midpoint (uses htext else label)
-        if pdates_birth and pdates_birth['ordinal_mid']:
-            hovertext_birth = f"{htext} (b. {hdtimelineutils.calc_yeartext(pdates_birth, hover_datetype=hover_datetype)})"
-        else:
-            hovertext_birth = ""
-
-        # -- hovertext, to be shown during event (uses htext else label)
-        if pdates_start and (pdates_start['ordinal_mid'] is not None):
-            if pdates_end:
-                if ongoing:
-                    hovertext_datepart = f" ({hdtimelineutils.calc_yeartext(pdates_start, hover_datetype=hover_datetype)}...)"
-                else:
-                    hovertext_datepart = f" ({hdtimelineutils.calc_yeartext(pdates_start, hover_datetype=hover_datetype)}-"\
-                                        f"{hdtimelineutils.calc_yeartext(pdates_end, hover_datetype=hover_datetype)})"
-            else:
-                hovertext_datepart = f" ({hdtimelineutils.calc_yeartext(pdates_start, hover_datetype=hover_datetype)})"
-        else:
-            hovertext_datepart = ""
-        hovertext = f"{htext}{hovertext_datepart}"
-
-        # -- hovertext_end, to be shown at end of event and beyond 
-        # --       - uses htext_end else htext else label
-        # --       - uses death date and wording if it exists
-        hovertext_end = None
-        if pdates_death and (pdates_death['ordinal_mid'] is not None):
-            if alive:
-                hovertext_end = f"{htext_end} (b. {hdtimelineutils.calc_yeartext(pdates_birth, hover_datetype=hover_datetype)})"
-                if pdates_birth and pdates_birth['ordinal_mid']:
-                    hovertext_end = f"{htext_end} (b. {hdtimelineutils.calc_yeartext(pdates_birth, hover_datetype=hover_datetype)})"
-                else:
-                    hovertext_end = f"{htext_end} (Alive)"
-            elif pdates_birth and pdates_birth['ordinal_mid']:
-                hovertext_end = f"{htext_end} (d. {hdtimelineutils.calc_yeartext(pdates_death, hover_datetype=hover_datetype)}" +\
-                                f" aged {hdtimelineutils.calc_agetext(pdates_birth, pdates_death)})"
-            else:
-                hovertext_end = f"{htext_end} (d. {hdtimelineutils.calc_yeartext(pdates_death, hover_datetype=hover_datetype)}"
-        else:
-            hovertext_end = f"{htext_end}{hovertext_datepart}"
                 
         # -- Decide what line to draw it on
-        iline = lo.add_trace(earliest, latest, labeldate, text if showlabel else "")
-        y = self.max_y_used + (iline + 1) * rowspacing
-
-        # -- Draw the label
-        if showlabel:
-            pltimelinehelpers._add_trace_label(fig, pdate=labeldate, label=text, y=y, hyperlink=hlink, xmode=self._xmode)
-
-        # -- Event, from hdate to hdate_end
-        if pdates_start:
-            pltimelinehelpers._add_trace_part(self.figure, 
-                        pdate_start=pdates_start['ordinal_early'], pdate_end=pdates_start['ordinal_late'], 
-                        label=text, y=y, color=color, width=1, hovertext=hovertext,
-                        xmode=self._xmode, dateformat=self._dateformat, pointinterval=self.pointinterval
-                        )
-            pltimelinehelpers._add_trace_marker(fig, pdate=pdates_start['ordinal_mid'], y=y, color=color,
-                            showlegend=showlegend, label=text, symbol=marker_symbol,
-                            hovertext=hovertext, hyperlink=hlink, xmode=self._xmode)
-            if pdates_end:
-                pltimelinehelpers._add_trace_part(self.figure, 
-                            pdate_start=pdates_start['ordinal_late'], 
-                            pdate_end=pdates_end['ordinal_early'], 
-                            label=text, y=y, color=color, 
-                            hovertext=hovertext, hovertext_end=hovertext_end,
-                            xmode=self._xmode, dateformat=self._dateformat, pointinterval=self.pointinterval
-                        )
-                pltimelinehelpers._add_trace_part(self.figure, 
-                            pdate_start=pdates_end['ordinal_early'], pdate_end=pdates_end['ordinal_late'], 
-                                label=text, y=y, color=color, width=1, 
-                                hovertext=hovertext_end, hovertext_end=hovertext_end,
-                        xmode=self._xmode, dateformat=self._dateformat, pointinterval=self.pointinterval
-                        )
-
-                if ongoing:   # Right arrow at end of 'ongoing' period
-                    pltimelinehelpers._add_trace_marker(fig, pdate=pdates_end['ordinal_late'], y=y, color=color,
-                                symbol='arrow-right',
-                                hovertext=hovertext_end, hyperlink=hlink, xmode=self._xmode)
-                else:        # Normal marker at end of period
-                    pltimelinehelpers._add_trace_marker(fig, pdate=pdates_end['ordinal_mid'], y=y, color=color,
-                                symbol=marker_symbol,
-                                hovertext=hovertext_end, # if hovertext_end else hovertext, 
-                                hyperlink=hlink, xmode=self._xmode)
-        
-        # -- Lives, from birth to death, drawn around the hdate-hdate-end event if it exists
-        if showbirthanddeath:
-            # -- From birth to either event start (hdate) or half-way point
-            if pdates_birth and pdates_birth['ordinal_mid']:
-                endpoint = pdates_start['ordinal_early'] if pdates_start else \
-                            pdates_birth['ordinal_mid'] + int((pdates_death['ordinal_mid'] - pdates_birth['ordinal_mid']) / 2.0)
-                pltimelinehelpers._add_trace_part(self.figure, 
-                                pdate_start=pdates_birth['ordinal_late'], 
-                                pdate_end=endpoint, 
-                                label=text, y=y, color=color, dash='dot', hovertext=hovertext_birth,
-                                xmode=self._xmode, dateformat=self._dateformat, pointinterval=self.pointinterval
-                                )
-                if pdates_birth['ordinal_early'] < pdates_birth['ordinal_late']:
-                    pltimelinehelpers._add_trace_part(self.figure, 
-                                pdate_start=pdates_birth['ordinal_early'], pdate_end=pdates_birth['ordinal_late'], 
-                                label=text, y=y, color=color, width=1, dash='dot', hovertext=hovertext_birth,
-                                xmode=self._xmode, dateformat=self._dateformat, pointinterval=self.pointinterval
-                                )
-
-            # -- From either event end (hdate or hdate_end) or half-way point to death, or indicate 'alive'
-            if pdates_death and (pdates_death['ordinal_mid'] is not None):
-                startpoint = pdates_end['ordinal_late'] if pdates_end else \
-                            pdates_start['ordinal_late'] if pdates_start else \
-                            pdates_birth['ordinal_mid'] + int((pdates_death['ordinal_mid'] - pdates_birth['ordinal_mid']) / 2.0)
-                pltimelinehelpers._add_trace_part(self.figure, 
-                            pdate_start=startpoint, pdate_end=pdates_death['ordinal_early'], 
-                            label=text, y=y, color=color, dash='dot', hovertext=hovertext_end,
-                            xmode=self._xmode, dateformat=self._dateformat, pointinterval=self.pointinterval
-                            )
-                if pdates_death['ordinal_early'] < pdates_death['ordinal_late']:
-                    pltimelinehelpers._add_trace_part(self.figure, 
-                                pdate_start=max(startpoint,pdates_death['ordinal_early']), 
-                                pdate_end=pdates_death['ordinal_late'], 
-                                label=text, y=y, color=color, width=1, dash='dot', hovertext=hovertext_end,
-                                xmode=self._xmode, dateformat=self._dateformat, pointinterval=self.pointinterval
-                                )
-                if alive and (pdates_death['ordinal_late'] > startpoint):   # Right arrow 
-                    pltimelinehelpers._add_trace_marker(fig, pdate=pdates_death['ordinal_late'], y=y, color=color,
-                                symbol='arrow-right',
-                                hovertext=hovertext_end, xmode=self._xmode)
-        return True
-
+        if iline is None:
+            iline = lo.add_trace(prepared["earliest"], prepared["latest"], prepared["labeldate"], 
+                                 prepared["text"] if showlabel else "")
+        y = (self.max_y_used if ystart is None else ystart) + (iline + 1) * rowspacing
 
+        self._trace_ordinals.extend(pltimelinehelpers.draw_trace(self.figure, prepared, y=y, color=color, 
+                                                                 compact=self._compact))
+        return True
+# ------------------------------------------------------------------------------------------------
+    def _calc_trace_dates(self, row, showbirthanddeath=False):
+        """
+        Parse the dates of an event (a Pandas Series), as for *pltimelinehelpers.calc_trace_dates()*
+        """
+        return pltimelinehelpers.calc_trace_dates(row, showbirthanddeath=showbirthanddeath, 
+                                                  dateformat=self._dateformat, pdates_cache=self._pdates_cache)
+# ------------------------------------------------------------------------------------------------
+    def _in_study_range(self, tracedates, study_range_start=None, study_range_end=None):
+        "Return False if an event (dates as from *_calc_trace_dates()*) lies entirely outside the study range"
+        return pltimelinehelpers.in_study_range(tracedates, 
+                                    hdateutils.to_ordinal(study_range_start, dateformat=self._dateformat),
+                                    hdateutils.to_ordinal(study_range_end, dateformat=self._dateformat))
@@ -5,8 +5,10 @@ Not generally intended for end users
 """
 import sys
 import datetime
+import numpy as np
+import plotly.io as pio
 import plotly.graph_objects as go
-from math import ceil
+from math import ceil, floor, log10
 
 # -- General idea: improves chances of tests and Sphinx builds working if this is included as a submodule
 def add_submodule(path):
@@ -14,51 +16,95 @@ def add_submodule(path):
         sys.path.insert(0,f"../../{path}") # -- Needed for Sphinx builds, usually run in the docs subdirectory
         sys.path.insert(0,f"./{path}")  # -- For normal running. Add second so it will go first in the search order
 add_submodule("historicaldate")
+add_submodule("hdtimelines")
 
 from historicaldate import hdateutils
+from hdtimelines import hdtimelineutils
 
 # ------------------------------------------------------------------------------------------------    
 # -- Now for functions that create the figure
+# -- Traces are first described as specs: dictionaries of go.Scatter() arguments, without y values or color,
+# -- so that they can be prepared (in parallel if need be) before events are allocated to lines
 # ------------------------------------------------------------------------------------------------    
-def _add_trace_marker(fig, pdate=None, label="", y=0.0, 
-                   color=None, size=8, symbol='diamond', showlegend=False,
-                   hovertext=None, hyperlink=None, xmode="date"):
-    """
-    Add a single marker to a plot
-    """
+def _trace_marker_spec(pdate=None, label="", size=8, symbol='diamond', showlegend=False,
+                   hovertext=None, xmode="date"):
+    "Spec for a single marker"
     pltdate = hdateutils.to_python_date(pdate) if xmode == "date" else hdateutils.to_years(pdate)
-    fig.add_trace(go.Scatter(x = [pltdate], y=[y], name=label, legendgroup=label,
-                        mode="markers", marker={'color':color, 'size':size,'symbol':symbol}, 
-                        hoverinfo='text',
-                        hovertext=hovertext if hovertext else label,
-                        hoverlabel={'namelength':-1}, showlegend=showlegend))
+    return {"x":[pltdate], "ordinals":[hdateutils.to_ordinal(pdate)], "name":label, "legendgroup":label,
+            "mode":"markers", "marker":{'size':size,'symbol':symbol}, 
+            "hoverinfo":'text',
+            "hovertext":hovertext if hovertext else label,
+            "hoverlabel":{'namelength':-1}, "showlegend":showlegend}
 # ------------------------------------------------------------------------------------------------
-def _add_trace_label(fig, pdate=None, label="", y=0.0, hyperlink=None, xmode="date"):
-    "Add a label to a plot"
+def _trace_label_spec(pdate=None, label="", hyperlink=None, xmode="date"):
+    "Spec for a label"
     hlinkedtext = f'<a href="{hyperlink}">{label}</a>' if hyperlink else label
     pltdate = hdateutils.to_python_date(pdate) if xmode == "date" else hdateutils.to_years(pdate)
-    fig.add_trace(go.Scatter(x = [pltdate], y=[y+0.04], 
-                                name=label, legendgroup=label,
-                                mode="text", text=hlinkedtext, 
-                                textposition='bottom center',
-                                hoverinfo='skip', hoverlabel={'namelength':-1}, showlegend=False))
+    return {"x":[pltdate], "ordinals":[hdateutils.to_ordinal(pdate)], "yoffset":0.04,
+            "name":label, "legendgroup":label,
+            "mode":"text", "text":hlinkedtext, 
+            "textposition":'bottom center',
+            "hoverinfo":'skip', "hoverlabel":{'namelength':-1}, "showlegend":False}
 # ------------------------------------------------------------------------------------------------
-def _add_trace_part(figure, pdate_start=None, pdate_end=None, label="", y=0.0, 
-                color=None, width=4, dash=None, 
+def hover_pointinterval(range_days, plot_width, hoverdistance=5):
+    """
+    Return the days between points on lines so that, on a plot *plot_width* pixels wide showing *range_days* days,
+    every point on a line is within *hoverdistance* pixels of a point that has hover text
+    """
+    if hoverdistance <= 0:  # -1: no cutoff, 0: no hover, so points are needed only at the ends of lines
+        return max(int(range_days), 1)
+    return max(int(2 * hoverdistance * range_days / plot_width), 1)
+# ------------------------------------------------------------------------------------------------
+def sample_offsets(ordinal_start, ordinal_end, pointinterval, sample_range=None):
+    """
+    Return the offsets, in days from *ordinal_start*, of the points on a line before its end point
+    
+    * sample_range: None to place points every *pointinterval* days along the whole line, 
+      else (start, end) ordinals of the x axis range: points are then placed only in and just beyond that range,
+      and lines completely outside it are drawn from their start and end points only
+    """
+    length = ordinal_end - ordinal_start
+    if length <= 0:
+        return []
+    nlast = ceil(length / pointinterval) - 1
+    if sample_range is None:
+        return [n * pointinterval for n in range(nlast + 1)]
+    if ordinal_end < sample_range[0] or ordinal_start > sample_range[1]:
+        return [0]
+    nfirst = max(floor((sample_range[0] - ordinal_start) / pointinterval), 1)
+    nlast = min(ceil((sample_range[1] - ordinal_start) / pointinterval), nlast)
+    return [0] + [n * pointinterval for n in range(nfirst, nlast + 1)]
+# ------------------------------------------------------------------------------------------------
+def _trace_part_spec(pdate_start=None, pdate_end=None, label="", width=4, dash=None, 
                 hovertext=None, hovertext_end=None, 
-                xmode="date", dateformat="default", pointinterval=200
+                xmode="date", dateformat="default", pointinterval=200, sample_range=None
                 ):
-    "Add a line to the figure"
-    
-    # BC dates are ignored if xmode == "date"
-    if xmode == "date" and hdateutils.to_ordinal(pdate_start, dateformat=dateformat) <= 0:
-        return
+    """
+    Spec for a line, or None if there is nothing to draw. *sample_range* is as for *sample_offsets()*
 
+    Lines starting BC cannot be shown if xmode == "date", so have no x values, but are kept 
+    so that *plTimeLine.reproject()* can show them in years
+    """
     if hovertext_end is None:
         hovertext_end = hovertext
 
     if (pdate_start <= pdate_end): 
-        if xmode == "date":
+        if xmode == "date" and hdateutils.to_ordinal(pdate_start, dateformat=dateformat) <= 0:
+            xs = [None for _ in trace_points([hdateutils.to_ordinal(pdate_start, dateformat=dateformat),
+                                              hdateutils.to_ordinal(pdate_end, dateformat=dateformat)],
+                                             pointinterval, sample_range=sample_range)]
+        elif sample_range is not None:
+            ordinal_start = hdateutils.to_ordinal(pdate_start, dateformat=dateformat)
+            offsets = sample_offsets(ordinal_start, hdateutils.to_ordinal(pdate_end, dateformat=dateformat), 
+                                     pointinterval, sample_range=sample_range)
+            if xmode == "date":
+                pltdate_start = hdateutils.to_python_date(pdate_start, dateformat=dateformat)
+                xs = [pltdate_start + datetime.timedelta(days=offset) for offset in offsets] + \
+                        [hdateutils.to_python_date(pdate_end, dateformat=dateformat)]
+            else:
+                xs = [hdateutils.to_years(ordinal_start + offset) for offset in offsets] + \
+                        [hdateutils.to_years(pdate_end, dateformat=dateformat)]
+        elif xmode == "date":
             pointinterval = datetime.timedelta(days=pointinterval)
             xs = [hdateutils.to_python_date(pdate_start, dateformat=dateformat) + n * pointinterval for n in 
                 range(ceil((hdateutils.to_python_date(pdate_end, dateformat=dateformat) - 
@@ -69,14 +115,333 @@ def _add_trace_part(figure, pdate_start=None, pdate_end=None, label="", y=0.0,
                     range(ceil((hdateutils.to_ordinal(pdate_end, dateformat=dateformat) - 
                                             hdateutils.to_ordinal(pdate_start, dateformat=dateformat))/
                                 pointinterval))] + [hdateutils.to_years(pdate_end, dateformat=dateformat)]
-        ys = [y for _ in xs]
         hovertexts = label if not hovertext \
                         else hovertext if hovertext == hovertext_end \
                         else [hovertext for _ in range(len(xs) - 1)] + [hovertext_end]
-        figure.add_trace(go.Scatter(x = xs, y=ys, name=label, legendgroup=label,
-                            mode="lines", line={'color':color,'width':width,'dash':dash}, 
-                            hoverinfo='text',
-                            hovertext=hovertexts,
-                            hoverlabel={'namelength':-1}, showlegend=False))
+        return {"x":xs, "ordinals":[hdateutils.to_ordinal(pdate_start, dateformat=dateformat),
+                                    hdateutils.to_ordinal(pdate_end, dateformat=dateformat)],
+                "name":label, "legendgroup":label,
+                "mode":"lines", "line":{'width':width,'dash':dash}, 
+                "hoverinfo":'text',
+                "hovertext":hovertexts,
+                "hoverlabel":{'namelength':-1}, "showlegend":False}
+    return None
+# ------------------------------------------------------------------------------------------------
+# -- Compact output: trace properties shared by most traces are held once, as defaults in the layout template
+COMPACT_DEFAULTS = {"mode":"lines", "line":{'width':4}, "marker":{'size':8}, "textposition":'bottom center',
+                    "hoverinfo":'text', "hoverlabel":{'namelength':-1}, "showlegend":False}
+COMPACT_YDECIMALS = 4
+
+def compact_template():
+    "Return a copy of the current default Plotly template, with COMPACT_DEFAULTS as defaults for scatter traces"
+    template = go.layout.Template(pio.templates[pio.templates.default or "plotly"])
+    base = template.data.scatter[0] if template.data.scatter else {}
+    template.data.scatter = [go.Scatter(base).update(COMPACT_DEFAULTS)]
+    return template
+
+def compact_xdecimals(range_years, xmode="years"):
+    """
+    Return the number of decimal places needed for x values (in years) on an axis spanning *range_years*, 
+    allowing for zooming in by a factor of 100, and never more than needed for whole days. 
+    Returns None if x values are not numbers (xmode="date")
+    """
+    if xmode == "date":
+        return None
+    return min(max(ceil(log10(100000.0 / max(range_years, 1e-6))), 0), 3)
+
+def _compact_spec(kwargs, xdecimals=None):
+    "Drop trace properties that are redundant with COMPACT_DEFAULTS or with the legend hidden, and round x values"
+    for key in ("hoverlabel", "legendgroup", "textposition"):
+        kwargs.pop(key, None)
+    for key in ("mode", "hoverinfo", "showlegend"):
+        if kwargs.get(key) == COMPACT_DEFAULTS[key]:
+            del kwargs[key]
+    if not kwargs.get("showlegend"):
+        kwargs.pop("name", None)
+    for style in ("line", "marker"):
+        if style in kwargs:
+            kwargs[style] = {key:_compact_color(value) if key == "color" else value 
+                                for key, value in kwargs[style].items() 
+                                if value is not None and COMPACT_DEFAULTS[style].get(key) != value}
+    if xdecimals is not None:
+        kwargs["x"] = [round(x, xdecimals) for x in kwargs["x"]]
+    return kwargs
+
+def _compact_color(color):
+    "Convert a color in the form 'rgb(r, g, b)', as Plotly's default colors are, to the shorter '#rrggbb'"
+    if isinstance(color, str) and color.startswith("rgb(") and color.endswith(")"):
+        try:
+            return "#" + "".join(f"{int(c):02x}" for c in color[4:-1].split(","))
+        except ValueError:
+            pass
+    return color
+# ------------------------------------------------------------------------------------------------
+def _add_spec_trace(fig, spec, y=0.0, color=None, compact=None):
+    """
+    Add a trace described by a spec to a figure, on the line at *y*
+
+    * compact: None, or a dictionary with key xdecimals (see *compact_xdecimals()*) for compact output
+
+    Returns the ordinals the trace was drawn from, as for *trace_points()*
+    """
+    kwargs = dict(spec)
+    ordinals = kwargs.pop("ordinals", None)
+    yoffset = kwargs.pop("yoffset", None)
+    yval = y + yoffset if yoffset else y
+    for style in ("marker", "line"):
+        if style in kwargs:
+            kwargs[style] = {'color':color, **kwargs[style]}
+    if compact is not None:
+        kwargs = _compact_spec(kwargs, xdecimals=compact.get("xdecimals"))
+        yval = round(yval, COMPACT_YDECIMALS)
+    fig.add_trace(go.Scatter(y=[yval for _ in kwargs["x"]], **kwargs))
+    return ordinals
+# ------------------------------------------------------------------------------------------------
+def trace_points(ordinals, pointinterval=200, sample_range=None):
+    """
+    Return the ordinals of the points of a trace drawn from *ordinals*: [start, end] for a line, 
+    or [ordinal] for a marker or label. *pointinterval* and *sample_range* are as for *sample_offsets()*
+    """
+    if len(ordinals) == 1:
+        return list(ordinals)
+    start, end = ordinals
+    return [start + offset for offset in sample_offsets(start, end, pointinterval, sample_range=sample_range)] + [end]
+# ------------------------------------------------------------------------------------------------
+def ordinals_to_x(ordinals, xmode="date"):
+    """
+    Convert a sequence of ordinals to x values, all at once: Python dates as from *hdateutils.to_python_date()*
+    (None for BC dates) if xmode is "date", or floats as from *hdateutils.to_years()* if xmode is "years"
+    """
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    ad = ordinals >= 1
+    days = np.datetime64("0001-01-01", "D") + (np.where(ad, ordinals, 1) - 1)
+    if xmode == "date":
+        return np.where(ad, days.astype(object), None).tolist()
+    years = days.astype("datetime64[Y]")
+    jan1 = years.astype("datetime64[D]")
+    daynum = (days - jan1).astype(np.int64) + 1
+    daysinyear = ((years + 1).astype("datetime64[D]") - jan1).astype(np.int64)
+    ad_years = (years.astype(np.int64) + 1970).astype(np.float64) - 1 + daynum / daysinyear
+    return np.where(ad, ad_years, ordinals / 365.2425).tolist()
+# ------------------------------------------------------------------------------------------------
+def _add_trace_marker(fig, pdate=None, label="", y=0.0, 
+                   color=None, size=8, symbol='diamond', showlegend=False,
+                   hovertext=None, hyperlink=None, xmode="date"):
+    """
+    Add a single marker to a plot
+    """
+    _add_spec_trace(fig, _trace_marker_spec(pdate=pdate, label=label, size=size, symbol=symbol, 
+                                            showlegend=showlegend, hovertext=hovertext, xmode=xmode), 
+                    y=y, color=color)
+# ------------------------------------------------------------------------------------------------
+def _add_trace_label(fig, pdate=None, label="", y=0.0, hyperlink=None, xmode="date"):
+    "Add a label to a plot"
+    _add_spec_trace(fig, _trace_label_spec(pdate=pdate, label=label, hyperlink=hyperlink, xmode=xmode), y=y)
+# ------------------------------------------------------------------------------------------------
+def _add_trace_part(figure, pdate_start=None, pdate_end=None, label="", y=0.0, 
+                color=None, width=4, dash=None, 
+                hovertext=None, hovertext_end=None, 
+                xmode="date", dateformat="default", pointinterval=200
+                ):
+    "Add a line to the figure"
+    if spec := _trace_part_spec(pdate_start=pdate_start, pdate_end=pdate_end, label=label, width=width, dash=dash,
+                                hovertext=hovertext, hovertext_end=hovertext_end, 
+                                xmode=xmode, dateformat=dateformat, pointinterval=pointinterval):
+        _add_spec_trace(figure, spec, y=y, color=color)
+# ------------------------------------------------------------------------------------------------
+# -- Preparing whole events
+# ------------------------------------------------------------------------------------------------
+def calc_trace_dates(row, showbirthanddeath=False, dateformat=None, pdates_cache=None):
+    """
+    Parse the dates of an event (a dictionary or Pandas Series), returning a dictionary with keys
+    start, end, birth, death (pdates dictionaries as from HDate(), or None),
+    earliest, latest (ordinals) and labeldate (ordinal, or None if the event cannot be displayed)
+
+    *pdates_cache* is as for *hdtimelineutils.get_pdates()*
+    """
+    earliest, latest = None, None
+
+    # Function to get a date
+    def get_pdates(col, earliest, latest, missingasongoing=False):
+        if col not in row:
+            return None, earliest, latest
+        else:
+            if pd := hdtimelineutils.get_pdates(row[col], missingasongoing=missingasongoing, dateformat=dateformat,
+                                                pdates_cache=pdates_cache):
+                earliest = min(pd['ordinal_early'], earliest) if earliest is not None else pd['ordinal_early']
+                latest = max(pd['ordinal_late'], latest) if latest is not None else pd['ordinal_late']
+            return pd, earliest, latest
+
+    pdates_birth, pdates_death = None, None
+    pdates_start, earliest, latest = get_pdates("hdate", earliest, latest)
+    pdates_end, earliest, latest = get_pdates("hdate_end", earliest, latest)
+    if showbirthanddeath:
+        pdates_birth, earliest, latest = get_pdates("hdate_birth", earliest, latest)
+        pdates_death, earliest, latest = get_pdates("hdate_death", earliest, latest, 
+                    missingasongoing=pdates_birth and (pdates_birth['ordinal_mid'] is not None))
 
+    if pdates_start and (pdates_start['ordinal_mid'] is not None):
+        if pdates_end:
+            labeldate = pdates_start['ordinal_mid'] + int((pdates_end['ordinal_mid'] - pdates_start['ordinal_mid'])/2.0)
+        else:
+            labeldate = pdates_start['ordinal_mid']
+    elif pdates_birth and (pdates_birth['ordinal_mid'] is not None):
+        if pdates_death:
+            labeldate = pdates_birth['ordinal_mid'] + int((pdates_death['ordinal_mid'] - pdates_birth['ordinal_mid'])/2.0)
+        else:
+            labeldate = pdates_birth['ordinal_mid']
+    else:
+        labeldate = None
 
+    return {"start":pdates_start, "end":pdates_end, "birth":pdates_birth, "death":pdates_death,
+            "earliest":earliest, "latest":latest, "labeldate":labeldate}
+# ------------------------------------------------------------------------------------------------
+def in_study_range(tracedates, study_ordinal_start=None, study_ordinal_end=None):
+    "Return False if an event (dates as from *calc_trace_dates()*) lies entirely outside the study range (ordinals)"
+    if (study_ordinal_start is not None) and (study_ordinal_end is not None):
+        if tracedates["latest"] < study_ordinal_start or tracedates["earliest"] > study_ordinal_end:
+            return False
+    return True
+# ------------------------------------------------------------------------------------------------
+def within_rank(rank, max_rank):
+    """
+    Return True if an event with *rank* is drawn when events of rank up to *max_rank* are shown,
+    in a topic whose events have ranks. Events with no rank (None, "" or NaN) are not drawn
+    """
+    if rank is None or rank == "" or rank != rank:
+        return False
+    return rank <= max_rank
+# ------------------------------------------------------------------------------------------------
+def prepare_trace(row, tracedates, showbirthanddeath=False, showlegend=True, showlabel=True,
+                  hover_datetype='day', marker_symbol='diamond', xmode="date", dateformat=None, pointinterval=200,
+                  sample_range=None):
+    """
+    Prepare the traces for an event (a dictionary or Pandas Series) whose dates, from *calc_trace_dates()*,
+    are *tracedates*. *sample_range* is as for *sample_offsets()*
+
+    Returns None if the event cannot be shown, else a dictionary with keys
+    text (label, used for line allocation), earliest, latest, labeldate (ordinals)
+    and traces (list of trace specs, to be drawn by *draw_trace()*)
+    """
+    text = row["label"]
+    htext = row["description"] if "description" in row and row["description"] else text
+    htext_end = row["htext_end"] if "htext_end" in row and row["htext_end"] else htext
+    hlink = row['url'] if 'url' in row else None
+
+    pdates_start, pdates_end = tracedates["start"], tracedates["end"]
+    pdates_birth, pdates_death = tracedates["birth"], tracedates["death"]
+    ongoing = pdates_end['slmid'] == 'o' if pdates_end else False
+    alive = pdates_death['slmid'] == 'o' if pdates_death else False
+
+    # -- labeldate
+    if (labeldate := tracedates["labeldate"]) is None:
+        return None # If we cannot calculate a labeldate the trace cannot be shown
+
+    # -- hovertext_birth, to be shown from birth to start or midpoint (uses htext else label)
+    if pdates_birth and pdates_birth['ordinal_mid']:
+        hovertext_birth = f"{htext} (b. {hdtimelineutils.calc_yeartext(pdates_birth, hover_datetype=hover_datetype)})"
+    else:
+        hovertext_birth = ""
+
+    # -- hovertext, to be shown during event (uses htext else label)
+    if pdates_start and (pdates_start['ordinal_mid'] is not None):
+        if pdates_end:
+            if ongoing:
+                hovertext_datepart = f" ({hdtimelineutils.calc_yeartext(pdates_start, hover_datetype=hover_datetype)}...)"
+            else:
+                hovertext_datepart = f" ({hdtimelineutils.calc_yeartext(pdates_start, hover_datetype=hover_datetype)}-"\
+                                    f"{hdtimelineutils.calc_yeartext(pdates_end, hover_datetype=hover_datetype)})"
+        else:
+            hovertext_datepart = f" ({hdtimelineutils.calc_yeartext(pdates_start, hover_datetype=hover_datetype)})"
+    else:
+        hovertext_datepart = ""
+    hovertext = f"{htext}{hovertext_datepart}"
+
+    # -- hovertext_end, to be shown at end of event and beyond 
+    # --       - uses htext_end else htext else label
+    # --       - uses death date and wording if it exists
+    hovertext_end = None
+    if pdates_death and (pdates_death['ordinal_mid'] is not None):
+        if alive:
+            hovertext_end = f"{htext_end} (b. {hdtimelineutils.calc_yeartext(pdates_birth, hover_datetype=hover_datetype)})"
+            if pdates_birth and pdates_birth['ordinal_mid']:
+                hovertext_end = f"{htext_end} (b. {hdtimelineutils.calc_yeartext(pdates_birth, hover_datetype=hover_datetype)})"
+            else:
+                hovertext_end = f"{htext_end} (Alive)"
+        elif pdates_birth and pdates_birth['ordinal_mid']:
+            hovertext_end = f"{htext_end} (d. {hdtimelineutils.calc_yeartext(pdates_death, hover_datetype=hover_datetype)}" +\
+                            f" aged {hdtimelineutils.calc_agetext(pdates_birth, pdates_death)})"
+        else:
+            hovertext_end = f"{htext_end} (d. {hdtimelineutils.calc_yeartext(pdates_death, hover_datetype=hover_datetype)}"
+    else:
+        hovertext_end = f"{htext_end}{hovertext_datepart}"
+
+    traces = []
+    def add(spec):
+        if spec:
+            traces.append(spec)
+    parts = {"label":text, "xmode":xmode, "dateformat":dateformat, "pointinterval":pointinterval,
+             "sample_range":sample_range}
+
+    # -- The label
+    if showlabel:
+        add(_trace_label_spec(pdate=labeldate, label=text, hyperlink=hlink, xmode=xmode))
+
+    # -- Event, from hdate to hdate_end
+    if pdates_start:
+        add(_trace_part_spec(pdate_start=pdates_start['ordinal_early'], pdate_end=pdates_start['ordinal_late'], 
+                             width=1, hovertext=hovertext, **parts))
+        add(_trace_marker_spec(pdate=pdates_start['ordinal_mid'], showlegend=showlegend, label=text, 
+                               symbol=marker_symbol, hovertext=hovertext, xmode=xmode))
+        if pdates_end:
+            add(_trace_part_spec(pdate_start=pdates_start['ordinal_late'], pdate_end=pdates_end['ordinal_early'], 
+                                 hovertext=hovertext, hovertext_end=hovertext_end, **parts))
+            add(_trace_part_spec(pdate_start=pdates_end['ordinal_early'], pdate_end=pdates_end['ordinal_late'], 
+                                 width=1, hovertext=hovertext_end, hovertext_end=hovertext_end, **parts))
+
+            if ongoing:   # Right arrow at end of 'ongoing' period
+                add(_trace_marker_spec(pdate=pdates_end['ordinal_late'], symbol='arrow-right',
+                                       hovertext=hovertext_end, xmode=xmode))
+            else:        # Normal marker at end of period
+                add(_trace_marker_spec(pdate=pdates_end['ordinal_mid'], symbol=marker_symbol,
+                                       hovertext=hovertext_end, xmode=xmode))
+    
+    # -- Lives, from birth to death, drawn around the hdate-hdate-end event if it exists
+    if showbirthanddeath:
+        # -- From birth to either event start (hdate) or half-way point
+        if pdates_birth and pdates_birth['ordinal_mid']:
+            endpoint = pdates_start['ordinal_early'] if pdates_start else \
+                        pdates_birth['ordinal_mid'] + int((pdates_death['ordinal_mid'] - pdates_birth['ordinal_mid']) / 2.0)
+            add(_trace_part_spec(pdate_start=pdates_birth['ordinal_late'], pdate_end=endpoint, 
+                                 dash='dot', hovertext=hovertext_birth, **parts))
+            if pdates_birth['ordinal_early'] < pdates_birth['ordinal_late']:
+                add(_trace_part_spec(pdate_start=pdates_birth['ordinal_early'], pdate_end=pdates_birth['ordinal_late'], 
+                                     width=1, dash='dot', hovertext=hovertext_birth, **parts))
+
+        # -- From either event end (hdate or hdate_end) or half-way point to death, or indicate 'alive'
+        if pdates_death and (pdates_death['ordinal_mid'] is not None):
+            startpoint = pdates_end['ordinal_late'] if pdates_end else \
+                        pdates_start['ordinal_late'] if pdates_start else \
+                        pdates_birth['ordinal_mid'] + int((pdates_death['ordinal_mid'] - pdates_birth['ordinal_mid']) / 2.0)
+            add(_trace_part_spec(pdate_start=startpoint, pdate_end=pdates_death['ordinal_early'], 
+                                 dash='dot', hovertext=hovertext_end, **parts))
+            if pdates_death['ordinal_early'] < pdates_death['ordinal_late']:
+                add(_trace_part_spec(pdate_start=max(startpoint,pdates_death['ordinal_early']), 
+                                     pdate_end=pdates_death['ordinal_late'], 
+                                     width=1, dash='dot', hovertext=hovertext_end, **parts))
+            if alive and (pdates_death['ordinal_late'] > startpoint):   # Right arrow 
+                add(_trace_marker_spec(pdate=pdates_death['ordinal_late'], symbol='arrow-right',
+                                       hovertext=hovertext_end, xmode=xmode))
+
+    return {"text":text, "earliest":tracedates["earliest"], "latest":tracedates["latest"], 
+            "labeldate":labeldate, "traces":traces}
+# ------------------------------------------------------------------------------------------------
+def draw_trace(fig, prepared, y=0.0, color=None, compact=None):
+    """
+    Draw the traces of an event prepared by *prepare_trace()* on the line at *y*
+    
+    * compact: as for *_add_spec_trace()*
+
+    Returns a list of the ordinals each trace was drawn from, as for *trace_points()*
+    """
+    return [_add_spec_trace(fig, spec, y=y, color=color, compact=compact) for spec in prepared["traces"]]
@@ -0,0 +1,128 @@
+"""
+Size estimation for plTimeLine() figures
+
+Predicts the number of traces, the number of points and the approximate size of the serialised figure
+that *plTimeLine.add_topic()* would produce, from the ordinals of hdTopic() objects and without building anything.
+Used by *plTimeLine.fit_budget()*.
+
+Byte estimates are approximate (typically within 20%), based on the sizes of the JSON written by *write_html()*
+"""
+import sys
+from math import ceil
+
+# -- General idea: improves chances of tests and Sphinx builds working if this is included as a submodule
+def add_submodule(path):
+    if f"./{path}" not in sys.path:
+        sys.path.insert(0,f"../../{path}") # -- Needed for Sphinx builds, usually run in the docs subdirectory
+        sys.path.insert(0,f"./{path}")  # -- For normal running. Add second so it will go first in the search order
+add_submodule("hdtimelines")
+
+from hdtimelines import pltimelinehelpers
+
+# -- Approximate serialised sizes, in bytes
+LAYOUT_BYTES = 7500                                       # Layout, including the default template
+TRACE_BYTES = {"line":225, "marker":250, "label":235}   # Fixed content of each kind of trace
+POINT_BYTES = {"date":21, "years":27}                     # Each x, y pair
+DATETEXT_BYTES = 14                                       # Dates added to hover text, e.g. " (1066-1087)"
+COMPACT_TRACE_BYTES = {"line":65, "marker":135, "label":90}   # As above, for plTimeLine(compact=True)
+COMPACT_POINT_BYTES = {"date":17, "years":14}
+
+# ------------------------------------------------------------------------------------------------
+def count_points(ordinal_start, ordinal_end, pointinterval, xmode="date", sample_range=None):
+    """
+    Return the number of points in a line from *ordinal_start* to *ordinal_end*, or 0 if it is not drawn.
+    *sample_range* is as for *pltimelinehelpers.sample_offsets()*
+    """
+    if ordinal_start is None or ordinal_end is None or ordinal_start > ordinal_end:
+        return 0
+    if sample_range is None:
+        return ceil((ordinal_end - ordinal_start) / max(pointinterval, 1)) + 1
+    return len(pltimelinehelpers.sample_offsets(ordinal_start, ordinal_end, max(pointinterval, 1), 
+                                                sample_range=sample_range)) + 1
+# ------------------------------------------------------------------------------------------------
+def estimate_event(event, ordset, pointinterval, showbirthanddeath=True, showlabel=True, xmode="date",
+                   compact=False, sample_range=None):
+    """
+    Estimate the traces drawn for a single event, as by *plTimeLine.add_timeline_trace()*
+
+    * event, ordset: the event dictionary and its ordinals, as held in hdTopic()
+    * compact: True if the figure has compact output (*plTimeLine(compact=True)*)
+    * sample_range: as for *pltimelinehelpers.sample_offsets()*
+
+    Returns a dictionary with keys traces, points, bytes
+    """
+    counts = {"traces":0, "points":0, "bytes":0}
+    start = ordset.get("start_mid") is not None
+    birth = showbirthanddeath and (ordset.get("birth_mid") is not None)
+    if not (start or birth):
+        return counts   # No label date, so the event is not shown
+
+    label = str(event.get("label", ""))
+    textbytes = 2 * len(label.encode("utf-8")) + len(str(event.get("description", "") or label).encode("utf-8")) \
+                    + DATETEXT_BYTES
+
+    trace_bytes = COMPACT_TRACE_BYTES if compact else TRACE_BYTES
+    point_bytes = COMPACT_POINT_BYTES if compact else POINT_BYTES
+    def add(kind, npoints):
+        if npoints > 0:
+            counts["traces"] += 1
+            counts["points"] += npoints
+            counts["bytes"] += trace_bytes[kind] + textbytes + npoints * point_bytes[xmode]
+
+    def add_line(ordinal_start, ordinal_end):
+        add("line", count_points(ordinal_start, ordinal_end, pointinterval, xmode=xmode, sample_range=sample_range))
+
+    if showlabel:
+        add("label", 1)
+        counts["bytes"] += len(str(event.get("url", "") or ""))
+    if start:
+        add_line(ordset["start_early"], ordset["start_late"])
+        add("marker", 1)
+        if ordset.get("end_mid") is not None:
+            add_line(ordset["start_late"], ordset["end_early"])
+            add_line(ordset["end_early"], ordset["end_late"])
+            add("marker", 1)
+    if birth:
+        death_mid = ordset.get("death_mid")
+        halfway = ordset["birth_mid"] + int(((death_mid if death_mid is not None else ordset["birth_mid"]) -
+                                             ordset["birth_mid"]) / 2.0)
+        add_line(ordset["birth_late"], ordset["start_early"] if start else halfway)
+        if ordset["birth_early"] < ordset["birth_late"]:
+            add_line(ordset["birth_early"], ordset["birth_late"])
+        if death_mid is not None:
+            startpoint = ordset["end_late"] if ordset.get("end_mid") is not None \
+                            else ordset["start_late"] if start else halfway
+            add_line(startpoint, ordset["death_early"])
+            if ordset["death_early"] < ordset["death_late"]:
+                add_line(max(startpoint, ordset["death_early"]), ordset["death_late"])
+            if ordset.get("death_ongoing") and ordset["death_late"] > startpoint:
+                add("marker", 1)
+    return counts
+# ------------------------------------------------------------------------------------------------
+def estimate_topics(topics, mindate, maxdate, pointinterval, showbirthanddeath=True, showlabel=True,
+                    max_rank=1, xmode="date", compact=False, sample_range=None):
+    """
+    Estimate the size of a figure showing *topics* (a list of hdTopic()),
+    applying the same rank and x range filters as *plTimeLine.add_topic()*
+
+    * mindate, maxdate: x axis range, as ordinals
+    * pointinterval: days between points on lines
+    * compact, sample_range: as for *estimate_event()*
+
+    Returns a dictionary with keys traces, points, bytes
+    """
+    xrange_years = (maxdate - mindate) / 365.2425
+    total = {"traces":0, "points":0, "bytes":LAYOUT_BYTES}
+    for topic in topics:
+        ranked = any("rank" in event for event in topic.events)
+        for event, ordset in zip(topic.events, topic.ordinals):
+            if ranked and not pltimelinehelpers.within_rank(event.get("rank"), max_rank):
+                continue
+            if not (ordset.get("min_xrange_years", 0.0) < xrange_years <= ordset.get("max_xrange_years", 1.0e9)):
+                continue
+            counts = estimate_event(event, ordset, pointinterval, showbirthanddeath=showbirthanddeath,
+                                    showlabel=showlabel, xmode=xmode, compact=compact,
+                                    sample_range=sample_range)
+            for key in total:
+                total[key] += counts[key]
+    return total
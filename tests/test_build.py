@@ -0,0 +1,66 @@
+import sys
+sys.path.insert(0,".") # For Github
+sys.path.insert(0,"./hdtimelines") # in case this is run when a submodule
+
+import glob
+from hdtimelines import build
+
+def test_build(tmp_path):
+    # Find test data path
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    csvfile = tmp_path / "monarchs.csv"
+    csvfile.write_text(open(f'{path}/British Monarchs_extract_ok.csv').read())
+    (tmp_path / "timelines").mkdir()
+    (tmp_path / "timelines" / "monarchs.py").write_text(
+        "import pandas as pd\n"
+        "from hdtimelines import pltimeline\n"
+        f"df = pd.read_csv(r'{csvfile}', na_filter=False)\n"
+        "pltl = pltimeline.plTimeLine()\n"
+        "pltl.add_topic_from_df(df, title='Monarchs')\n"
+        "pltl.show()\n"
+        f"pltl.write_html(r'{tmp_path / 'monarchs.html'}')\n")
+    (tmp_path / "timelines" / "broken.py").write_text("raise ValueError('broken')\n")
+
+    manifest = str(tmp_path / "manifest.json")
+    paths = [str(tmp_path / "timelines")]
+    result = build.build(paths, jobs=2, manifest=manifest, log=lambda text: None)
+    assert [len(result[key]) for key in ("built", "skipped", "failed")] == [1, 0, 1]
+    assert (tmp_path / "monarchs.html").exists()
+
+    result = build.build(paths, jobs=2, manifest=manifest, log=lambda text: None)
+    assert [len(result[key]) for key in ("built", "skipped", "failed")] == [0, 1, 1]
+
+    csvfile.write_text(csvfile.read_text().replace("William I,", "William the Conqueror,"))
+    result = build.build(paths, jobs=2, manifest=manifest, log=lambda text: None)
+    assert [len(result[key]) for key in ("built", "skipped", "failed")] == [1, 0, 1]
+    return
+
+
+def test_build_path_inputs_and_worker_exit(tmp_path):
+    csvfile = tmp_path / "events.csv"
+    csvfile.write_text("label,hdate\nHastings,1066\n")
+    (tmp_path / "timelines").mkdir()
+    # -- Inputs opened with a Path or a bytes path are recorded
+    (tmp_path / "timelines" / "a_pathlib.py").write_text(
+        "import os, pathlib\n"
+        f"open(pathlib.Path(r'{csvfile}')).read()\n"
+        f"open(os.fsencode(r'{csvfile}')).read()\n")
+    # -- A script that ends its worker process fails, without stopping the build
+    (tmp_path / "timelines" / "z_exit.py").write_text("import os\nos._exit(1)\n")
+
+    manifest = str(tmp_path / "manifest.json")
+    paths = [str(tmp_path / "timelines")]
+    result = build.build(paths, jobs=1, manifest=manifest, log=lambda text: None)
+    assert result["built"] == [str(tmp_path / "timelines" / "a_pathlib.py")]
+    assert result["failed"] == [str(tmp_path / "timelines" / "z_exit.py")]
+
+    result = build.build(paths, jobs=1, manifest=manifest, log=lambda text: None)
+    assert len(result["skipped"]) == 1
+    csvfile.write_text("label,hdate\nHastings,14 Oct 1066\n")
+    result = build.build(paths, jobs=1, manifest=manifest, log=lambda text: None)
+    assert len(result["built"]) == 1
+    return
@@ -3,7 +3,9 @@ import glob
 sys.path.insert(0,".") # For Github
 sys.path.insert(0,"./hdtimelines") # in case this is run when a submodule
 
-from hdtimelines import hdtimeline
+import pytest
+import pandas as pd
+from hdtimelines import hdtimeline, hdtimelineutils
 
 def test_hdtimeline():
     # Find test data path
@@ -53,4 +55,235 @@ def test_hdtimeline():
         for key, value in topic1.__dict__.items():
             assert topic2.__dict__[key] == value, f"Topic failed on {key}, {value}"
 
-    return
\ No newline at end of file
+    return
+
+def test_add_topics_breakpoints():
+    hd = hdtimeline.hdTimeLine("Breakpoints")
+    ids = hd.add_topics([("A", [{"label":"a1", "hdate":"1066", "min_xrange_years":"100"},
+                                {"label":"a2", "hdate":"1215", "max_xrange_years":"500"}]),
+                         ("B", [{"label":"b1", "hdate":"1415", "min_xrange_years":"100"}])])
+    assert ids == [1, 2]
+    assert hd.xrange_breakpoints == {100.0, 500.0}
+
+    hd.remove_topic(1)
+    assert hd.xrange_breakpoints == {100.0}
+    hd.remove_topic(2)
+    assert hd.xrange_breakpoints == set()
+    return
+
+
+def test_topic_positions():
+    hd = hdtimeline.hdTimeLine("Positions")
+    ids = hd.add_topics([(f"T{i}", [{"label":f"e{i}", "hdate":f"{1000 + i}"}]) for i in range(5)])
+    assert ids == [1, 2, 3, 4, 5]
+
+    hd.move_topic(id=2, indexshift=2)
+    assert [topic.id for topic in hd.topics] == [1, 3, 4, 2, 5]
+    hd.remove_topic(3)
+    hd.reorder_topics([5, 4, 2, 1])
+    assert [topic.id for topic in hd.topics] == [5, 4, 2, 1]
+    assert [hd.get_topic_index(topic.id) for topic in hd.topics] == [0, 1, 2, 3]
+    assert hd.get_topic(2).title == "T1"
+    assert hd.get_topic(3) is None
+
+    # -- Orders that leave out, repeat or add topics are rejected, leaving the timeline unchanged
+    for topic_order in ([5, 4, 2], [5, 4, 2, 2], [5, 4, 2, 1, 3], [5, 4, 2, 6]):
+        with pytest.raises(ValueError):
+            hd.reorder_topics(topic_order)
+        assert [topic.id for topic in hd.topics] == [5, 4, 2, 1]
+    assert [result["topic_id"] for result in hd.search("e")] == [5, 4, 2, 1]
+    return
+
+
+def test_date_range_maintenance():
+    hd = hdtimeline.hdTimeLine("Date ranges")
+    assert hd.get_date_range() == (None, None)
+    id1, id2 = hd.add_topics([("Early", [{"label":"a", "hdate":"1066-10-14"}]),
+                              ("Late", [{"label":"b", "hdate":"1815-06-18"}])])
+    early, late = hd.get_topic(id1).get_date_range()[0], hd.get_topic(id2).get_date_range()[1]
+    assert hd.get_date_range() == (early, late)
+
+    hd.update_topic(id2, [{"label":"c", "hdate":"1415-10-25"}])
+    assert hd.get_date_range() == (early, hd.get_topic(id2).get_date_range()[1])
+    hd.remove_topic(id1)
+    assert hd.get_date_range() == hd.get_topic(id2).get_date_range()
+    hd.remove_topic(id2)
+    assert hd.get_date_range() == (None, None)
+    return
+
+
+def test_column_ordinals():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    df = pd.read_csv(f'{path}/Playwrights_extract_ok.csv', na_filter=False)
+    df = pd.concat([df, df], ignore_index=True)     # Repeated dates are parsed once each
+    pdates_cache = {}
+    ordinals = hdtimelineutils.calc_column_ordinals(df, pdates_cache=pdates_cache)
+    assert len(pdates_cache) == 8    # 4 distinct birth dates and 4 distinct death dates
+
+    events = df.to_dict(orient='records')
+    for irow, event_ordinals in enumerate(hdtimelineutils.calc_events_ordinals(events)):
+        for key, value in event_ordinals.items():
+            if key in ordinals.columns:
+                assert ordinals[key].iloc[irow] == value, f"Failed on {key}, row {irow}"
+    assert list(ordinals["death_ongoing"]) == [False, True, False, False] * 2
+    return
+
+
+def test_add_topics_from_sources():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    def failing_source():
+        raise ValueError("No such data")
+
+    hd = hdtimeline.hdTimeLine()
+    sources = [("Monarchs extract", f'{path}/British Monarchs_extract_ok.csv'),
+               ("Missing", failing_source),
+               ("Playwrights extract", pd.read_csv(f'{path}/Playwrights_extract_ok.csv', na_filter=False))]
+    ids, errors = hd.add_topics_from_sources(sources, max_workers=3)
+    assert ids == [1, None, 2]
+    assert list(errors) == [1] and isinstance(errors[1], ValueError)
+    assert [topic.title for topic in hd.topics] == ["Monarchs extract", "Playwrights extract"]
+
+    hd2 = hdtimeline.hdTimeLine()
+    hd2.add_topic_csv("Monarchs extract", f'{path}/British Monarchs_extract_ok.csv')
+    hd2.add_topic_csv("Playwrights extract", f'{path}/Playwrights_extract_ok.csv')
+    assert hd.to_dict() == hd2.to_dict()
+    assert hd.get_date_range() == hd2.get_date_range()
+    return
+
+
+def test_search():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    hd = hdtimeline.hdTimeLine()
+    id1 = hd.add_topic_csv("Monarchs extract", f'{path}/British Monarchs_extract_ok.csv')
+    results = hd.search("william")
+    assert results and all("william" in r["label"].lower() for r in results)
+    assert results[0]["topic_id"] == id1 and results[0]["event_index"] == 0
+    assert results[0]["earliest"] == hd.topics[0].ordinals[0]["earliest"]
+    assert hd.search("will") == results                      # Prefix match
+    assert hd.search("will", prefix=False) == []
+    assert len(hd.search("william", limit=1)) == 1
+    assert hd.search("no such person") == []
+
+    # -- The index follows topics being added, updated and removed
+    id2 = hd.add_topic_dict("More", [{"label":"William Shakespeare", "hdate_birth":"1564", "hdate_death":"1616"}])
+    assert [r["topic_id"] for r in hd.search("william shakes")] == [id2]
+    hd.update_topic(id2, [{"label":"Christopher Marlowe", "hdate_birth":"1564", "hdate_death":"1593"}])
+    assert hd.search("shakespeare") == []
+    assert hd.search("marlowe")[0]["topic_id"] == id2
+    hd.remove_topic(id2)
+    assert hd.search("marlowe") == []
+    return
+
+def test_snapshot():
+    import threading
+    hd = hdtimeline.hdTimeLine("Snapshots")
+    id1, id2 = hd.add_topics([("Early", [{"label":"a", "hdate":"1066-10-14"}]),
+                              ("Late", [{"label":"b", "hdate":"1815-06-18"}])])
+    snap = hd.snapshot()
+    early_topic = hd.get_topic(id1)
+    assert snap.get_topic(id1) is early_topic    # Topics are shared, not copied
+    assert snap.get_date_range() == hd.get_date_range()
+    assert snap.to_dict() == hd.to_dict()
+
+    hd.update_topic(id1, [{"label":"c", "hdate":"1415-10-25"}])
+    hd.move_topic(id1, 1)
+    id3 = hd.add_topic_dict("Later", [{"label":"d", "hdate":"1914-07-28"}])
+    hd.remove_topic(id2)
+    assert [topic.id for topic in hd.topics] == [id1, id3]
+    assert hd.get_topic(id1).events[0]["label"] == "c"
+
+    assert [topic.id for topic in snap.topics] == [id1, id2]
+    assert snap.get_topic(id1).events[0]["label"] == "a"
+    assert early_topic.events[0]["label"] == "a"
+    try:
+        snap.title = "Changed"
+        assert False, "Snapshot changed"
+    except AttributeError:
+        pass
+
+    # -- Snapshots taken while another thread edits are always consistent
+    hd = hdtimeline.hdTimeLine("Concurrent")
+    ids = hd.add_topics([(f"Topic {i}", [{"label":f"e{i}", "hdate":f"{1000 + i}"}]) for i in range(20)])
+    def edit():
+        for i in range(200):
+            hd.move_topic(ids[i % 20], 5 if i % 2 else -5)
+            hd.update_topic(ids[(i * 7) % 20], [{"label":f"u{i}", "hdate":f"{1500 + i}"}])
+    editor = threading.Thread(target=edit)
+    editor.start()
+    while editor.is_alive():
+        snap = hd.snapshot()
+        assert sorted(topic.id for topic in snap.topics) == sorted(ids)
+    editor.join()
+    return
+
+def test_event_registry():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+    from hdtimelines import eventregistry
+
+    df = pd.read_csv(f'{path}/British Monarchs_extract_ok.csv', na_filter=False)
+    registry = eventregistry.EventRegistry()
+    hd = hdtimeline.hdTimeLine("Registry", registry=registry)
+    hd_plain = hdtimeline.hdTimeLine("Registry")
+    for title in ("Monarchs", "Monarchs again"):
+        hd.add_topic_df(title, df)
+        hd_plain.add_topic_df(title, df)
+    assert hd.to_dict() == hd_plain.to_dict()
+
+    # -- Events, strings and ordinals are shared between topics, and dates parsed only once
+    topic1, topic2 = hd.topics
+    assert all(e1 is e2 for e1, e2 in zip(topic1.events, topic2.events))
+    assert all(o1 is o2 for o1, o2 in zip(topic1.ordinals, topic2.ordinals))
+    stats = registry.stats()
+    assert stats["events_added"] == 2 * len(df) and stats["events"] == len(df)
+    assert stats["dates_parsed"] <= len({(value, col == "hdate_death") for col in ("hdate", "hdate_end", 
+                                                                                    "hdate_birth", "hdate_death")
+                                         if col in df.columns for value in df[col]})
+
+    # -- Topics from other sources, and updated topics, use the registry too
+    hd2 = hdtimeline.hdTimeLine(d=hd_plain.to_dict(), registry=registry)
+    assert hd2.topics[0].events[0] is topic1.events[0]
+    hd.update_topic(topic2.id, df.to_dict(orient="records")[:2])
+    assert hd.get_topic(topic2.id).events[1] is topic1.events[1]
+    assert registry.stats()["events"] == len(df)
+    return
+
+def test_memory_report():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+    from hdtimelines import eventregistry
+
+    df = pd.read_csv(f'{path}/British Monarchs_extract_ok.csv', na_filter=False)
+    hd = hdtimeline.hdTimeLine("Memory")
+    hd_shared = hdtimeline.hdTimeLine("Memory", registry=eventregistry.EventRegistry())
+    for title in ("Monarchs", "Monarchs again"):
+        hd.add_topic_df(title, df)
+        hd_shared.add_topic_df(title, df)
+
+    report = hd.memory_report()
+    assert [topic["title"] for topic in report["topics"]] == ["Monarchs", "Monarchs again"]
+    assert report["events"] == 2 * len(df) and report["registry_bytes"] == 0
+    assert report["event_bytes"] == sum(topic["event_bytes"] for topic in report["topics"]) > 0
+    assert report["bytes"] >= report["event_bytes"] + report["ordinal_bytes"]
+
+    # -- Shared events are counted once, against the first topic using them
+    shared = hd_shared.memory_report()
+    assert shared["topics"][1]["event_bytes"] < report["topics"][1]["event_bytes"] / 2
+    assert shared["event_bytes"] < report["event_bytes"] and shared["registry_bytes"] > 0
+    return
@@ -0,0 +1,22 @@
+import sys
+sys.path.insert(0,".") # For Github
+sys.path.insert(0,"./hdtimelines") # in case this is run when a submodule
+
+from hdtimelines import lineorganiser
+
+def test_add_traces_optimal():
+    # -- Traces not in start order, which first-fit places on 3 lines but which need only 2
+    traces = [(0, 10, 10, ""), (10, 30, 30, ""), (40, 50, 50, ""), (30, 60, 60, ""), (80, 110, 110, "")]
+    lo_firstfit = lineorganiser.LineOrganiser(daysperlabelchar=0, daysminspacing=0)
+    for trace in traces:
+        lo_firstfit.add_trace(*trace)
+
+    lo = lineorganiser.LineOrganiser(daysperlabelchar=0, daysminspacing=0)
+    ilines = lo.add_traces(traces)
+    assert len(lo.linerecord) == 2 < len(lo_firstfit.linerecord)
+    for line in lo.linerecord:
+        for lpd1, lpd2 in zip(line, line[1:]):
+            assert lpd1["latest"] < lpd2["earliest"]
+    assert len(ilines) == len(traces)
+    assert (lo.earliest, lo.latest) == (0, 110)
+    return
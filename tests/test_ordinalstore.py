@@ -0,0 +1,57 @@
+import sys
+sys.path.insert(0,".") # For Github
+sys.path.insert(0,"./hdtimelines") # in case this is run when a submodule
+
+import glob
+import json
+from hdtimelines import hdtimeline, ordinalstore
+
+def test_ordinalstore(tmp_path):
+    # Find test data path
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    hd = hdtimeline.hdTimeLine("Store timeline")
+    hd.add_topic_csv('Monarchs extract',f'{path}/British Monarchs_extract_ok.csv')
+    hd.add_topic_csv('Playwrights extract',f'{path}/Playwrights_extract_ok.csv')
+    hd.add_topic_dict('Battles', [{"label":"Hastings", "hdate":"14 Oct 1066", "min_xrange_years":"50"}])
+
+    filename = str(tmp_path / "store.hdts")
+    ordinalstore.write_store(hd, filename)
+    with ordinalstore.OrdinalStore(filename) as store:
+        assert store.title == "Store timeline"
+        assert len(store.topics) == 3
+        assert store.ordinals.shape == (sum(len(topic.events) for topic in hd.topics), len(ordinalstore.ORDINAL_FIELDS))
+        hd2 = store.timeline()
+        assert hd2.to_dict() == hd.to_dict()
+        assert hd2.get_date_range() == hd.get_date_range()
+        assert hd2.xrange_breakpoints == {50.0}
+        assert store.topic(1).events == hd.topics[1].events
+
+        # -- Ordinals of constructed topics stay in the memory map until used, then are kept
+        hd3 = store.timeline()
+        view = hd3.topics[0].ordinals
+        assert isinstance(view, ordinalstore.OrdinalsView)
+        assert all(row is None for topic in hd3.topics for row in topic.ordinals._rows)
+        assert hd3.get_date_range() == hd.get_date_range() and hd3.xrange_breakpoints == {50.0}
+        view[0]["birth_early"] = 5
+        assert view[0]["birth_early"] == 5
+        view[0]["birth_early"] = hd.topics[0].ordinals[0]["birth_early"]
+        assert hd2.topics[0].ordinals == hd.topics[0].ordinals
+        assert hd2.topics[1].ordinals[-1] == hd.topics[1].ordinals[-1]
+        assert store.get_ordinals(2) == hd.topics[2].ordinals
+        ordinals = store.ordinals
+
+    # -- Views still held keep the map open after the store is closed
+    assert store.ordinals is None
+    assert ordinals.shape[0] == sum(len(topic.events) for topic in hd.topics)
+    assert hd2.topics[0].ordinals == hd.topics[0].ordinals
+    store.close()
+
+    # -- Timelines constructed from a store convert to plain, JSON-serialisable dictionaries
+    d = hd2.to_dict()
+    assert type(d["topics"][0]["ordinals"]) is list
+    assert json.loads(json.dumps(d)) == json.loads(json.dumps(hd.to_dict()))
+    return
@@ -2,6 +2,10 @@ import sys
 sys.path.insert(0,".") # For Github
 sys.path.insert(0,"./hdtimelines") # in case this is run when a submodule
 
+import io
+import glob
+import json
+import pandas as pd
 from hdtimelines import pltimeline
 from historicaldate import hdateutils
 
@@ -14,4 +18,551 @@ def test1():
     assert pltl.fig_config == {'scrollZoom': True}
     assert pltl._xmode == "date"
     assert pltl.max_y_used == 0.0
-    return
\ No newline at end of file
+    return
+
+def test_write_html_tiled(tmp_path):
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    pltl = pltimeline.plTimeLine("Tiled", mindate="1000", maxdate="2025")
+    pltl.add_topic_from_df(pd.read_csv(f'{path}/British Monarchs_extract_ok.csv', na_filter=False), title="Monarchs")
+    ntiles = pltl.write_html_tiled(str(tmp_path / "tiled.html"), ntiles=4)
+
+    tilefiles = sorted(glob.glob(str(tmp_path / "tiled_tiles" / "*.json")))
+    assert 1 <= ntiles <= 4
+    assert len(tilefiles) == ntiles
+    ntraces = sum(len(json.load(open(f))) for f in tilefiles)
+    assert ntraces == len(pltl.figure.data)
+    assert "tiled_tiles/tile_0000.json" in (tmp_path / "tiled.html").read_text()
+    return
+
+
+def test_append_events():
+    pltl = pltimeline.plTimeLine("Append", mindate="1000", maxdate="2025")
+    df1 = pd.DataFrame([{"label":"Battle of Hastings", "hdate":"14 Oct 1066"}])
+    df2 = pd.DataFrame([{"label":"Magna Carta", "hdate":"15 Jun 1215"}])
+    assert pltl.add_topic_from_df(df1, title="Events", id=1)
+    assert pltl.add_topic_from_df(df2, title="More events", id=2)
+    ntraces = len(pltl.figure.data)
+    min_y2, max_y = pltl.topics[1]["min_y"], pltl.max_y_used
+
+    # -- Overlaps the existing event, so needs a new line
+    assert pltl.append_events(1, pd.DataFrame([{"label":"Domesday Book", "hdate":"1086"}]))
+    assert len(pltl.figure.data) > ntraces
+    dy = pltl.topics[1]["min_y"] - min_y2
+    assert dy > 0
+    assert pltl.max_y_used == max_y + dy
+    assert pltl.topics[0]["max_y"] == pltl.topics[1]["min_y"]
+    assert pltl.figure.data[ntraces - 1].y[0] > pltl.topics[1]["min_y"]
+    return
+
+
+def test_write_html_streaming():
+    pltl = pltimeline.plTimeLine("Streaming", mindate="1000", maxdate="2025")
+    pltl.add_topic_from_df(pd.DataFrame([{"label":"Battle of Hastings", "hdate":"14 Oct 1066"},
+                                         {"label":"Magna Carta", "hdate":"15 Jun 1215"}]), title="Events")
+    f = io.StringIO()
+    pltl.write_html_streaming(f, engine="json")
+    html = f.getvalue()
+    data = html[html.index("var data = ["):html.index("Plotly.newPlot")]
+    assert data.count('"type":"scatter"') == len(pltl.figure.data)
+    assert "Magna Carta" in html
+    assert html.rstrip().endswith("</html>")
+    return
+
+def test_zoom_filtering(tmp_path):
+    df = pd.DataFrame([{"label":"Battle of Hastings", "hdate":"14 Oct 1066", "max_xrange_years":""},
+                       {"label":"Domesday Book", "hdate":"1086", "max_xrange_years":"100"}])
+    pltl = pltimeline.plTimeLine("Filtered", mindate="1000", maxdate="2025")
+    pltl.add_topic_from_df(df, title="Events")
+    assert not any("Domesday Book" in str(trace.text) for trace in pltl.figure.data)
+
+    pltl = pltimeline.plTimeLine("Zoom filtered", mindate="1000", maxdate="2025", zoom_filtering=True)
+    pltl.add_topic_from_df(df, title="Events")
+    hidden = [trace for trace in pltl.figure.data if trace.meta]
+    assert hidden and all(trace.visible is False for trace in hidden)
+    assert all(list(trace.meta["xrange"]) == [0.0, 100.0] for trace in hidden)
+    f = io.StringIO()
+    pltl.write_html_streaming(f)
+    assert "plotly_relayout" in f.getvalue()
+
+    # -- Tiled output filters traces as tiles load
+    ntiles = pltl.write_html_tiled(str(tmp_path / "filtered.html"), ntiles=2)
+    html = (tmp_path / "filtered.html").read_text()
+    assert "zoomfilter" in html and html.count("hdtimelines_tracesadded") == 2
+    tiled = [trace for itile in range(ntiles)
+                for trace in json.load(open(tmp_path / "filtered_tiles" / f"tile_{itile:04d}.json"))]
+    assert [trace["meta"]["xrange"] for trace in tiled if trace.get("visible") is False] == \
+                [list(trace.meta["xrange"]) for trace in hidden]
+    return
+
+def test_add_topics_from_sources():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    pltl = pltimeline.plTimeLine("Sources", mindate="1000", maxdate="2025")
+    added, errors = pltl.add_topics_from_sources([
+                        ("Monarchs", f'{path}/British Monarchs_extract_ok.csv', {"hover_datetype":"year"}),
+                        ("Missing", f'{path}/no_such_file.csv'),
+                        ("Playwrights", f'{path}/Playwrights_extract_ok.csv')])
+    assert added == [True, None, True]
+    assert list(errors) == [1]
+    assert [topic["title"] for topic in pltl.topics] == ["Monarchs", "Playwrights"]
+
+    pltl2 = pltimeline.plTimeLine("Sources", mindate="1000", maxdate="2025")
+    pltl2.add_topic_from_df(pd.read_csv(f'{path}/British Monarchs_extract_ok.csv', na_filter=False), 
+                            title="Monarchs", hover_datetype="year")
+    pltl2.add_topic_from_df(pd.read_csv(f'{path}/Playwrights_extract_ok.csv', na_filter=False), title="Playwrights")
+    assert pltl.figure.to_dict()["data"] == pltl2.figure.to_dict()["data"]
+    return
+
+def test_save_load(tmp_path):
+    def same_figure(fig1, fig2):
+        # -- Empty layout properties, such as title={}, are not restored
+        return fig1.to_dict()["data"] == fig2.to_dict()["data"] and \
+                all(fig1.layout[prop] == fig2.layout[prop] for prop in ("annotations", "xaxis.range", "yaxis.range"))
+
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    pltl = pltimeline.plTimeLine("Snapshot", mindate="1000", maxdate="2025", xmode="years")
+    pltl.add_topic_from_df(pd.read_csv(f'{path}/British Monarchs_extract_ok.csv', na_filter=False), 
+                           title="Monarchs", id=1)
+    pltl.save(str(tmp_path / "snapshot.hdtl"))
+    pltl2 = pltimeline.plTimeLine.load(str(tmp_path / "snapshot.hdtl"))
+
+    assert same_figure(pltl2.figure, pltl.figure)
+    assert pltl2.topics == pltl.topics
+    assert (pltl2.max_y_used, pltl2.earliest, pltl2.latest) == (pltl.max_y_used, pltl.earliest, pltl.latest)
+
+    # -- The restored timeline can be extended just as the original can
+    df = pd.read_csv(f'{path}/Playwrights_extract_ok.csv', na_filter=False)
+    for p in (pltl, pltl2):
+        p.add_topic_from_df(df, title="Playwrights")
+        p.append_events(1, pd.DataFrame([{"label":"Domesday Book", "hdate":"1086"}]))
+        p.fit_xaxis(mindate="1500")
+    assert same_figure(pltl2.figure, pltl.figure)
+    assert pltl2.topics == pltl.topics
+    return
+
+def test_estimate_size_and_budget():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    from hdtimelines import hdtimeline
+    hd = hdtimeline.hdTimeLine("Budget")
+    hd.add_topic_csv("Monarchs", f'{path}/British Monarchs_extract_ok.csv')
+    hd.add_topic_csv("Playwrights", f'{path}/Playwrights_extract_ok.csv')
+
+    pltl = pltimeline.plTimeLine("Budget", mindate="1000", maxdate="2025")
+    estimate = pltl.estimate_size(hd.topics)
+    for topic in hd.topics:
+        pltl.add_topic(topic)
+    assert estimate["traces"] == len(pltl.figure.data)
+    assert estimate["points"] == sum(len(trace.x) for trace in pltl.figure.data)
+    assert 0.8 < estimate["bytes"] / len(pltl.figure.to_json()) < 1.2
+
+    # -- A byte budget switches to compact output, then coarsens sampling; a trace budget drops births and deaths
+    pltl2 = pltimeline.plTimeLine.from_hdtimeline(hd, mindate="1000", maxdate="2025", 
+                                                  max_bytes=estimate["bytes"] - 1000)
+    assert pltl2._compact is not None
+    assert pltl2.pointinterval == pltl.pointinterval
+    assert len(pltl2.figure.data) == len(pltl.figure.data)
+    assert len(pltl2.figure.to_json()) < len(pltl.figure.to_json())
+
+    compact_estimate = pltl2.estimate_size(hd.topics)
+    assert 0.8 < compact_estimate["bytes"] / len(pltl2.figure.to_json()) < 1.2
+    pltl2a = pltimeline.plTimeLine.from_hdtimeline(hd, mindate="1000", maxdate="2025", 
+                                                  max_bytes=compact_estimate["bytes"] - 1000)
+    assert pltl2a.pointinterval > pltl.pointinterval
+    assert len(pltl2a.figure.to_json()) < len(pltl2.figure.to_json())
+
+    pltl3 = pltimeline.plTimeLine.from_hdtimeline(hd, mindate="1000", maxdate="2025", 
+                                                  max_traces=estimate["traces"] - 1)
+    assert pltl3.pointinterval == pltl.pointinterval and pltl3._compact is None
+    assert len(pltl3.figure.data) < estimate["traces"]
+
+    # -- An unreachable budget leaves pointinterval unchanged
+    pltl4 = pltimeline.plTimeLine("Budget", mindate="1000", maxdate="2025")
+    options, estimate4 = pltl4.fit_budget(hd.topics, max_bytes=1)
+    assert pltl4.pointinterval == pltl.pointinterval and estimate4["bytes"] > 1
+
+    # -- Events without ranks, in a topic with ranks, are neither drawn nor counted
+    hd.add_topic_dict("Ranks", [{"label":f"Event {i}", "hdate":f"{1100 + 50 * i}", "rank":rank} 
+                                for i, rank in enumerate([1, None, "", float("nan"), 2, 1])] +
+                               [{"label":"No rank", "hdate":"1500"}])
+    pltl5 = pltimeline.plTimeLine("Budget", mindate="1000", maxdate="2025")
+    estimate5 = pltl5.estimate_size(hd.topics[-1:])
+    pltl5.add_topic(hd.topics[-1])
+    assert [trace.text for trace in pltl5.figure.data if trace.mode == "text"] == ["Event 0", "Event 5"]
+    assert estimate5["traces"] == len(pltl5.figure.data)
+    return
+
+def test_trace_cache():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    from hdtimelines import hdtimeline, pltcache
+    hd = hdtimeline.hdTimeLine("Cache")
+    id1 = hd.add_topic_csv("Monarchs", f'{path}/British Monarchs_extract_ok.csv')
+    id2 = hd.add_topic_csv("Playwrights", f'{path}/Playwrights_extract_ok.csv')
+    monarchs, playwrights = hd.get_topic(id1), hd.get_topic(id2)
+
+    cache = pltcache.TraceCache()
+    pltl1 = pltimeline.plTimeLine("Cache", mindate="1000", maxdate="2025", trace_cache=cache)
+    pltl1.add_topic(monarchs)
+    pltl1.add_topic(playwrights, max_rank=2)
+    assert (cache.hits, cache.misses, len(cache)) == (0, 2, 2)
+
+    # -- Placed from the cache in a different order, matching a figure built without it
+    pltl2 = pltimeline.plTimeLine("Cache", mindate="1000", maxdate="2025", trace_cache=cache)
+    pltl2.add_topic(playwrights, max_rank=2)
+    pltl2.add_topic(monarchs)
+    assert cache.hits == 2
+
+    pltl3 = pltimeline.plTimeLine("Cache", mindate="1000", maxdate="2025")
+    pltl3.add_topic(playwrights, max_rank=2)
+    pltl3.add_topic(monarchs)
+    assert len(pltl2.figure.data) == len(pltl3.figure.data)
+    for trace2, trace3 in zip(pltl2.figure.data, pltl3.figure.data):
+        assert list(trace2.x) == list(trace3.x) and trace2.hovertext == trace3.hovertext
+        assert all(abs(y2 - y3) < 1e-9 for y2, y3 in zip(trace2.y, trace3.y))
+    assert pltl2.topics == pltl3.topics
+    assert pltl2.figure.layout.annotations == pltl3.figure.layout.annotations
+
+    # -- Placed topics can be extended, and a different axis range is not served from the cache
+    assert pltl2.append_events(id1, pd.DataFrame([{"label":"Domesday Book", "hdate":"1086"}]))
+    pltl4 = pltimeline.plTimeLine("Cache", mindate="1500", maxdate="2025", trace_cache=cache)
+    pltl4.add_topic(monarchs)
+    assert cache.misses == 3
+
+    # -- Nor is a different line spacing, from a different initial range
+    pltl5 = pltimeline.plTimeLine("Cache", mindate="1000", maxdate="2025", trace_cache=cache)
+    pltl5.initial_range_years = 2 * pltl1.initial_range_years
+    pltl5.add_topic(monarchs)
+    assert cache.misses == 4
+    return
+
+def test_parallel_prepare(monkeypatch):
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    df = pd.concat([pd.read_csv(f'{path}/British Monarchs_extract_ok.csv', na_filter=False),
+                    pd.read_csv(f'{path}/Playwrights_extract_ok.csv', na_filter=False)], ignore_index=True).fillna({"rank":1}).fillna("")
+    figures = []
+    for workers in (None, 2):
+        pltl = pltimeline.plTimeLine("Parallel", mindate="1000", maxdate="2025", workers=workers, chunksize=3)
+        pltl.add_topic_from_df(df.copy(), title="Combined", max_rank=2, study_range_start="1500", study_range_end="2025")
+        pltl.add_topic_from_df(df.copy(), title="Optimal", max_rank=2, layout="optimal")
+        figures.append(pltl.figure.to_json())
+    assert figures[0] == figures[1]
+
+    # -- One pool of workers is started for each topic, however many sets of events and rank tiers it has
+    import concurrent.futures
+    pools, calls = [], []
+    class CountedPool(concurrent.futures.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(self)
+            super().__init__(*args, **kwargs)
+    prepare_rows = pltimeline.plTimeLine._prepare_rows
+    def counted_prepare_rows(self, *args):
+        calls.append(args)
+        return prepare_rows(self, *args)
+
+    df = pd.DataFrame([{"label":f"Event {i}", "hdate":f"{1100 + 40 * i}", "hdate_birth":"", "hdate_death":"", 
+                        "rank":1 + i % 2} for i in range(4)] +
+                      [{"label":f"Life {i}", "hdate":"", "hdate_birth":f"{1100 + 40 * i}", 
+                        "hdate_death":f"{1160 + 40 * i}", "rank":1 + i % 2} for i in range(4)])
+    figures = []
+    for workers in (None, 2):
+        monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", CountedPool)
+        monkeypatch.setattr(pltimeline.plTimeLine, "_prepare_rows", counted_prepare_rows)
+        pltl = pltimeline.plTimeLine("Parallel", mindate="1000", maxdate="2025", workers=workers, chunksize=1)
+        pltl.add_topic_from_df(df.copy(), title="Tiers", rank_tiers=[1, 2])
+        monkeypatch.undo()
+        figures.append(pltl.figure.to_json())
+    assert len(calls) == 4 and len(pools) == 1
+    assert figures[0] == figures[1]
+    return
+
+def test_add_topic_without_pandas(monkeypatch):
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    from hdtimelines import hdtimeline
+    hd = hdtimeline.hdTimeLine("No pandas")
+    hd.add_topic_csv("Monarchs", f'{path}/British Monarchs_extract_ok.csv')
+    hd.add_topic_dict("Events", [
+            {"label":"Magna Carta", "hdate":"15 Jun 1215", "hdate_end":"", "rank":1, "colour":"red"},
+            {"label":"Battle of Hastings", "hdate":"14 Oct 1066", "hdate_end":"", "rank":1, "colour":""},
+            {"label":"Domesday Book", "hdate":"1086", "hdate_end":"", "rank":2, "colour":"", 
+             "max_xrange_years":"100"},
+            {"label":"Black Death", "hdate":"1348", "hdate_end":"1350", "rank":1, "colour":"", 
+             "min_xrange_years":"500"}])
+
+    expected = pltimeline.plTimeLine("No pandas", mindate="1000", maxdate="2025")
+    for topic in hd.topics:
+        expected.add_topic_from_df(pd.DataFrame(topic.events), title=topic.title, id=topic.id, max_rank=2)
+
+    def no_dataframes(*args, **kwargs):
+        raise AssertionError("DataFrame created")
+    monkeypatch.setattr(pd, "DataFrame", no_dataframes)
+    pltl = pltimeline.plTimeLine("No pandas", mindate="1000", maxdate="2025")
+    for topic in hd.topics:
+        pltl.add_topic(topic, max_rank=2)
+    monkeypatch.undo()
+
+    assert pltl.figure.to_json() == expected.figure.to_json()
+    assert pltl.topics == expected.topics
+    assert [trace.text for trace in pltl.figure.data if trace.mode == "text"][-2:] == ["Magna Carta", "Black Death"]
+    return
+
+def test_compact():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    df = pd.read_csv(f'{path}/British Monarchs_extract_ok.csv', na_filter=False)
+    for xmode in ("date", "years"):
+        pltl = pltimeline.plTimeLine("Full", mindate="1000", maxdate="2025", xmode=xmode)
+        pltl.add_topic_from_df(df.copy(), title="Monarchs")
+        pltc = pltimeline.plTimeLine("Compact", mindate="1000", maxdate="2025", xmode=xmode, compact=True)
+        pltc.add_topic_from_df(df.copy(), title="Monarchs")
+
+        assert len(pltc.figure.to_json()) < 0.85 * len(pltl.figure.to_json())
+        assert pltc.figure.layout.template.data.scatter[0].hoverlabel.namelength == -1
+        assert len(pltc.figure.data) == len(pltl.figure.data)
+        for full, compact in zip(pltl.figure.data, pltc.figure.data):
+            assert compact.hoverlabel.namelength is None and compact.legendgroup is None
+            assert compact.hovertext == full.hovertext and compact.text == full.text
+            assert all(abs(y1 - y2) < 1e-4 for y1, y2 in zip(full.y, compact.y))
+            if xmode == "years":
+                assert all(abs(x1 - x2) < 0.01 for x1, x2 in zip(full.x, compact.x))
+            else:
+                assert full.x == compact.x
+    return
+
+def test_adaptive_sampling():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    from hdtimelines import hdtimeline
+    hd = hdtimeline.hdTimeLine("Sampling")
+    hd.add_topic_csv("Monarchs", f'{path}/British Monarchs_extract_ok.csv')
+    hd.add_topic_csv("Playwrights", f'{path}/Playwrights_extract_ok.csv')
+
+    for xmode in ("date", "years"):
+        pltl = pltimeline.plTimeLine("Fixed", mindate="1500", maxdate="1700", xmode=xmode)
+        pltla = pltimeline.plTimeLine("Adaptive", mindate="1500", maxdate="1700", xmode=xmode, plot_width=1000)
+        estimate = pltla.estimate_size(hd.topics)
+        for topic in hd.topics:
+            pltl.add_topic(topic)
+            pltla.add_topic(topic)
+        points = sum(len(trace.x) for trace in pltl.figure.data)
+        points_adaptive = sum(len(trace.x) for trace in pltla.figure.data)
+        assert estimate["points"] == points_adaptive
+        assert points_adaptive < 0.5 * points
+        assert len(pltla.figure.data) == len(pltl.figure.data)
+
+        # -- Within the x axis range, points on lines are never more than 2 * hoverdistance pixels apart
+        maxgap = 2 * pltla.figure.layout.hoverdistance * (pltla.maxdate - pltla.mindate) / 1000
+        for trace in pltla.figure.data:
+            if trace.mode != "lines" or trace.x[0] is None:
+                continue    # Not a line, or a BC line in date mode
+            ordinals = [hdateutils.to_ordinal(x) if xmode == "date" else hdateutils.years_to_ordinal(x)
+                        for x in trace.x]
+            for o1, o2 in zip(ordinals[1:-2], ordinals[2:-1]):
+                assert o2 - o1 <= maxgap + 1
+            if ordinals[-1] < pltla.mindate or ordinals[0] > pltla.maxdate:
+                assert len(ordinals) <= 2
+    return
+
+def test_reproject():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    from hdtimelines import hdtimeline, pltcache
+    hd = hdtimeline.hdTimeLine("Reproject")
+    hd.add_topic_csv("Monarchs", f'{path}/British Monarchs_extract_ok.csv')
+    hd.add_topic_csv("Playwrights", f'{path}/Playwrights_extract_ok.csv')
+
+    def build(xmode, pointinterval=None, topics=hd.topics[:1], **kwargs):
+        pltl = pltimeline.plTimeLine("Reproject", mindate="1500", maxdate="1700", xmode=xmode, **kwargs)
+        if pointinterval:
+            pltl.pointinterval = pointinterval
+        for topic in topics:
+            pltl.add_topic(topic)
+        return pltl
+
+    def data(pltl):
+        return [trace.to_plotly_json() for trace in pltl.figure.data]
+
+    cache = pltcache.TraceCache()
+    pltl = build("date", trace_cache=cache)
+    pltl_cached = build("date", trace_cache=cache)
+    original = data(pltl)
+    pltl.reproject(xmode="years")
+    pltl_cached.reproject(xmode="years")
+    assert data(pltl) == data(pltl_cached) == data(build("years"))
+    assert pltl.figure.layout.xaxis.range == build("years").figure.layout.xaxis.range
+    pltl.reproject(xmode="date")
+    assert data(pltl) == original
+
+    pltl.reproject(pointinterval=1000)
+    assert data(pltl) == data(build("date", pointinterval=1000))
+    pltl.reproject(xmode="years", pointinterval=int((pltl.maxdate - pltl.mindate) / 200))
+    assert data(pltl) == data(build("years"))
+
+    pltl = build("date", plot_width=800, compact=True)
+    pltl.reproject(xmode="years")
+    assert data(pltl) == data(build("years", plot_width=800, compact=True))
+
+    # -- Lines with BC dates are kept, without x values, in date mode, and shown in years mode
+    hd.add_topic_dict("Romans", [{"label":"Caesar", "hdate":"100 BC", "hdate_end":"44 BC"},
+                                 {"label":"Augustus", "hdate":"27 BC", "hdate_end":"14"}])
+    pltl = build("years", topics=hd.topics)
+    original = data(pltl)
+    pltl.reproject(xmode="date")
+    assert data(pltl) == data(build("date", topics=hd.topics))
+    assert any(all(x is None for x in trace.x) for trace in pltl.figure.data)
+    pltl.reproject(xmode="years")
+    assert data(pltl) == original
+
+    pltl = build("date", topics=hd.topics[1:])
+    pltl.reproject(xmode="years")
+    assert data(pltl) == data(build("years", topics=hd.topics[1:]))
+    return
+
+def test_rank_tiers():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    from hdtimelines import hdtimeline
+    hd = hdtimeline.hdTimeLine("Tiers")
+    hd.add_topic_dict("Ranked", [{"label":f"Event {i}", "hdate":f"{1500 + 3 * i}", "hdate_end":f"{1520 + 3 * i}",
+                                  "rank":1 + i % 3} for i in range(60)])
+    hd.add_topic_csv("Playwrights", f'{path}/Playwrights_extract_ok.csv')
+
+    def build(**kwargs):
+        pltl = pltimeline.plTimeLine("Tiers", mindate="1450", maxdate="1750")
+        for topic in hd.topics:
+            pltl.add_topic(topic, **kwargs)
+        return pltl
+
+    def shown(pltl):
+        return [{key:value for key, value in trace.to_plotly_json().items() if key not in ("meta", "visible")}
+                    for trace in pltl.figure.data if trace.visible is not False]
+
+    # -- The first tier is laid out as if only it were drawn
+    pltl1 = build(max_rank=1)
+    pltl = build(max_rank=1, rank_tiers=[1, 2, 3])
+    assert len(pltl.figure.data) > len(pltl1.figure.data)
+    assert shown(pltl) == shown(pltl1)
+    assert pltl.topics == pltl1.topics
+    original = pltl.figure.to_plotly_json()["data"]
+
+    # -- Showing more tiers only changes visibility, and moves the topics below
+    assert pltl.set_max_rank(3) == len(pltl.figure.data) - len(pltl1.figure.data)
+    assert all(trace.visible is not False for trace in pltl.figure.data)
+    assert pltl.topics[0]["max_y"] > pltl1.topics[0]["max_y"]
+    dy = pltl.topics[1]["min_y"] - pltl1.topics[1]["min_y"]
+    assert dy > 0 and pltl.max_y_used == pltl1.max_y_used + dy
+    def title_y(pltl):
+        return next(a.y for a in pltl.figure.layout.annotations if a.text == "Playwrights")
+    assert title_y(pltl) == title_y(pltl1) + dy
+
+    pltl.set_max_rank(2)
+    assert len(shown(pltl)) == len(shown(build(max_rank=2, rank_tiers=[1, 2, 3])))
+    pltl.set_max_rank(1)
+    for trace, otrace in zip(pltl.figure.to_plotly_json()["data"], original):
+        assert {**trace, "y":None} == {**otrace, "y":None}
+        assert all(abs(y - oy) < 1e-9 for y, oy in zip(trace["y"], otrace["y"]))
+    assert pltl.topics == pltl1.topics
+
+    # -- Hidden tiers stay hidden in zoom filtering
+    pltl = pltimeline.plTimeLine("Tiers", mindate="1450", maxdate="1750", zoom_filtering=True)
+    pltl.add_topic(hd.topics[0], rank_tiers=[1, 3])
+    hidden = [trace for trace in pltl.figure.data if trace.visible is False]
+    assert hidden and all(trace.meta["rankhidden"] for trace in hidden)
+    assert "rankhidden" in pltl._post_script()
+
+    # -- Appended events of hidden tiers do not change the space the topic takes
+    pltl = pltimeline.plTimeLine("Tiers", mindate="1450", maxdate="1750")
+    pltl.add_topic_from_df(pd.DataFrame(hd.topics[0].events), rank_tiers=[1, 2, 3])
+    max_y = pltl.topics[0]["max_y"]
+    pltl.append_events(0, pd.DataFrame([{"label":"Hidden", "hdate":"1600", "rank":3}]))
+    assert pltl.topics[0]["max_y"] == max_y and pltl.figure.data[-1].visible is False
+    return
+
+def test_memory_report():
+    if glob.glob('./hdtimelines/test_data/'):
+        path = './hdtimelines/test_data'
+    else:
+        path = './test_data'
+
+    from hdtimelines import hdtimeline
+    hd = hdtimeline.hdTimeLine("Memory")
+    hd.add_topic_csv("Monarchs", f'{path}/British Monarchs_extract_ok.csv')
+    hd.add_topic_csv("Playwrights", f'{path}/Playwrights_extract_ok.csv')
+
+    pltl = pltimeline.plTimeLine.from_hdtimeline(hd)
+    report = pltl.memory_report()
+    assert report["measurements"] is None
+    assert [topic["title"] for topic in report["topics"]] == ["Monarchs", "Playwrights"]
+    assert report["traces"] == len(pltl.figure.data)
+    assert report["points"] == sum(len(trace.x) for trace in pltl.figure.data)
+    assert report["bytes"] > report["trace_bytes"] > 0
+
+    # -- Measurement is optional, and does not change the figure
+    measured = pltimeline.plTimeLine.from_hdtimeline(hd, measure_memory=True)
+    measured.add_topic_from_df(pd.read_csv(f'{path}/Playwrights_extract_ok.csv', na_filter=False), 
+                               title="Playwrights again")
+    measured.append_events(measured.topics[-1]["id"], pd.DataFrame([{"label":"Extra", "hdate":"1600"}]))
+    assert measured.figure.data[:len(pltl.figure.data)] == pltl.figure.data
+    measurements = measured.memory_report()["measurements"]
+    assert [(m["method"], m["topic"]) for m in measurements] == [("add_topic", "Monarchs"), 
+                                                                 ("add_topic", "Playwrights"),
+                                                                 ("add_topic_from_df", "Playwrights again"),
+                                                                 ("append_events", "Playwrights again")]
+    assert all(m["allocated"] > 0 and m["peak"] >= m["allocated"] and m["seconds"] > 0 for m in measurements)
+    return
+
+def test_memory_measurement_without_reset_peak(monkeypatch):
+    import tracemalloc
+    from hdtimelines import hdtimeline
+    monkeypatch.delattr(tracemalloc, "reset_peak", raising=False)   # As before Python 3.9
+
+    hd = hdtimeline.hdTimeLine("Memory")
+    hd.add_topic_dict("Topic", [{"label":"Event", "hdate":"1600", "hdate_end":"1650"}])
+    for already_tracing in (False, True):
+        if already_tracing:
+            tracemalloc.start()
+        try:
+            pltl = pltimeline.plTimeLine.from_hdtimeline(hd, measure_memory=True)
+        finally:
+            if already_tracing:
+                tracemalloc.stop()
+        measurement = pltl.memory_report()["measurements"][0]
+        assert measurement["peak"] >= measurement["allocated"] > 0
+    return
@@ -7,6 +7,7 @@ sys.path.insert(0,'.')
 from hdtimelines import pltimeline
 import pandas as pd
 import datetime
+import functools
 
 # Abbreviations and colours
 def get_colxref(filename):
@@ -28,25 +29,23 @@ def read_file(filename, df_xref=None):
         df["colour"] = df["colour"].fillna("black")
     return df
 
-df_epl = read_file(f"{dataroot}/data/sport/football/English Premier League and First Division.csv",
-                   df_xref=df_colxref)
-df_facup = read_file(f"{dataroot}/data/sport/football/FA Cup.csv",
-                   df_xref=df_colxref)
-df_ucl = read_file(f"{dataroot}/data/sport/football/UEFA Champions League.csv",
-                   df_xref=df_colxref)
-df_world = read_file(f"{dataroot}/data/sport/football/FIFA World Cup.csv",
-                   df_xref=df_colxref_national)
-df_euros = read_file(f"{dataroot}/data/sport/football/European Championship.csv",
-                   df_xref=df_colxref_national)
+def football_source(filename, df_xref):
+    "Source for plTimeLine.add_topics_from_sources(): reads a file when called"
+    return functools.partial(read_file, f"{dataroot}/data/sport/football/{filename}", df_xref=df_xref)
 
 pltl = pltimeline.plTimeLine(mindate=datetime.date(1990,7,1), 
                        maxdate=datetime.date.today() + datetime.timedelta(days=400),
                        title="English Men's Club and International Football (since 1993)")
-pltl.add_topic_from_df(df_epl, title="Top Tier: Premier League", hover_datetype='year')
-pltl.add_topic_from_df(df_facup, title="FA Cup")
-pltl.add_topic_from_df(df_ucl, title="UEFA Champions League", hover_datetype='year')
-pltl.add_topic_from_df(df_world, title="FIFA World Cup")
-pltl.add_topic_from_df(df_euros, title="UEFA European Championships")
+added, errors = pltl.add_topics_from_sources([
+    ("Top Tier: Premier League", football_source("English Premier League and First Division.csv", df_colxref), 
+                                                                            {"hover_datetype":'year'}),
+    ("FA Cup", football_source("FA Cup.csv", df_colxref)),
+    ("UEFA Champions League", football_source("UEFA Champions League.csv", df_colxref), {"hover_datetype":'year'}),
+    ("FIFA World Cup", football_source("FIFA World Cup.csv", df_colxref_national)),
+    ("UEFA European Championships", football_source("European Championship.csv", df_colxref_national)),
+    ])
+for index, error in errors.items():
+    print(f"Topic {index} not loaded: {error}")
 pltl.show() 
 
 pltl.write_html("html/english_club_football.html")